@@ -1,21 +1,40 @@
 import json
 import os
 import base64
-import requests
+import hashlib
 import time
 import logging
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
-from openai import AsyncOpenAI, OpenAI
-from .prompt_builder import build_initial_prompt, build_final_image_prompt
+from functools import lru_cache
+from .prompt_builder import build_storyboard_prompt, build_final_image_prompt, build_batch_image_prompts
+from .metrics import record_token_usage
+from .storyboard_stream import StoryboardStreamParser
+from .deadline import stage_timeout, time_left, PANEL_RESERVE, UPLOAD_RESERVE
 from io import BytesIO
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# The SDKs are imported on first use so that processes which never call a
+# provider (and the API's cold start) don't pay for loading them.
+@lru_cache(maxsize=None)
+def get_client():
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+@lru_cache(maxsize=None)
+def get_async_client():
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+def openai_timeout(stage: str, reserve: float = 0):
+    """Request timeout from the current job's remaining budget, or the client's default outside a job."""
+    timeout = stage_timeout(stage, reserve)
+    if timeout is None:
+        from openai import NOT_GIVEN
+        return NOT_GIVEN
+    return timeout
 
 
 def get_moderation(story) -> bool:
-    response = client.moderations.create(
+    response = get_client().moderations.create(
     model="omni-moderation-latest",
     input=story,
     )
@@ -23,25 +42,27 @@ def get_moderation(story) -> bool:
 
 def get_panel_descriptions(story, num_panels, style_description):
 
-    initial_prompt = build_initial_prompt(num_panels, style_description)
+    system_prompt, user_content = build_storyboard_prompt(story, num_panels, style_description)
     panel_data = None
-
-    full_prompt = f"{initial_prompt}\n\n Here is the story:\n{story}"
+    timeout = openai_timeout("storyboard", PANEL_RESERVE)
 
     try:
-        # response = client.responses.create(
+        # response = get_client().responses.create(
         #     model="gpt-5",
         #     input=full_prompt,
         #     reasoning={"effort": "medium"},
         #     text={"verbosity":"low"}
         # )
 
-        response = client.responses.create(
+        response = get_client().responses.create(
             model="gpt-5-mini",
-            input=full_prompt,
+            instructions=system_prompt,
+            input=user_content,
             reasoning={"effort": "low"},
-            text={"verbosity":"low"}
+            text={"verbosity":"low"},
+            timeout=timeout
         )
+        record_token_usage("storyboard", response.usage)
         panel_data = json.loads(response.output_text)
         
 
@@ -52,12 +73,61 @@ def get_panel_descriptions(story, num_panels, style_description):
 
     return panel_data
 
+async def stream_panel_descriptions(story, num_panels, style_description):
+    """
+    Streaming version of get_panel_descriptions.
+
+    Yields ("panel", (index, panel)) for every panel as soon as its JSON
+    object is complete, then a final ("storyboard", panel_data) with the full
+    script. Panels may arrive out of order if one could not be decoded mid-stream.
+    """
+
+    system_prompt, user_content = build_storyboard_prompt(story, num_panels, style_description)
+    parser = StoryboardStreamParser()
+    timeout = openai_timeout("storyboard", PANEL_RESERVE)
+
+    try:
+        stream = await get_async_client().responses.create(
+            model="gpt-5-mini",
+            instructions=system_prompt,
+            input=user_content,
+            reasoning={"effort": "low"},
+            text={"verbosity":"low"},
+            stream=True,
+            timeout=timeout
+        )
+
+        async for event in stream:
+            if event.type == "response.output_text.delta":
+                for indexed_panel in parser.feed(event.delta):
+                    yield "panel", indexed_panel
+            elif event.type == "response.completed":
+                record_token_usage("storyboard", event.response.usage)
+            elif event.type in ("response.failed", "error"):
+                raise Exception(f"Storyboard stream failed: {event}")
+
+        panel_data = parser.finish()
+
+    except Exception as e:
+        print(f"An error occurred during streamed storyboard generation: {e}")
+        raise ValueError(f"LLM API failed to return valid JSON. Details: {e}")
+
+    # Panels that could not be decoded mid-stream are still in the full parse
+    for index, panel in enumerate(panel_data.get("panels") or []):
+        if index not in parser.emitted_indexes:
+            yield "panel", (index, panel)
+
+    yield "storyboard", panel_data
+
 async def generate_image_google(prompt_text, avatar):
     """
     Generates an image using Google's Gemini Flash model for image generation.
     """
     logging.warning("Newest deployment v3")
     logging.info("=== GOOGLE GEMINI GENERATION STARTED ===") # Use logging.info
+    import google.generativeai as genai
+    from google.generativeai.types import HarmCategory, HarmBlockThreshold
+
     try:
         # The model for image generation is gemini-2.5-flash-image-preview
         model = genai.GenerativeModel("gemini-2.5-flash-image-preview")
@@ -65,10 +135,11 @@ async def generate_image_google(prompt_text, avatar):
         # The avatar image must be sent as an inline data part
         avatar_image_part = {
             "mime_type": "image/png",
-            "data": base64.b64decode(avatar)
+            "data": as_avatar_handle(avatar).image_bytes
         }
 
         # The request contains both the text prompt and the avatar image
+        timeout = stage_timeout("image generation", UPLOAD_RESERVE)
         response = model.generate_content(
             [prompt_text, avatar_image_part],
             safety_settings={
@@ -76,7 +147,8 @@ async def generate_image_google(prompt_text, avatar):
                 HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
                 HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
                 HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-            }
+            },
+            request_options={"timeout": timeout} if timeout else None
         )
         
         # Extract the image data from the response
@@ -97,34 +169,103 @@ async def generate_image_google(prompt_text, avatar):
         raise
 
 
-async def generate_image(prompt_text, avatar):
+# Image generation settings; also part of the panel image cache key
+IMAGE_MODEL = "gpt-5-mini"
+IMAGE_SIZE = "1024x1024"
+IMAGE_QUALITY = "medium"
+# The quick first pass of progressive rendering. The image tool has no size
+# below 1024x1024, so drafts only drop the quality.
+DRAFT_IMAGE_QUALITY = "low"
+
+# Upload the avatar to the Files API once per job and reference it by id,
+# instead of sending it inline with every panel request
+UPLOAD_AVATAR = os.getenv("UPLOAD_AVATAR", "false").lower() == "true"
+
+
+class AvatarHandle:
+    """
+    The avatar of one job, prepared once and shared by all of its panel
+    requests: the data URL is built once, the raw bytes are decoded at most
+    once, and with UPLOAD_AVATAR the image is sent to the provider only once.
+    A job without an avatar gets a handle with none, and its panels are drawn
+    from the prompt alone.
+    """
+
+    def __init__(self, avatar_b64: str = None):
+        self.b64 = avatar_b64 or None
+        self.data_url = f"data:image/png;base64,{avatar_b64}" if self.b64 else None
+        self.digest = hashlib.sha256((avatar_b64 or "").encode("utf-8")).hexdigest()
+        self.file_id = None
+        self._image_bytes = None
+
+    @property
+    def image_bytes(self) -> bytes:
+        if self._image_bytes is None and self.b64:
+            self._image_bytes = base64.b64decode(self.b64)
+        return self._image_bytes
+
+    async def prepare(self):
+        """Uploads the avatar when UPLOAD_AVATAR is on. Falls back to the inline data URL on failure."""
+        if not UPLOAD_AVATAR or self.file_id or not self.b64:
+            return
+        try:
+            uploaded = await get_async_client().files.create(
+                file=("avatar.png", self.image_bytes, "image/png"),
+                purpose="vision"
+            )
+            self.file_id = uploaded.id
+        except Exception as e:
+            logging.warning(f"Avatar upload failed, sending it inline instead: {e}")
+
+    async def release(self):
+        """Deletes the uploaded avatar, if there is one."""
+        if not self.file_id:
+            return
+        try:
+            await get_async_client().files.delete(self.file_id)
+        except Exception as e:
+            logging.warning(f"Failed to delete uploaded avatar {self.file_id}: {e}")
+        self.file_id = None
+
+    def input_image(self) -> dict:
+        """The Responses API input part that references the avatar, or None without one."""
+        if not self.b64:
+            return None
+        if self.file_id:
+            return {"type": "input_image", "file_id": self.file_id}
+        return {"type": "input_image", "image_url": self.data_url}
+
+
+def as_avatar_handle(avatar) -> AvatarHandle:
+    return avatar if isinstance(avatar, AvatarHandle) else AvatarHandle(avatar)
+
+
+async def generate_image(prompt_text, avatar, quality=IMAGE_QUALITY):
     """
     This is the current image geneator that uses openAI API
     
     """
     #we have to build the input list for the api call
 
-    content_list = [
-        {"type": "input_text", "text": prompt_text},
-        {
-            "type": "input_image",
-            "image_url": f"data:image/png;base64,{avatar}"
-        }
-    ]
+    avatar_image = as_avatar_handle(avatar).input_image()
+    content_list = [{"type": "input_text", "text": prompt_text}] + ([avatar_image] if avatar_image else [])
+    # Leaves time to upload the image before the job's deadline
+    timeout = openai_timeout("image generation", UPLOAD_RESERVE)
 
 
     try:
-        response = await async_client.responses.create(
-            model="gpt-5-mini",
+        response = await get_async_client().responses.create(
+            model=IMAGE_MODEL,
             input=[{"role": "user", "content": content_list}],
             tools=[
                 {
                     "type": "image_generation",
-                    "size": "1024x1024",     
-                    "quality": "medium",       
+                    "size": IMAGE_SIZE,
+                    "quality": quality,
                     "moderation": "low"       
                 }
             ],
+            timeout=timeout
         )
         # Safely extract the image result from the response output list.
         image_generation_call = next((out for out in response.output if out.type == "image_generation_call"), None)
@@ -147,7 +288,8 @@ async def generate_image(prompt_text, avatar):
 async def generate_image_flux_ultra(prompt_text, avatar, seed=None): 
 
     # Install `requests` (e.g. `pip install requests`) and `Pillow` (e.g. `pip install Pillow`), then run:
-    
+    import requests
+
     BFL_API_KEY = os.getenv("BFL_API_KEY")
 
     if not BFL_API_KEY:
@@ -164,7 +306,7 @@ async def generate_image_flux_ultra(prompt_text, avatar, seed=None):
 
     payload = {
         'prompt': prompt_text,
-        'image_prompt': avatar, # Use the explicit parameter for the avatar
+        'image_prompt': as_avatar_handle(avatar).b64, # Use the explicit parameter for the avatar
         'image_prompt_strength': 0.7, # A good starting point, tune between 0.0 and 1.0
         'seed': seed, # Pass the seed for consistency
         'width': 1024, # Or your desired dimensions
@@ -176,7 +318,7 @@ async def generate_image_flux_ultra(prompt_text, avatar, seed=None):
 
     try:
         # The polling logic is the same as before
-        response = requests.post(flux_url, headers=headers, json=payload, timeout=15)
+        response = requests.post(flux_url, headers=headers, json=payload, timeout=stage_timeout("FLUX Ultra", UPLOAD_RESERVE, cap=15))
         print("have some type ofg return after the response call")
         response.raise_for_status()
         request_data = response.json()
@@ -192,8 +334,12 @@ async def generate_image_flux_ultra(prompt_text, avatar, seed=None):
 
         max_attempts = 120 # Increased timeout for potentially larger images
         for attempt in range(max_attempts):
+            left = time_left(UPLOAD_RESERVE)
+            if left is not None and left <= 0:
+                print("FLUX Ultra job ran out of time before the job's deadline.")
+                return None
             time.sleep(0.5)
-            result_response = requests.get(polling_url, headers=headers)
+            result_response = requests.get(polling_url, headers=headers, timeout=stage_timeout("FLUX Ultra", UPLOAD_RESERVE, cap=15))
             result_data = result_response.json()
 
             status = result_data.get('status')
@@ -206,7 +352,7 @@ async def generate_image_flux_ultra(prompt_text, avatar, seed=None):
                     return None
                 
                 print("FLUX Ultra image ready. Downloading...")
-                image_response = requests.get(signed_url)
+                image_response = requests.get(signed_url, timeout=stage_timeout("FLUX Ultra", UPLOAD_RESERVE, cap=60))
                 image_response.raise_for_status()
                 image_content = image_response.content
                 print(f"FLUX Ultra image downloaded successfully, size: {len(image_content)} bytes")
@@ -234,7 +380,7 @@ def transcribe_audio(audio_bytes):
     audio_file = BytesIO(audio_bytes)
     audio_file.name = "audio.m4a"  # OpenAI expects a filename
 
-    transcription = client.audio.transcriptions.create(
+    transcription = get_client().audio.transcriptions.create(
         model="whisper-1",
         file=audio_file,
         response_format="text"
@@ -260,7 +406,7 @@ def generate_avatar_from_image(image_bytes: bytes, prompt_text: str) -> bytes:
         image_to_send = ("user_image.png", image_bytes)
 
         # This API call is adapted from your old, working code
-        response = client.images.edit(
+        response = get_client().images.edit(
             model="gpt-image-1",
             image=[image_to_send], # Pass the image bytes directly
             prompt=prompt_text,
@@ -284,6 +430,35 @@ def generate_avatar_from_image(image_bytes: bytes, prompt_text: str) -> bytes:
         print(f"An OpenAI API error occurred during avatar generation: {e}")
         raise e
 
+async def edit_avatar_image(image_bytes: bytes, prompt_text: str) -> str:
+    """
+    Non-blocking version of generate_avatar_from_image for request handlers.
+    Returns the edited image as base64, as the API sends it.
+    """
+    response = await get_async_client().images.edit(
+        model="gpt-image-1",
+        image=[("user_image.jpg", image_bytes)],
+        prompt=prompt_text,
+        n=1,
+        size="1024x1024"
+    )
+    b64_string = response.data[0].b64_json
+    if not b64_string:
+        raise Exception("API call returned an empty image string.")
+    return b64_string
+
+def fallback_image_prompt(panel_data, style_description):
+    """Joins the panel fields into a prompt when the LLM assembly step fails."""
+    narrative_parts = [
+        panel_data.get("composition", ""),
+        panel_data.get("action_and_emotion", ""),
+        panel_data.get("setting_and_lighting", "")
+    ]
+    anchor_tags = panel_data.get("character_notes") or []
+    full_prompt_parts = [style_description] + narrative_parts + anchor_tags
+    final_parts = [part for part in full_prompt_parts if part]
+    return ", ".join(final_parts)
+
 def complete_prompt(panel_data, style_description):
 
     image_prompt = build_final_image_prompt(panel_data, style_description)
@@ -293,31 +468,55 @@ def complete_prompt(panel_data, style_description):
 
     try:
         # This is the API call to the fast, cheap model using the new Responses API
-        response = client.responses.create(
+        response = get_client().responses.create(
             model="gpt-5-mini",
             instructions=system_prompt,
             input=user_content,
             reasoning={"effort": "low"},  # Perfect for fast, rule-based tasks
-            text={"verbosity": "low"}   # Ensures a clean, direct output without conversational filler
+            text={"verbosity": "low"},   # Ensures a clean, direct output without conversational filler
+            timeout=openai_timeout("prompt assembly", PANEL_RESERVE)
         )
+        record_token_usage("image_prompt", response.usage)
         final_prompt = response.output_text.strip()
         return final_prompt
     except Exception as e:
         print(f"An error occurred during prompt assembly: {e}")
         # Fallback to a simple join if the API call fails, ensuring the pipeline doesn't crash
-        narrative_parts = [
-            panel_data.get("composition", ""),
-            panel_data.get("action_and_emotion", ""),
-            panel_data.get("setting_and_lighting", "")
-        ]
-        anchor_tags = panel_data.get("character_notes",)
-        full_prompt_parts = [style_description] + narrative_parts + anchor_tags
-        final_parts = [part for part in full_prompt_parts if part]
-        return ", ".join(final_parts)
-
+        return fallback_image_prompt(panel_data, style_description)
 
+async def complete_prompts_batch(panels, style_description, dream_id=None):
+    """
+    Refines the image prompts of every panel in one async LLM call.
 
+    Returns one prompt per panel, in order. Any panel the model did not
+    return a usable prompt for falls back to the simple string join.
+    """
+    system_prompt, user_content = build_batch_image_prompts(panels, style_description)
+    prompts = []
 
+    try:
+        response = await get_async_client().responses.create(
+            model="gpt-5-mini",
+            instructions=system_prompt,
+            input=user_content,
+            reasoning={"effort": "low"},
+            text={"verbosity": "low"},
+            # Out of time, the panels render from the plain prompts below
+            timeout=openai_timeout("prompt assembly", PANEL_RESERVE)
+        )
+        record_token_usage("image_prompt_batch", response.usage, dream_id)
+        prompts = json.loads(response.output_text).get("prompts") or []
 
+        if len(prompts) != len(panels):
+            print(f"[{dream_id}] Prompt batch returned {len(prompts)} prompts for {len(panels)} panels")
+    except Exception as e:
+        print(f"[{dream_id}] An error occurred during batched prompt assembly: {e}")
 
-    
+    final_prompts = []
+    for i, panel in enumerate(panels):
+        prompt = prompts[i] if i < len(prompts) else None
+        if isinstance(prompt, str) and prompt.strip():
+            final_prompts.append(prompt.strip())
+        else:
+            final_prompts.append(fallback_image_prompt(panel, style_description))
+    return final_prompts
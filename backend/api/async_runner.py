@@ -0,0 +1,206 @@
+# async_runner.py
+#
+# Long-lived alternative to `rq worker`. Pulls jobs from the same Redis queue
+# but runs many comic pipelines concurrently on one persistent event loop, so
+# the OpenAI/Supabase clients and their connection pools stay warm between
+# jobs.
+#
+#   python -m backend.api.async_runner
+#
+# ASYNC_WORKER_CONCURRENCY caps how many jobs run at once (default 16).
+# Failed jobs with retries left are requeued as RQ would, and the runner also
+# enqueues retries scheduled with an interval once they are due.
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import signal
+import socket
+import traceback
+from rq import Queue
+from rq.exceptions import DequeueTimeout
+from rq.executions import Execution
+from rq.job import JobStatus
+from rq.scheduler import RQScheduler
+from rq.utils import now
+from .redis_client import redis_conn
+from .job_context import running_job
+from .worker import run_comic_generation, run_panel_regeneration, run_panel_upgrade
+
+QUEUE_NAME = os.getenv("RQ_NAME", "comics_queue")
+CONCURRENCY = int(os.getenv("ASYNC_WORKER_CONCURRENCY", 16))
+DEQUEUE_TIMEOUT = 5  # seconds, also how often a shutdown request is noticed
+SCHEDULER_INTERVAL = 5  # seconds between looks for retries that are due
+DEFAULT_JOB_TIMEOUT = 180
+DEFAULT_RESULT_TTL = 500
+
+# Jobs whose pipeline is natively async and can share the runner's loop.
+# Everything else is run in a thread through job.perform(), so it must not
+# touch the shared async OpenAI client from its own event loop.
+ASYNC_JOBS = {
+    "backend.api.worker.run_comic_generation_worker": run_comic_generation,
+    "backend.api.worker.run_panel_regeneration_worker": run_panel_regeneration,
+    "backend.api.worker.run_panel_upgrade_worker": run_panel_upgrade,
+}
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class AsyncJobRunner:
+    def __init__(self, queue: Queue, concurrency: int):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.name = f"async-runner-{socket.gethostname()}-{os.getpid()}"
+        self.slots = asyncio.Semaphore(concurrency)
+        self.tasks = set()
+        self.stopping = False
+
+    def request_stop(self):
+        """Stops taking new jobs; jobs already running are allowed to finish."""
+        if not self.stopping:
+            logging.info(f"{self.name}: shutdown requested, draining {len(self.tasks)} running jobs")
+        self.stopping = True
+
+    async def run(self):
+        logging.info(f"{self.name}: listening on '{self.queue.name}' with concurrency {self.concurrency}")
+        scheduler = asyncio.create_task(self.run_scheduler())
+
+        while not self.stopping:
+            await self.slots.acquire()
+            if self.stopping:
+                self.slots.release()
+                break
+
+            try:
+                result = await asyncio.to_thread(
+                    Queue.dequeue_any, [self.queue], DEQUEUE_TIMEOUT, connection=self.queue.connection
+                )
+            except DequeueTimeout:
+                result = None
+            except Exception as e:
+                logging.error(f"{self.name}: failed to dequeue: {e}")
+                result = None
+                await asyncio.sleep(1)
+
+            if result is None:
+                self.slots.release()
+                continue
+
+            job, queue = result
+            task = asyncio.create_task(self.execute(job, queue))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        await scheduler
+        logging.info(f"{self.name}: stopped")
+
+    async def run_scheduler(self):
+        """
+        Enqueues jobs from the scheduled registry once they are due, which is
+        where Retry intervals put a failed job. Only one process per queue
+        does this at a time, whether it is a runner or an `rq worker --with-scheduler`.
+        """
+        scheduler = RQScheduler([self.queue], connection=self.queue.connection)
+        try:
+            while not self.stopping:
+                try:
+                    await asyncio.to_thread(self.enqueue_due_jobs, scheduler)
+                except Exception as e:
+                    logging.error(f"{self.name}: failed to enqueue scheduled jobs: {e}")
+                await asyncio.sleep(SCHEDULER_INTERVAL)
+        finally:
+            await asyncio.to_thread(scheduler.release_locks)
+
+    @staticmethod
+    def enqueue_due_jobs(scheduler: RQScheduler):
+        if scheduler.acquired_locks:
+            scheduler.heartbeat()
+        else:
+            scheduler.acquire_locks()
+        if scheduler.acquired_locks:
+            scheduler.enqueue_scheduled_jobs()
+
+    async def execute(self, job, queue):
+        timeout = job.timeout or DEFAULT_JOB_TIMEOUT
+        execution = self.start(job, queue, timeout)
+        # This task's context, so only this job's pipeline sees it
+        running_job.set(job)
+
+        try:
+            logging.info(f"{self.name}: starting job {job.id} ({job.func_name})")
+            pipeline_fn = ASYNC_JOBS.get(job.func_name)
+            if pipeline_fn:
+                coro = pipeline_fn(*job.args, **job.kwargs)
+            else:
+                coro = asyncio.to_thread(job.perform)
+
+            result = await asyncio.wait_for(coro, timeout=timeout)
+            self.finish(job, execution, result)
+            logging.info(f"{self.name}: job {job.id} finished")
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                exc_string = f"Job exceeded its timeout of {timeout} seconds"
+            else:
+                exc_string = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+            self.fail(job, queue, execution, exc_string)
+            logging.error(f"{self.name}: job {job.id} failed: {e}")
+        finally:
+            self.slots.release()
+
+    def start(self, job, queue, timeout: int):
+        """Moves the job from the intermediate queue into the started registry."""
+        with redis_conn.pipeline() as pipeline:
+            # The execution expires with the job's timeout, so a crashed runner
+            # leaves its jobs to RQ's abandoned-job cleanup
+            execution = Execution.create(job, timeout + 60, pipeline=pipeline)
+            job.prepare_for_execution(self.name, pipeline=pipeline)
+            pipeline.lrem(queue.intermediate_queue_key, 1, job.id)
+            pipeline.execute()
+        job.started_at = now()
+        return execution
+
+    def finish(self, job, execution, result):
+        job.ended_at = now()
+        job._result = result
+        result_ttl = job.get_result_ttl(DEFAULT_RESULT_TTL)
+        with redis_conn.pipeline() as pipeline:
+            if result_ttl != 0:
+                job._handle_success(result_ttl, pipeline=pipeline)
+            else:
+                job.set_status(JobStatus.FINISHED, pipeline=pipeline)
+            job.cleanup(result_ttl, pipeline=pipeline, remove_from_queue=False)
+            execution.delete(job=job, pipeline=pipeline)
+            pipeline.execute()
+
+    def fail(self, job, queue, execution, exc_string: str):
+        """Requeues (or schedules) the job if its Retry has attempts left, as RQ's handle_job_failure does, else fails it."""
+        job.ended_at = now()
+        retry = job.should_retry
+        with redis_conn.pipeline() as pipeline:
+            if not retry:
+                job.set_status(JobStatus.FAILED, pipeline=pipeline)
+                job._handle_failure(exc_string, pipeline=pipeline)
+            execution.delete(job=job, pipeline=pipeline)
+            if retry:
+                job.retry(queue, pipeline)
+                logging.info(f"{self.name}: job {job.id} will be retried, {job.retries_left} retries left")
+            pipeline.execute()
+
+
+async def main():
+    loop = asyncio.get_running_loop()
+    # Blocking Supabase calls and thread-run jobs share this pool
+    loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(max_workers=CONCURRENCY * 4 + 4))
+
+    runner = AsyncJobRunner(Queue(QUEUE_NAME, connection=redis_conn), CONCURRENCY)
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, runner.request_stop)
+
+    await runner.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
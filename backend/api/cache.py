@@ -0,0 +1,114 @@
+# cache.py
+import hashlib
+import json
+import logging
+import os
+from .redis_client import redis_conn
+
+STORYBOARD_CACHE_TTL = int(os.getenv("STORYBOARD_CACHE_TTL", 60 * 60 * 24))  # 1 day
+
+
+def storyboard_cache_key(story: str, num_panels: int, style_description: str) -> str:
+    """Content hash of everything that shapes the storyboard."""
+    content = json.dumps([story, num_panels, style_description])
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return f"storyboard:{digest}"
+
+
+def get_cached_storyboard(story: str, num_panels: int, style_description: str):
+    """Returns a previously generated storyboard, or None on a miss."""
+    try:
+        cached = redis_conn.get(storyboard_cache_key(story, num_panels, style_description))
+        return json.loads(cached) if cached else None
+    except Exception as e:
+        # The cache is an optimization, never a reason to fail a job
+        logging.warning(f"Storyboard cache read failed: {e}")
+        return None
+
+
+def cache_storyboard(story: str, num_panels: int, style_description: str, panel_data: dict):
+    """Stores a storyboard so retries of the same story skip the LLM."""
+    if not panel_data or not panel_data.get("panels"):
+        return
+
+    try:
+        redis_conn.set(
+            storyboard_cache_key(story, num_panels, style_description),
+            json.dumps(panel_data),
+            ex=STORYBOARD_CACHE_TTL
+        )
+    except Exception as e:
+        logging.warning(f"Storyboard cache write failed: {e}")
+
+
+AVATAR_CACHE_TTL = int(os.getenv("AVATAR_CACHE_TTL", 60 * 60))  # 1 hour
+
+
+def avatar_cache_key(user_id: str) -> str:
+    """One hash per user, with the latest avatar path of each style as a field."""
+    return f"avatar:latest:{user_id}"
+
+
+def get_cached_avatar_path(user_id: str, style: str):
+    """Returns the user's latest avatar path for a style, or None on a miss."""
+    try:
+        cached = redis_conn.hget(avatar_cache_key(user_id), style)
+        return cached.decode("utf-8") if cached else None
+    except Exception as e:
+        logging.warning(f"Avatar cache read failed: {e}")
+        return None
+
+
+def cache_avatar_path(user_id: str, style: str, avatar_path: str):
+    try:
+        pipe = redis_conn.pipeline()
+        pipe.hset(avatar_cache_key(user_id), style, avatar_path)
+        pipe.expire(avatar_cache_key(user_id), AVATAR_CACHE_TTL)
+        pipe.execute()
+    except Exception as e:
+        logging.warning(f"Avatar cache write failed: {e}")
+
+
+def invalidate_avatar_path(user_id: str, style: str = None):
+    """Forgets the cached avatar of one style, or of every style when none is given."""
+    try:
+        if style:
+            redis_conn.hdel(avatar_cache_key(user_id), style)
+        else:
+            redis_conn.delete(avatar_cache_key(user_id))
+    except Exception as e:
+        logging.warning(f"Avatar cache invalidation failed: {e}")
+
+
+PANEL_CACHE_TTL = int(os.getenv("PANEL_CACHE_TTL", 60 * 60 * 24))  # 1 day
+
+
+def panel_image_cache_key(prompt: str, avatar_digest: str, provider: str, model: str, size: str, quality: str) -> str:
+    """Content hash of everything that shapes a rendered panel."""
+    content = json.dumps([prompt, avatar_digest, provider, model, size, quality])
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return f"panel:{digest}"
+
+
+def get_cached_panel_image(cache_key: str):
+    """Returns the storage path of an identical, already rendered panel, or None."""
+    try:
+        cached = redis_conn.get(cache_key)
+        return cached.decode("utf-8") if cached else None
+    except Exception as e:
+        logging.warning(f"Panel cache read failed: {e}")
+        return None
+
+
+def cache_panel_image(cache_key: str, panel_path: str):
+    try:
+        redis_conn.set(cache_key, panel_path, ex=PANEL_CACHE_TTL)
+    except Exception as e:
+        logging.warning(f"Panel cache write failed: {e}")
+
+
+def forget_panel_image(cache_key: str):
+    try:
+        redis_conn.delete(cache_key)
+    except Exception as e:
+        logging.warning(f"Panel cache delete failed: {e}")
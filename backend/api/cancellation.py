@@ -0,0 +1,90 @@
+# cancellation.py
+import asyncio
+import logging
+import os
+from rq.job import Job, JobStatus
+from .redis_client import redis_conn
+
+# Outlives the longest job, so a cancel is never forgotten while its job runs
+CANCEL_TTL = int(os.getenv("CANCEL_TTL", 60 * 60))  # 1 hour
+# How often a running job looks for a cancel
+CANCEL_POLL_INTERVAL = 1  # seconds
+
+
+class JobCancelledError(Exception):
+    def __init__(self, dream_id: str):
+        self.dream_id = dream_id
+        super().__init__(f"Job for comic {dream_id} was cancelled")
+
+
+def cancel_key(dream_id: str) -> str:
+    return f"comic:cancel:{dream_id}"
+
+
+def comic_job_key(dream_id: str) -> str:
+    return f"comic:job:{dream_id}"
+
+
+def record_comic_job(dream_id: str, job_id: str):
+    """Remembers the job working on a comic, and forgets any cancel of an earlier one."""
+    try:
+        pipe = redis_conn.pipeline()
+        pipe.set(comic_job_key(dream_id), job_id, ex=CANCEL_TTL)
+        pipe.delete(cancel_key(dream_id))
+        pipe.execute()
+    except Exception as e:
+        logging.warning(f"[{dream_id}] Failed to record job {job_id}: {e}")
+
+
+def cancel_comic_job(dream_id: str) -> bool:
+    """
+    Cancels the job working on a comic. A job still in the queue is removed
+    from it; a running job sees the cancel within CANCEL_POLL_INTERVAL.
+    Returns True if the job was removed before it started.
+    """
+    try:
+        redis_conn.set(cancel_key(dream_id), 1, ex=CANCEL_TTL)
+        job_id = redis_conn.get(comic_job_key(dream_id))
+        if not job_id:
+            return False
+
+        job = Job.fetch(job_id.decode("utf-8"), connection=redis_conn)
+        if job.get_status() in (JobStatus.QUEUED, JobStatus.DEFERRED, JobStatus.SCHEDULED):
+            job.cancel()
+            logging.info(f"[{dream_id}] Removed queued job {job.id}")
+            return True
+    except Exception as e:
+        # The flag is what running jobs act on; failing to dequeue only costs a start
+        logging.warning(f"[{dream_id}] Failed to cancel job: {e}")
+    return False
+
+
+def is_cancelled(dream_id: str) -> bool:
+    try:
+        return bool(redis_conn.exists(cancel_key(dream_id)))
+    except Exception as e:
+        logging.warning(f"[{dream_id}] Failed to check for cancel: {e}")
+        return False
+
+
+async def run_until_cancelled(dream_id: str, coro):
+    """
+    Runs a job's pipeline, cancelling it (and so every panel task it is
+    awaiting) once the comic's job is cancelled. Raises JobCancelledError then.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=CANCEL_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await asyncio.to_thread(is_cancelled, dream_id):
+                break
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+    logging.info(f"[{dream_id}] Job cancelled, stopping its tasks")
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    raise JobCancelledError(dream_id)
@@ -0,0 +1,71 @@
+# checkpoint.py
+import json
+import logging
+import os
+from .redis_client import redis_conn
+
+CHECKPOINT_TTL = int(os.getenv("CHECKPOINT_TTL", 60 * 60 * 24))  # 1 day
+# A comic job that fails or is killed part way is run again this many times,
+# resuming from its checkpoints
+COMIC_JOB_RETRIES = int(os.getenv("COMIC_JOB_RETRIES", 2))
+COMIC_RETRY_INTERVALS = [10, 30]  # seconds
+
+
+def checkpoint_key(dream_id: str) -> str:
+    return f"comic:checkpoint:{dream_id}"
+
+
+def load_storyboard_checkpoint(dream_id: str):
+    """Returns the storyboard saved by an earlier run of this job, if any."""
+    try:
+        saved = redis_conn.hget(checkpoint_key(dream_id), "storyboard")
+        return json.loads(saved) if saved else None
+    except Exception as e:
+        logging.warning(f"[{dream_id}] Failed to read storyboard checkpoint: {e}")
+        return None
+
+
+def save_storyboard_checkpoint(dream_id: str, panel_data: dict):
+    try:
+        key = checkpoint_key(dream_id)
+        pipe = redis_conn.pipeline()
+        pipe.hset(key, "storyboard", json.dumps(panel_data))
+        pipe.expire(key, CHECKPOINT_TTL)
+        pipe.execute()
+    except Exception as e:
+        logging.warning(f"[{dream_id}] Failed to save storyboard checkpoint: {e}")
+
+
+def load_panel_checkpoint(dream_id: str, index: int):
+    """Returns the storage path of a panel that was already uploaded, if any."""
+    try:
+        saved = redis_conn.hget(checkpoint_key(dream_id), f"panel:{index}")
+        return saved.decode("utf-8") if saved else None
+    except Exception as e:
+        logging.warning(f"[{dream_id}] Failed to read checkpoint for Panel {index+1}: {e}")
+        return None
+
+
+def save_panel_checkpoint(dream_id: str, index: int, panel_path: str):
+    try:
+        key = checkpoint_key(dream_id)
+        pipe = redis_conn.pipeline()
+        pipe.hset(key, f"panel:{index}", panel_path)
+        pipe.expire(key, CHECKPOINT_TTL)
+        pipe.execute()
+    except Exception as e:
+        logging.warning(f"[{dream_id}] Failed to save checkpoint for Panel {index+1}: {e}")
+
+
+def clear_panel_checkpoint(dream_id: str, index: int):
+    try:
+        redis_conn.hdel(checkpoint_key(dream_id), f"panel:{index}")
+    except Exception as e:
+        logging.warning(f"[{dream_id}] Failed to clear checkpoint for Panel {index+1}: {e}")
+
+
+def clear_checkpoint(dream_id: str):
+    try:
+        redis_conn.delete(checkpoint_key(dream_id))
+    except Exception as e:
+        logging.warning(f"[{dream_id}] Failed to clear checkpoint: {e}")
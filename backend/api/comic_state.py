@@ -0,0 +1,112 @@
+# comic_state.py
+import logging
+from .db_client import supabase
+from .status_cache import set_comic_status
+
+# The statuses a comic can move to from each status. None is a comic that
+# has not been inserted yet; a complete comic goes back to processing when
+# one of its panels is regenerated, and is completed again when its draft
+# panels are replaced with full-quality ones.
+TRANSITIONS = {
+    None: {"processing"},
+    "processing": {"complete", "error"},
+    "complete": {"processing", "complete"},
+    "error": set(),
+}
+
+
+class InvalidTransitionError(Exception):
+    def __init__(self, dream_id: str, from_status: str, to_status: str, message: str = None):
+        self.dream_id = dream_id
+        self.from_status = from_status
+        self.to_status = to_status
+        super().__init__(message or f"Comic {dream_id} cannot move from '{from_status}' to '{to_status}'")
+
+
+class ConcurrentTransitionError(InvalidTransitionError):
+    """The comic left `from_status` after it was read, so the transition was not written."""
+
+    def __init__(self, dream_id: str, from_status: str, to_status: str):
+        super().__init__(
+            dream_id, from_status, to_status,
+            f"Comic {dream_id} is no longer '{from_status}', so it was not moved to '{to_status}'"
+        )
+
+
+class ComicRecord:
+    """
+    Owns one row of the `comics` table.
+
+    Field changes made with stage() are held back and written together with
+    the next status transition, so a comic costs one insert and one terminal
+    update. Every transition is also published to the status cache.
+    """
+
+    def __init__(self, dream_id: str, user_id: str, status: str = "processing"):
+        self.dream_id = dream_id
+        self.user_id = user_id
+        self.status = status
+        self.pending = {}
+
+    @classmethod
+    def create(cls, user_id: str, **fields) -> "ComicRecord":
+        """Inserts a new comic, already processing, with the given fields."""
+        response = supabase.from_("comics").insert({
+            "user_id": user_id,
+            "status": "processing",
+            **fields
+        }).execute()
+
+        record = cls(response.data[0]["id"], user_id)
+        set_comic_status(record.dream_id, record.status, user_id=user_id)
+        return record
+
+    def stage(self, **fields):
+        """Records field changes to be written with the next transition."""
+        self.pending.update(fields)
+
+    def transition(self, status: str, **fields):
+        """
+        Moves the comic to `status`, writing it and all staged fields in one update.
+        The update only applies while the row still has the status this record
+        was read with, so of two writers racing from the same status one wins
+        and the other gets ConcurrentTransitionError instead of overwriting it.
+        """
+        if status not in TRANSITIONS.get(self.status, set()):
+            raise InvalidTransitionError(self.dream_id, self.status, status)
+
+        changes = {**self.pending, **fields, "status": status}
+        response = supabase.from_("comics") \
+            .update(changes) \
+            .eq("id", self.dream_id) \
+            .eq("status", self.status) \
+            .execute()
+        if not response.data:
+            raise ConcurrentTransitionError(self.dream_id, self.status, status)
+
+        logging.info(f"[{self.dream_id}] comic {self.status} -> {status} ({', '.join(sorted(changes))})")
+        self.status = status
+        self.pending = {}
+
+        set_comic_status(
+            self.dream_id,
+            status,
+            image_urls=changes.get("image_urls"),
+            strip_path=changes.get("strip_path"),
+            error_type=changes.get("error_type"),
+            error_message=changes.get("error_message"),
+            user_id=self.user_id
+        )
+
+    def complete(self, image_urls: list, **fields):
+        self.transition(
+            "complete",
+            image_urls=image_urls,
+            panel_count=len(image_urls),
+            error_type=None,
+            error_message=None,
+            **fields
+        )
+
+    def fail(self, error_type: str, error_message: str):
+        self.transition("error", error_type=error_type, error_message=error_message)
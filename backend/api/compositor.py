@@ -0,0 +1,62 @@
+# compositor.py
+import math
+import os
+
+# How the panels are arranged: "vertical" (one column), "horizontal" (one row) or "grid"
+STRIP_LAYOUT = os.getenv("STRIP_LAYOUT", "vertical")
+STRIP_COLUMNS = int(os.getenv("STRIP_COLUMNS", 2))  # grid layout only
+STRIP_GUTTER = int(os.getenv("STRIP_GUTTER", 16))  # pixels between and around the panels
+# Panels are scaled down so the whole strip is at most this wide
+STRIP_MAX_WIDTH = int(os.getenv("STRIP_MAX_WIDTH", 2048))
+STRIP_JPEG_QUALITY = int(os.getenv("STRIP_JPEG_QUALITY", 90))
+STRIP_BACKGROUND = (255, 255, 255)
+
+
+def layout_columns(layout: str, count: int, columns: int) -> int:
+    if layout == "horizontal":
+        return count
+    if layout == "grid":
+        return max(1, min(columns, count))
+    return 1
+
+
+def compose_strip(images: list, layout: str = STRIP_LAYOUT, columns: int = STRIP_COLUMNS,
+                  gutter: int = STRIP_GUTTER, max_width: int = STRIP_MAX_WIDTH) -> bytes:
+    """
+    Lays out encoded panel images, in reading order, on one canvas and
+    returns it as a JPEG. Every panel is scaled to the size of the first, so
+    the cells line up.
+    """
+    # Imported on first use, like the face detection in helper.py
+    import cv2
+    import numpy as np
+
+    panels = [cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) for data in images]
+    if not panels:
+        raise ValueError("No panels to compose")
+    if any(panel is None for panel in panels):
+        raise ValueError("A panel could not be decoded")
+
+    cols = layout_columns(layout, len(panels), columns)
+    rows = math.ceil(len(panels) / cols)
+    height, width = panels[0].shape[:2]
+    scale = min(1.0, (max_width - gutter * (cols + 1)) / (width * cols))
+    cell_width, cell_height = max(1, int(width * scale)), max(1, int(height * scale))
+
+    canvas = np.full(
+        (rows * cell_height + (rows + 1) * gutter, cols * cell_width + (cols + 1) * gutter, 3),
+        STRIP_BACKGROUND,
+        dtype=np.uint8
+    )
+    for index, panel in enumerate(panels):
+        if panel.shape[:2] != (cell_height, cell_width):
+            panel = cv2.resize(panel, (cell_width, cell_height), interpolation=cv2.INTER_AREA)
+        row, col = divmod(index, cols)
+        top = gutter + row * (cell_height + gutter)
+        left = gutter + col * (cell_width + gutter)
+        canvas[top:top + cell_height, left:left + cell_width] = panel
+
+    ok, encoded = cv2.imencode(".jpg", canvas, [cv2.IMWRITE_JPEG_QUALITY, STRIP_JPEG_QUALITY])
+    if not ok:
+        raise ValueError("The comic strip could not be encoded")
+    return encoded.tobytes()
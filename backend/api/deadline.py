@@ -0,0 +1,80 @@
+# deadline.py
+import asyncio
+import contextvars
+import os
+import time
+from rq import Queue
+from .job_context import current_job
+
+# RQ kills a job that runs longer than its job_timeout
+COMIC_JOB_TIMEOUT = 500  # around 8 minutes
+PANEL_JOB_TIMEOUT = 180
+# Kept back from the job timeout so the result can still be recorded after the deadline
+FINALIZE_RESERVE = int(os.getenv("FINALIZE_RESERVE", 20))  # seconds
+# The storyboard and prompt stages give up while this much is left, so panels can still render
+PANEL_RESERVE = int(os.getenv("PANEL_RESERVE", 120))  # seconds
+# An image must arrive this long before the deadline to still be uploaded
+UPLOAD_RESERVE = int(os.getenv("UPLOAD_RESERVE", 10))  # seconds
+
+# The time.monotonic() by which the current job must be done. Tasks and
+# threads started by the job inherit it.
+job_deadline = contextvars.ContextVar("job_deadline", default=None)
+
+
+class DeadlineExceededError(Exception):
+    def __init__(self, stage: str):
+        self.stage = stage
+        super().__init__(f"{stage} did not finish before the job's deadline")
+
+
+def running_job_timeout(default: int) -> int:
+    """
+    The job_timeout RQ enforces on the running job, which its enqueuer may
+    have set to anything. `default` outside a job, or for a job that never times out.
+    """
+    job = current_job()
+    if job is None:
+        return default
+    # RQ gives a job without a timeout its queue's default
+    timeout = job.timeout or Queue.DEFAULT_TIMEOUT
+    return default if timeout < 0 else timeout
+
+
+def start_deadline(default_timeout: int):
+    """Gives the current job a deadline FINALIZE_RESERVE seconds short of its job_timeout."""
+    job_deadline.set(time.monotonic() + running_job_timeout(default_timeout) - FINALIZE_RESERVE)
+
+
+def time_left(reserve: float = 0):
+    """Seconds until the deadline less `reserve`, or None outside a job with a deadline."""
+    deadline = job_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - reserve - time.monotonic()
+
+
+def stage_timeout(stage: str, reserve: float = 0, cap: float = None):
+    """
+    The timeout for a stage that must end `reserve` seconds before the
+    deadline, at most `cap`. Raises DeadlineExceededError if no time is left.
+    """
+    left = time_left(reserve)
+    if left is None:
+        return cap
+    if left <= 0:
+        raise DeadlineExceededError(stage)
+    return min(left, cap) if cap is not None else left
+
+
+async def within_deadline(stage: str, coro, reserve: float = 0):
+    """Awaits coro, cancelling it once the stage's share of the budget is used up."""
+    try:
+        timeout = stage_timeout(stage, reserve)
+    except DeadlineExceededError:
+        coro.close()
+        raise
+
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceededError(stage)
@@ -1,8 +1,8 @@
 import base64
-import cv2
-import numpy as np
+import os
 from .api_clients import get_moderation
 from .db_client import supabase
+from .cache import get_cached_avatar_path, cache_avatar_path
 from fastapi import HTTPException, Header
 from typing import Dict
 
@@ -72,11 +72,28 @@ def authenticateUser(authorization: str = Header()):
     
     return user
 
-def style_name_to_description(style_name):
+def verify_token(authorization: str = Header()) -> dict:
     """
-    Returns a one to two-sentence description of a given art style.
+    Verifies a Supabase access token locally with the project's JWT secret,
+    without the round trip to the auth server that authenticateUser makes.
+    Returns the token's claims; the user id is claims["sub"].
     """
-    description = {
+    import jwt
+
+    secret = os.getenv("SUPABASE_JWT_SECRET")
+    if not secret:
+        raise HTTPException(status_code=500, detail="SUPABASE_JWT_SECRET is not configured")
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Authorization header is required")
+
+    try:
+        token = authorization.split(" ")[1]
+        return jwt.decode(token, secret, algorithms=["HS256"], audience="authenticated")
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
+
+# Loaded once at import; the API and the workers share the same registry
+STYLE_REGISTRY = {
     "Simpsons": "A cartoon art style defined by flat colors, bold black outlines, and characters with a signature yellow skin tone and large, expressive round eyes. The aesthetic is clean and simple, often set in a satirical suburban environment.",
     "Ghibli": "An art style inspired by classic Japanese animation, characterized by lush, hand-painted watercolor backgrounds, soft and gentle sunlight, and expressive characters. This style evokes a warm, nostalgic feeling with a focus on nature and wonder.",
     "Adventure Time": "A minimalist cartoon style featuring simple, rounded character designs, flexible 'noodle' limbs, and dot eyes. It uses a vibrant palette of flat colors, thick outlines, and whimsical, candy-colored backgrounds.",
@@ -86,7 +103,38 @@ def style_name_to_description(style_name):
     "Disney / Pixar": "A glossy, cinematic 3D animated film style. It features soft, volumetric lighting, vibrant colors, and high-fidelity textures. The characters have expressive, large eyes and friendly, appealing designs suitable for family entertainment.",
     "Retro 80s Anime": "A nostalgic anime style inspired by 80s sci-fi classics, featuring detailed and intricate linework, a muted color palette with pops of vibrant neon lighting, and subtle film grain effects. The aesthetic evokes dystopian, cyberpunk cityscapes with a hand-drawn, vintage feel."
 }
-    return description.get(style_name, "A distinct art style.")
+
+def get_latest_avatar_path(user_id: str, style: str):
+    """
+    Returns the storage path of the user's newest avatar in a style, or None.
+    Served from Redis when possible; the worker invalidates the entry when it
+    finalizes a new avatar and /delete-avatar/ when one is removed.
+    """
+    avatar_path = get_cached_avatar_path(user_id, style)
+    if avatar_path:
+        return avatar_path
+
+    avatar_response = supabase.from_("avatars") \
+        .select("avatar_path") \
+        .eq("user_id", user_id) \
+        .eq("style", style) \
+        .order("created_at", desc=True) \
+        .limit(1) \
+        .single() \
+        .execute()
+
+    if not avatar_response.data or not avatar_response.data.get("avatar_path"):
+        return None
+
+    avatar_path = avatar_response.data["avatar_path"]
+    cache_avatar_path(user_id, style, avatar_path)
+    return avatar_path
+
+def style_name_to_description(style_name):
+    """
+    Returns a one to two-sentence description of a given art style.
+    """
+    return STYLE_REGISTRY.get(style_name, "A distinct art style.")
 
 def current_model():
     return "openai"
@@ -169,6 +217,10 @@ def detect_face_in_image(image_bytes: bytes) -> bool:
     Returns:
         bool: True if at least one face is detected, False otherwise
     """
+    # OpenCV is only needed by the avatar upload route, so load it on first use
+    import cv2
+    import numpy as np
+
     try:
         # Convert bytes to numpy array
         nparr = np.frombuffer(image_bytes, np.uint8)
@@ -0,0 +1,81 @@
+# idempotency.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from fastapi import HTTPException
+from .redis_client import redis_conn
+
+# How long a client-supplied Idempotency-Key maps to its first result
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 60 * 60 * 24))  # 1 day
+# Without a key, identical submissions are only treated as retries within this window
+DEDUP_WINDOW = int(os.getenv("DEDUP_WINDOW", 60))
+# How long a duplicate waits for the first request to finish before giving up
+IN_FLIGHT_WAIT = 10  # seconds
+
+PENDING = b"pending"
+
+
+def idempotency_key(scope: str, user_id: str, client_key: str = None, *inputs) -> tuple:
+    """
+    Returns (redis key, ttl) for a submission. The client's Idempotency-Key is
+    used when given; otherwise the key is a hash of the submission's inputs.
+    """
+    digest = hashlib.sha256()
+    if client_key:
+        digest.update(client_key.encode("utf-8"))
+        ttl = IDEMPOTENCY_TTL
+    else:
+        for part in inputs:
+            data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+            # Length-prefixed so ("ab", "c") and ("a", "bc") hash differently
+            digest.update(len(data).to_bytes(8, "big"))
+            digest.update(data)
+        ttl = DEDUP_WINDOW
+
+    source = "key" if client_key else "hash"
+    return f"idempotency:{scope}:{user_id}:{source}:{digest.hexdigest()}", ttl
+
+
+async def claim_idempotency_key(key: str, ttl: int):
+    """
+    Claims a submission. Returns None when the caller is the first and should
+    go ahead, or the first submission's response when this is a duplicate.
+    Raises 409 if the first submission is still running after IN_FLIGHT_WAIT.
+    """
+    try:
+        if redis_conn.set(key, PENDING, nx=True, ex=ttl):
+            return None
+
+        for _ in range(int(IN_FLIGHT_WAIT / 0.2)):
+            existing = redis_conn.get(key)
+            if existing is None:
+                # The first submission failed and released the key; this one takes over
+                if redis_conn.set(key, PENDING, nx=True, ex=ttl):
+                    return None
+            elif existing != PENDING:
+                return json.loads(existing)
+            await asyncio.sleep(0.2)
+    except Exception as e:
+        # Deduplication must never block a submission
+        logging.warning(f"Idempotency check for {key} failed: {e}")
+        return None
+
+    raise HTTPException(status_code=409, detail="An identical request is already being processed")
+
+
+def complete_idempotency_key(key: str, response: dict, ttl: int):
+    """Stores the response that duplicates of this submission will receive."""
+    try:
+        redis_conn.set(key, json.dumps(response), ex=ttl)
+    except Exception as e:
+        logging.warning(f"Failed to store idempotent response for {key}: {e}")
+
+
+def release_idempotency_key(key: str):
+    """Lets a failed submission be retried."""
+    try:
+        redis_conn.delete(key)
+    except Exception as e:
+        logging.warning(f"Failed to release idempotency key {key}: {e}")
@@ -0,0 +1,128 @@
+# image_download.py
+import asyncio
+import ipaddress
+import os
+import socket
+from functools import lru_cache
+from urllib.parse import urlparse
+
+# A photo larger than this is refused without being read to the end
+IMAGE_DOWNLOAD_MAX_BYTES = int(os.getenv("IMAGE_DOWNLOAD_MAX_BYTES", 10 * 1024 * 1024))  # 10 MB
+IMAGE_DOWNLOAD_TIMEOUT = float(os.getenv("IMAGE_DOWNLOAD_TIMEOUT", 15))  # seconds
+IMAGE_DOWNLOAD_MAX_REDIRECTS = int(os.getenv("IMAGE_DOWNLOAD_MAX_REDIRECTS", 5))
+# Hosts that may be downloaded from even though they are not public, e.g. a
+# photo server on localhost during development. Comma separated.
+IMAGE_DOWNLOAD_ALLOWED_HOSTS = {
+    host.strip().lower() for host in os.getenv("IMAGE_DOWNLOAD_ALLOWED_HOSTS", "").split(",") if host.strip()
+}
+# Connections the shared client keeps across requests
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+
+
+class ImageDownloadError(Exception):
+    def __init__(self, message: str, status_code: int = 502):
+        self.status_code = status_code
+        super().__init__(message)
+
+
+@lru_cache(maxsize=None)
+def get_http_client():
+    """
+    One pooled client for the process, so requests reuse connections instead of opening their own.
+    Redirects are followed by download_image, which checks every hop.
+    """
+    import httpx
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(IMAGE_DOWNLOAD_TIMEOUT),
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+        follow_redirects=False,
+    )
+
+
+def is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+async def check_public_url(url: str):
+    """
+    Refuses a URL that is not http(s) or whose host resolves to a private,
+    loopback, link-local or otherwise non-public address, so a user's
+    image_url cannot reach services inside our network. Returns the host.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ImageDownloadError("image_url must be an http(s) URL", status_code=400)
+
+    host = parsed.hostname.lower()
+    if host in IMAGE_DOWNLOAD_ALLOWED_HOSTS:
+        return host
+
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as e:
+        raise ImageDownloadError(f"Could not resolve the image host {host}: {e}", status_code=400)
+
+    if not addresses or not all(is_public_address(sockaddr[0]) for *_, sockaddr in addresses):
+        raise ImageDownloadError(f"image_url host {host} is not a public address", status_code=400)
+    return host
+
+
+def check_peer_address(response, host: str):
+    """
+    Refuses a response whose connection went to a non-public address. The
+    host is resolved again to connect, so one that changes its DNS answer
+    after check_public_url is caught here, before any of the body is read.
+    """
+    if host in IMAGE_DOWNLOAD_ALLOWED_HOSTS:
+        return
+    stream = response.extensions.get("network_stream")
+    server_addr = stream.get_extra_info("server_addr") if stream else None
+    if not server_addr or not is_public_address(server_addr[0]):
+        raise ImageDownloadError(f"image_url host {host} is not a public address", status_code=400)
+
+
+async def download_image(url: str, max_bytes: int = IMAGE_DOWNLOAD_MAX_BYTES) -> bytes:
+    """
+    Streams an image from url into memory, giving up as soon as it is known
+    to be larger than max_bytes. Every hop, redirects included, must resolve
+    to and connect to a public address.
+    Raises ImageDownloadError on any failure.
+    """
+    import httpx
+
+    try:
+        for _ in range(IMAGE_DOWNLOAD_MAX_REDIRECTS + 1):
+            host = await check_public_url(url)
+            async with get_http_client().stream("GET", url) as response:
+                check_peer_address(response, host)
+                if response.is_redirect:
+                    url = str(response.url.join(response.headers["location"]))
+                    continue
+                if response.status_code != 200:
+                    raise ImageDownloadError(f"Image download failed with status {response.status_code}")
+
+                declared = response.headers.get("content-length")
+                if declared and declared.isdigit() and int(declared) > max_bytes:
+                    raise ImageDownloadError(f"Image is larger than {max_bytes} bytes", status_code=413)
+
+                chunks = []
+                received = 0
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    if received > max_bytes:
+                        raise ImageDownloadError(f"Image is larger than {max_bytes} bytes", status_code=413)
+                    chunks.append(chunk)
+                break
+        else:
+            raise ImageDownloadError(f"Image download followed more than {IMAGE_DOWNLOAD_MAX_REDIRECTS} redirects")
+    except httpx.HTTPError as e:
+        raise ImageDownloadError(f"Image download failed: {e}")
+
+    if not received:
+        raise ImageDownloadError("Downloaded image is empty")
+    return b"".join(chunks)
@@ -0,0 +1,19 @@
+# job_context.py
+import contextvars
+from rq import get_current_job
+
+# The RQ job the current task is running. A work horse runs one job and
+# get_current_job() finds it; the async runner runs many jobs on one thread,
+# so it sets this for each job's task.
+running_job = contextvars.ContextVar("running_job", default=None)
+
+
+def current_job():
+    """The RQ job being run, or None outside one."""
+    return running_job.get() or get_current_job()
+
+
+def will_retry() -> bool:
+    """Whether RQ runs the current job again if it fails now."""
+    job = current_job()
+    return bool(job and job.retries_left)
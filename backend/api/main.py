@@ -2,23 +2,32 @@
 
 import os
 import base64
-import requests
-import json
+import hmac
 import time
-import asyncio
-import cv2
-import numpy as np
-from redis import Redis
-from rq import Queue
-from fastapi import FastAPI, HTTPException, Header, Request, BackgroundTasks, UploadFile, File, Form
+from rq import Queue, Retry
+from fastapi import FastAPI, HTTPException, Header, Request, Response, BackgroundTasks, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
-from .api_clients import transcribe_audio
-from .helper import encode_image_to_base64, is_content_safe_for_comic, authenticateUser, style_name_to_description, handle_comic_generation_error, detect_face_in_image
+from .api_clients import transcribe_audio, edit_avatar_image
+from .helper import encode_image_to_base64, is_content_safe_for_comic, authenticateUser, verify_token, style_name_to_description, handle_comic_generation_error, detect_face_in_image, get_latest_avatar_path
+from .image_download import download_image, ImageDownloadError
+from .cache import invalidate_avatar_path
+from .idempotency import idempotency_key, claim_idempotency_key, complete_idempotency_key, release_idempotency_key
 from .db_client import supabase
-from .worker import run_comic_generation_worker
-from .schema import DeleteAvatarRequest, AvatarRequest
+from .redis_client import redis_conn
+from .metrics import render_metrics, span, record_span, get_trace
+from .comic_state import ComicRecord, InvalidTransitionError
+from .cancellation import record_comic_job, cancel_comic_job
+from .deadline import COMIC_JOB_TIMEOUT, PANEL_JOB_TIMEOUT
+from .checkpoint import COMIC_JOB_RETRIES, COMIC_RETRY_INTERVALS
+from .status_cache import (
+    get_comic_status as get_cached_comic_status, backfill_comic_status, clear_comic_status,
+    set_avatar_status, get_avatar_status as get_cached_avatar_status, backfill_avatar_status,
+    status_etag, COMIC_STATUS_FIELDS, AVATAR_STATUS_FIELDS,
+)
+# Jobs are enqueued by dotted path, so the worker module is never imported here
+from .schema import DeleteAvatarRequest, AvatarRequest, AvatarEditRequest, RegeneratePanelRequest
 
 # Simple in-memory cache for comics
 comics_cache: Dict[str, Dict[str, Any]] = {}
@@ -37,9 +46,10 @@ app.add_middleware(
 )
 
 SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
-redis_conn = Redis.from_url(os.getenv("REDIS_URL"))
 QUEUE_NAME = os.getenv("RQ_NAME", "comics_queue")
 q = Queue(QUEUE_NAME, connection=redis_conn)
+# Bearer token the Prometheus scraper sends; without one only local scrapes are served
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
 
 
 # Enhanced error handling with specific error types
@@ -60,7 +70,9 @@ async def generate_comic(
     num_panels: int = Form(6),
     audio_file: Optional[UploadFile] = File(None),
     story: Optional[str] = Form(None),
-    authorization: str = Header(None)
+    reroll: bool = Form(False),
+    authorization: str = Header(None),
+    idempotency_key_header: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """Generates a full comic strip.
 
@@ -69,97 +81,107 @@ async def generate_comic(
             num_panels (string): The maximum amount of panles allowed.
             audio_file (File): an audio file describing a story
             story (string): a text description of a story
+            reroll (bool): ignore any cached storyboard and write a new one
             authorization (string): authorization header
+            idempotency_key_header (string): optional Idempotency-Key; retries with the same key get the first response
 
         Returns:
             dict: the dream id so the front end can load immediately.
         """
     
-    user = authenticateUser(authorization)
+    with span("auth") as auth_span:
+        user = authenticateUser(authorization)
+
+    # A double tap or a client retry gets the comic the first request created
+    audio_content = await audio_file.read() if audio_file else None
+    idem_key, idem_ttl = idempotency_key(
+        "comic", user.id, idempotency_key_header, style_name, num_panels, reroll, story or "", audio_content or b""
+    )
+    existing = await claim_idempotency_key(idem_key, idem_ttl)
+    if existing:
+        print(f"Duplicate comic submission, returning existing dream {existing.get('dream_id')}")
+        return existing
+
     dream_id = None
+    comic = None
+    # Stages that run before the comic has an id are filed under it once it does
+    early_spans = [auth_span]
 
     try:
         print(f"getting avatar for style: {style_name}")
 
-        avatar_response = supabase.from_("avatars") \
-            .select("avatar_path") \
-            .eq("user_id", user.id) \
-            .eq("style", style_name) \
-            .order("created_at", desc=True) \
-            .limit(1) \
-            .single() \
-            .execute()
-
-        if not avatar_response.data or not avatar_response.data.get("avatar_path"):
-            # This could happen if a user somehow has a style unlocked but no avatar for it.
-            raise ComicGenerationError(
-                "avatar", 
-                f"No avatar found for the style '{style_name}'. Please create one first."
-            )
+        with span("avatar_fetch") as avatar_span:
+            avatar_path = get_latest_avatar_path(user.id, style_name)
 
-        avatar_path = avatar_response.data["avatar_path"]
+            if not avatar_path:
+                # This could happen if a user somehow has a style unlocked but no avatar for it.
+                raise ComicGenerationError(
+                    "avatar", 
+                    f"No avatar found for the style '{style_name}'. Please create one first."
+                )
 
-        #download the avatar image
-        try:
-            image_bytes = supabase.storage.from_("avatars").download(avatar_path)
-        except Exception as e:
-            # file might not exist in storage
-            raise ComicGenerationError(
-                "avatar",
-                f"Failed to download avatar from storage: {e}"
-            )
+            #download the avatar image
+            try:
+                image_bytes = supabase.storage.from_("avatars").download(avatar_path)
+            except Exception as e:
+                # file might not exist in storage, so the cached path must not be reused
+                invalidate_avatar_path(user.id, style_name)
+                raise ComicGenerationError(
+                    "avatar",
+                    f"Failed to download avatar from storage: {e}"
+                )
+        early_spans.append(avatar_span)
 
         # Encode the downloaded image bytes into a Base64 string
         avatar_b64 = base64.b64encode(image_bytes).decode('utf-8')
 
         print("--- Starting Comic Generation Process ---")
 
-        #----------Create a DB instance-------------#
-        insert_response = supabase.from_("comics").insert({
-            "user_id": user.id,
-            "style": style_name
-        }).execute()
-        
-        dream_id = insert_response.data[0]['id']
-
-
         #----------Send the text or process audio--------------#
         story_text = ""
         if story:
             story_text = story
-        elif audio_file:
+        elif audio_content:
             try:
-                audio_content = await audio_file.read()
-                story_text = transcribe_audio(audio_content)
+                with span("transcription") as transcription_span:
+                    story_text = transcribe_audio(audio_content)
+                early_spans.append(transcription_span)
             except Exception as e:
                 raise ComicGenerationError(
                     "audio",
                     f"Failed to transcribe audio: {e}"
                 )
         else:
-            # Update status to error if no input is provided
-            if dream_id:
-                supabase.from_("comics").update({"status": "error"}).eq("id", dream_id).execute()
             raise ComicGenerationError(
                 "input",
                 "Either story text or audio file must be provided."
             )
 
-        supabase.from_("comics").update({"transcript": story_text}).eq("id", dream_id).execute()
-
         #---------Check Moderation----------#
         # we have to check ovbious moderation issues
         print("Step 1: Checking story for content policy compliance...")
-        is_safe, reason = is_content_safe_for_comic(story_text)
+        with span("moderation") as moderation_span:
+            is_safe, reason = is_content_safe_for_comic(story_text)
+        early_spans.append(moderation_span)
         if not is_safe:
             print(f"Error: Story is not compliant. Reason: {reason}")
-            supabase.from_("comics").update({"status": "error"}).eq("id", dream_id).execute()
             # Return an error response
             raise ComicGenerationError(
                 "moderation",
                 f"Content moderation failed: {reason}"
             )
 
+        #----------Create a DB instance-------------#
+        # Created only once the story is accepted, so a rejected submission
+        # never writes to the database and the transcript needs no second write
+        with span("db_write", operation="insert") as insert_span:
+            comic = ComicRecord.create(user.id, style=style_name, transcript=story_text)
+        early_spans.append(insert_span)
+
+        dream_id = comic.dream_id
+        for entry in early_spans:
+            record_span(dream_id, entry)
+
         #-------send full prompt for multi-thread approach---------#
 
         style_description = style_name_to_description(style_name)
@@ -180,16 +202,20 @@ async def generate_comic(
             print(f"[{dream_id}] - style_description: {style_description[:50]}...")
             print(f"[{dream_id}] - avatar_b64 length: {len(avatar_b64) if avatar_b64 else 'None'}")
             
-            job = q.enqueue(
-                'backend.api.worker.run_comic_generation_worker',
-                dream_id,
-                user.id,
-                story_text,
-                num_panels,
-                style_description,
-                avatar_b64,
-                job_timeout=500  # around 8 minute timeout
-            )
+            with span("enqueue", dream_id):
+                job = q.enqueue(
+                    'backend.api.worker.run_comic_generation_worker',
+                    dream_id,
+                    user.id,
+                    story_text,
+                    num_panels,
+                    style_description,
+                    avatar_b64,
+                    reroll,
+                    job_timeout=COMIC_JOB_TIMEOUT,
+                    retry=Retry(max=COMIC_JOB_RETRIES, interval=COMIC_RETRY_INTERVALS)
+                )
+            record_comic_job(dream_id, job.id)
             
             print(f"[{dream_id}] Job enqueued successfully with ID: {job.id}")
             print(f"[{dream_id}] Job status: {job.get_status()}")
@@ -200,18 +226,19 @@ async def generate_comic(
             import traceback
             print(f"[{dream_id}] Full traceback:")
             traceback.print_exc()
-            supabase.from_("comics").update({"status": "error"}).eq("id", dream_id).execute()
             raise ComicGenerationError(
                 "server",
                 f"Failed to start comic generation: {e}"
             )
 
+        complete_idempotency_key(idem_key, {"dream_id": dream_id}, idem_ttl)
         return {"dream_id": dream_id}
 
     except ComicGenerationError as e:
-        # Update database with error status if we have a dream_id
-        if dream_id:
-            supabase.from_("comics").update({"status": "error"}).eq("id", dream_id).execute()
+        release_idempotency_key(idem_key)
+        # Only a comic that was already created has a row to mark as failed
+        if comic and comic.status == "processing":
+            comic.fail(e.error_type, e.message)
         
         error_info = handle_comic_generation_error(e, dream_id)
         raise HTTPException(
@@ -224,9 +251,10 @@ async def generate_comic(
             }
         )
     except Exception as e:
-        # Update database with error status if we have a dream_id
-        if dream_id:
-            supabase.from_("comics").update({"status": "error"}).eq("id", dream_id).execute()
+        release_idempotency_key(idem_key)
+        # Only a comic that was already created has a row to mark as failed
+        if comic and comic.status == "processing":
+            comic.fail("server", str(e))
         
         error_info = handle_comic_generation_error(e, dream_id)
         raise HTTPException(
@@ -245,13 +273,15 @@ async def generate_comic(
 @app.post("/generate-avatar/")
 async def generate_avatar(
     avatar_request: AvatarRequest,
-    authorization: str = Header(...)
+    authorization: str = Header(...),
+    idempotency_key_header: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """Generates a avatar in a certain style.
 
         Args:
             avatar_request (AvatarRequest): contains user photo, style prompt, and style name
             authorization (string): authorization header
+            idempotency_key_header (string): optional Idempotency-Key; retries with the same key get the first response
 
         Returns:
             dict: the immediate status to allow for backend polling including the job id.
@@ -260,6 +290,15 @@ async def generate_avatar(
     print("--- Authenticating user for avatar generation ---")
     user = authenticateUser(authorization)
 
+    # A retried upload gets the job the first request started
+    idem_key, idem_ttl = idempotency_key(
+        "avatar", user.id, idempotency_key_header, avatar_request.name, avatar_request.prompt, avatar_request.user_photo_b64
+    )
+    existing = await claim_idempotency_key(idem_key, idem_ttl)
+    if existing:
+        print(f"Duplicate avatar submission, returning existing job {existing.get('job_id')}")
+        return existing
+
     # Face detection check before processing
     try:
         # Decode the base64 image to check for faces
@@ -281,6 +320,7 @@ async def generate_avatar(
         
     except HTTPException:
         # Re-raise HTTP exceptions (like our face detection error)
+        release_idempotency_key(idem_key)
         raise
     except Exception as e:
         print(f"Face detection check failed: {e}")
@@ -305,12 +345,16 @@ async def generate_avatar(
             "user_id": user.id,
             "status": "processing"
         }).execute()
+        set_avatar_status(job.id, "processing", user_id=user.id)
 
         # Respond to the client immediately
-        return {"status": "processing", "job_id": job.id}
+        result = {"status": "processing", "job_id": job.id}
+        complete_idempotency_key(idem_key, result, idem_ttl)
+        return result
 
     except Exception as e:
         print(f"An unexpected error occurred during avatar enqueue: {str(e)}")
+        release_idempotency_key(idem_key)
         
         # Categorize the error
         error_info = handle_comic_generation_error(e)  # Reuse the same error handler
@@ -325,23 +369,72 @@ async def generate_avatar(
         )
 
 
+@app.post("/generate_avatar")
+async def generate_avatar_from_url(edit_request: AvatarEditRequest, authorization: str = Header(None)):
+    """Styles a photo at a URL and returns the avatar directly (the former Flask avatar server).
+
+        The token is verified locally, the photo is streamed through the shared
+        HTTP client with a size cap, and the image edit is awaited, so a slow
+        download or edit never ties up the API worker.
+
+        Args:
+            edit_request (AvatarEditRequest): the photo's URL and the style prompt
+            authorization (string): authorization header
+
+        Returns:
+            dict: the generated avatar as base64.
+        """
+    verify_token(authorization)
+
+    if not edit_request.image_url:
+        raise HTTPException(status_code=400, detail="image_url is required")
+
+    try:
+        with span("avatar_photo_download"):
+            image_bytes = await download_image(edit_request.image_url)
+    except ImageDownloadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    try:
+        with span("avatar_image_edit"):
+            image_b64 = await edit_avatar_image(image_bytes, edit_request.prompt)
+    except Exception as e:
+        print(f"Error generating avatar: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {"b64_json": image_b64, "status": "success"}
+
+
 @app.get("/avatar-status/{job_id}")
-async def get_avatar_status(job_id: str, authorization: str = Header(...)):
+async def get_avatar_status(job_id: str, response: Response, authorization: str = Header(...), if_none_match: Optional[str] = Header(None)):
     user = authenticateUser(authorization)
-    response = supabase.from_("avatar_generations").select("status, error_type, error_message") \
-        .eq("job_id", job_id).eq("user_id", user.id).single().execute()
-    if not response.data:
+
+    # Workers write every status transition to Redis; the database is the fallback
+    data = get_cached_avatar_status(job_id)
+    if data is None:
+        db_response = supabase.from_("avatar_generations").select("status, error_type, error_message") \
+            .eq("job_id", job_id).eq("user_id", user.id).single().execute()
+        if not db_response.data:
+            raise HTTPException(status_code=404, detail="Job not found.")
+        data = db_response.data
+        backfill_avatar_status(job_id, user.id, data)
+    elif data.get("user_id") != user.id:
         raise HTTPException(status_code=404, detail="Job not found.")
-    
-    data = response.data
+
+    etag = status_etag(data, AVATAR_STATUS_FIELDS)
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
     status = data.get("status")
     result = {"status": status}
     
     # Include error information if status is error
     if status == "error":
         result.update({
-            "error_type": data.get("error_type", "unknown"),
-            "error_message": data.get("error_message", "An unknown error occurred")
+            "error_type": data.get("error_type") or "unknown",
+            "error_message": data.get("error_message") or "An unknown error occurred"
         })
     
     return result
@@ -349,49 +442,194 @@ async def get_avatar_status(job_id: str, authorization: str = Header(...)):
 
 
 @app.get("/comic-status/{dream_id}")
-async def get_comic_status(dream_id: str):
+async def get_comic_status(dream_id: str, response: Response, if_none_match: Optional[str] = Header(None)):
     """Check to see if a certain comic is done generating.
 
         Args:
             dream_id (string): a unique id to help locate a certain table instance 
+            if_none_match (string): the ETag of the last status the client saw
 
         Returns:
-            dict: the immediate status and the signed urls if it is done.
+            dict: the immediate status and the signed urls if it is done,
+            or 304 if the status has not changed since the client's ETag.
+            Responses with signed urls carry no ETag and are never answered with 304.
         """
-    response = supabase.from_("comics").select("status, image_urls, error_type, error_message").eq("id", dream_id).single().execute()
-    
-    if not response.data:
-        raise HTTPException(status_code=404, detail="Comic not found")
-    
-    data = response.data
+    # Workers write every status transition to Redis; the database is the fallback
+    data = get_cached_comic_status(dream_id)
+    if data is None:
+        db_response = supabase.from_("comics").select("status, image_urls, strip_path, error_type, error_message").eq("id", dream_id).single().execute()
+        if not db_response.data:
+            raise HTTPException(status_code=404, detail="Comic not found")
+        data = db_response.data
+        backfill_comic_status(dream_id, data)
+
     status = data.get("status")
     signed_urls = []
+    strip_url = None
     error_info = {}
-
-    # If complete, generate temporary signed URLs from the stored paths
-    if status == "complete" and data.get("image_urls"):
+    has_signed_urls = status == "complete" and bool(data.get("image_urls"))
+
+    if has_signed_urls:
+        # The signed URLs expire, so a body holding them must never be reused from a cache
+        response.headers["Cache-Control"] = "no-store"
+    else:
+        # The ETag covers the stored status; it lets in-progress polls be answered with 304
+        etag = status_etag(data, COMIC_STATUS_FIELDS)
+        if if_none_match == etag:
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+
+    # If complete, generate temporary signed URLs from the stored paths, all in one storage request
+    if has_signed_urls:
         stored_paths = data["image_urls"]
+        strip_path = data.get("strip_path")
         expires_in = 300  # 5 minutes
 
-        for path in stored_paths:
-            signed_url_response = supabase.storage.from_('comics').create_signed_url(path, expires_in)
-            signed_urls.append(signed_url_response['signedURL'])
+        signed = supabase.storage.from_('comics').create_signed_urls(
+            ([strip_path] if strip_path else []) + stored_paths, expires_in
+        )
+        if strip_path:
+            strip_item = signed.pop(0)
+            strip_url = None if strip_item.get("error") else strip_item["signedURL"]
+        signed_urls = [item["signedURL"] for item in signed if not item.get("error")]
 
     # If error, include error information
     if status == "error":
         error_info = {
-            "error_type": data.get("error_type", "unknown"),
-            "error_message": data.get("error_message", "An unknown error occurred")
+            "error_type": data.get("error_type") or "unknown",
+            "error_message": data.get("error_message") or "An unknown error occurred"
         }
 
-    # Return the signed URLs to the frontend
+    # Return the signed URLs to the frontend. The strip, when there is one, is the
+    # default view; the panels are still sent for clients that show them one by one
     return {
         "status": status, 
+        "strip_url": strip_url,
         "panel_urls": signed_urls,
         **error_info  # Include error info if present
     }
 
 
+@app.post("/regenerate-panel/")
+async def regenerate_panel(request: RegeneratePanelRequest, authorization: str = Header(...)):
+    """Regenerate a single panel of an existing comic.
+
+        Args:
+            request (RegeneratePanelRequest): the comic id and the zero-based panel index
+            authorization (string): authorization header
+
+        Returns:
+            dict: the immediate status and the job id.
+        """
+    user = authenticateUser(authorization)
+
+    comic_response = supabase.from_("comics") \
+        .select("style, status, storyboard, image_urls, strip_path") \
+        .eq("id", request.dream_id) \
+        .eq("user_id", user.id) \
+        .single() \
+        .execute()
+
+    if not comic_response.data:
+        raise HTTPException(status_code=404, detail="Comic not found")
+
+    comic = comic_response.data
+    if comic.get("status") == "processing":
+        raise HTTPException(status_code=409, detail="Comic is still generating")
+
+    panels = (comic.get("storyboard") or {}).get("panels") or []
+    if not panels:
+        raise HTTPException(status_code=400, detail="This comic has no stored storyboard to regenerate from")
+    if request.panel_index < 0 or request.panel_index >= len(panels):
+        raise HTTPException(status_code=400, detail="Panel index out of range")
+
+    avatar_path = get_latest_avatar_path(user.id, comic.get("style"))
+    if not avatar_path:
+        raise HTTPException(status_code=400, detail=f"No avatar found for the style '{comic.get('style')}'")
+
+    record = ComicRecord(request.dream_id, user.id, status=comic.get("status"))
+    try:
+        record.transition("processing")
+    except InvalidTransitionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    try:
+        # Invalidate cache for this user
+        cache_key = f"comics_{user.id}"
+        if cache_key in comics_cache:
+            del comics_cache[cache_key]
+
+        job = q.enqueue(
+            'backend.api.worker.run_panel_regeneration_worker',
+            request.dream_id,
+            user.id,
+            request.panel_index,
+            avatar_path,
+            job_timeout=PANEL_JOB_TIMEOUT
+        )
+        record_comic_job(request.dream_id, job.id)
+        print(f"[{request.dream_id}] Panel {request.panel_index+1} regeneration enqueued with ID: {job.id}")
+    except Exception as e:
+        print(f"[{request.dream_id}] Failed to enqueue panel regeneration: {e}")
+        record.transition("complete", image_urls=comic.get("image_urls") or [], strip_path=comic.get("strip_path"))
+        raise HTTPException(status_code=500, detail=f"Failed to start panel regeneration: {str(e)}")
+
+    return {"status": "processing", "dream_id": request.dream_id, "job_id": job.id}
+
+
+@app.post("/cancel-comic/{dream_id}")
+async def cancel_comic(dream_id: str, authorization: str = Header(...)):
+    """Cancel a comic that is still generating.
+
+        A queued job is removed before it starts; a running one stops its
+        panel tasks within a second.
+
+        Args:
+            dream_id (string): the comic to cancel
+            authorization (string): authorization header
+
+        Returns:
+            dict: the comic's status after the cancel.
+        """
+    user = authenticateUser(authorization)
+
+    comic_response = supabase.from_("comics") \
+        .select("status, image_urls, strip_path") \
+        .eq("id", dream_id) \
+        .eq("user_id", user.id) \
+        .single() \
+        .execute()
+
+    if not comic_response.data:
+        raise HTTPException(status_code=404, detail="Comic not found")
+
+    comic = comic_response.data
+    if comic.get("status") != "processing":
+        raise HTTPException(status_code=409, detail="Comic is not generating")
+
+    cancel_comic_job(dream_id)
+
+    record = ComicRecord(dream_id, user.id)
+    try:
+        if comic.get("image_urls"):
+            # A cancelled panel regeneration leaves the comic as it was
+            record.transition("complete", image_urls=comic["image_urls"], strip_path=comic.get("strip_path"))
+            status = "complete"
+        else:
+            record.fail("cancelled", "Comic generation was cancelled")
+            status = "error"
+    except InvalidTransitionError as e:
+        # The job finished before the cancel could be recorded
+        raise HTTPException(status_code=409, detail=str(e))
+
+    cache_key = f"comics_{user.id}"
+    if cache_key in comics_cache:
+        del comics_cache[cache_key]
+
+    return {"status": status, "dream_id": dream_id}
+
+
 #get the signed id for all comic thumbnails
 @app.get("/comics/")
 async def get_all_comics(authorization: str = Header(None)):
@@ -457,6 +695,22 @@ async def get_all_comics(authorization: str = Header(None)):
         raise HTTPException(status_code=500, detail=f"Failed to fetch comics: {str(e)}")
 
 
+def enqueue_storage_deletion(bucket: str, prefixes: list = None, paths: list = None):
+    """Hands storage cleanup to a worker so deletes return immediately."""
+    try:
+        q.enqueue(
+            'backend.api.worker.run_storage_deletion_worker',
+            bucket,
+            prefixes,
+            paths,
+            job_timeout=300,
+            retry=Retry(max=3, interval=[10, 30, 60])
+        )
+    except Exception as e:
+        # The database rows are already gone; the objects are only orphaned
+        print(f"Failed to enqueue storage deletion in '{bucket}' for {prefixes or paths}: {e}")
+
+
 #Deletion of an avatar flow
 @app.delete("/delete-avatar/")
 async def delete_avatar(request: DeleteAvatarRequest, authorization: str = Header(...)):
@@ -473,8 +727,10 @@ async def delete_avatar(request: DeleteAvatarRequest, authorization: str = Heade
     if not request.avatar_path.startswith(user.id):
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    supabase.storage.from_("avatars").remove([request.avatar_path])
     supabase.from_("avatars").delete().eq("avatar_path", request.avatar_path).execute()
+    # The deleted avatar may be the cached latest of its style
+    invalidate_avatar_path(user.id)
+    enqueue_storage_deletion("avatars", paths=[request.avatar_path])
 
     return {"status": "success"}
 
@@ -494,9 +750,24 @@ async def delete_comic(dream_id: str, authorization: str = Header(None)):
 
     if not dream_id:
         raise HTTPException(status_code=403, detail="Forbidden")
-    
-    supabase.storage.from_("comics").remove([f"{user.id}/{dream_id}"])
-    supabase.from_("comics").delete().eq("id", dream_id).execute()
+
+    # Nothing is touched unless the comic is the caller's own
+    comic_response = supabase.from_("comics") \
+        .select("id") \
+        .eq("id", dream_id) \
+        .eq("user_id", user.id) \
+        .single() \
+        .execute()
+
+    if not comic_response.data:
+        raise HTTPException(status_code=404, detail="Comic not found")
+
+    # Stop paying for panels of a comic that is going away
+    cancel_comic_job(dream_id)
+    supabase.from_("comics").delete().eq("id", dream_id).eq("user_id", user.id).execute()
+    clear_comic_status(dream_id)
+    # The panels live in a folder, which storage can only remove object by object
+    enqueue_storage_deletion("comics", prefixes=[f"{user.id}/{dream_id}"])
     return {"status": "success"}
         
 
@@ -511,6 +782,57 @@ async def health_check():
     except Exception as e:
         return {"status": "unhealthy", "error": str(e)}
 
+@app.get("/comic-trace/{dream_id}")
+async def get_comic_trace(dream_id: str, authorization: str = Header(None)):
+    """Per-stage timings of a single comic, in the order they started.
+
+        Args:
+            dream_id (string): a unique id to help locate a certain table instance
+            authorization (string): authorization header of the comic's owner
+
+        Returns:
+            dict: the spans recorded for the comic and the total time they cover.
+        """
+    user = authenticateUser(authorization)
+
+    comic_response = supabase.from_("comics") \
+        .select("id") \
+        .eq("id", dream_id) \
+        .eq("user_id", user.id) \
+        .single() \
+        .execute()
+    if not comic_response.data:
+        raise HTTPException(status_code=404, detail="Comic not found")
+
+    spans = get_trace(dream_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="No trace found for this comic")
+
+    first_start = spans[0]["started_at"]
+    last_end = max(entry["started_at"] + entry["duration_ms"] / 1000 for entry in spans)
+    return {
+        "dream_id": dream_id,
+        "total_ms": round((last_end - first_start) * 1000, 1),
+        "spans": spans
+    }
+
+@app.get("/metrics")
+async def get_metrics(request: Request, authorization: str = Header(None)):
+    """Prometheus metrics for the API and the workers.
+
+        Only for the scraper: it must send METRICS_TOKEN as a bearer token, or,
+        when no token is configured, scrape from the same host.
+        """
+    if METRICS_TOKEN:
+        allowed = hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}")
+    else:
+        allowed = request.client is not None and request.client.host in ("127.0.0.1", "::1")
+    if not allowed:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
 @app.get("/debug-worker/")
 async def debug_worker():
     """Endpoint to test if the RQ worker is running correctly."""
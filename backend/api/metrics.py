@@ -0,0 +1,155 @@
+# metrics.py
+import contextvars
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Histogram, CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST, multiprocess
+from .redis_client import redis_conn
+
+TRACE_TTL = int(os.getenv("TRACE_TTL", 60 * 60 * 24))  # 1 day
+
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens used by LLM prompts, by prompt and token kind.",
+    ["prompt", "kind"]
+)
+
+STAGE_SECONDS = Histogram(
+    "comic_stage_seconds",
+    "Duration of each stage of the comic and avatar pipelines.",
+    ["stage", "outcome"],
+    # Image generation takes tens of seconds, far past the default buckets
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300)
+)
+
+# The comic the current task is working on. asyncio tasks and threads started
+# with asyncio.to_thread inherit it, so concurrent comics never mix.
+current_dream_id = contextvars.ContextVar("current_dream_id", default=None)
+
+
+def trace_key(dream_id: str) -> str:
+    return f"comic:trace:{dream_id}"
+
+
+@contextmanager
+def span(stage: str, dream_id: str = None, **attributes):
+    """
+    Times a pipeline stage.
+
+    The duration is observed in the comic_stage_seconds histogram, logged, and
+    appended to the comic's trace in Redis so that get_trace(dream_id) shows
+    where the time of a single comic went. Yields the trace entry, so a stage
+    that ran before the comic had an id can be recorded with record_span later.
+    """
+    dream_id = dream_id or current_dream_id.get()
+    entry = {"stage": stage, "started_at": time.time(), **attributes}
+    start = time.perf_counter()
+    outcome = "ok"
+
+    try:
+        yield entry
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        entry.update({"outcome": outcome, "duration_ms": round(elapsed * 1000, 1)})
+        STAGE_SECONDS.labels(stage=stage, outcome=outcome).observe(elapsed)
+
+        details = " ".join(f"{key}={value}" for key, value in attributes.items())
+        logging.info(f"[{dream_id or '-'}] span {stage} {outcome} {elapsed * 1000:.0f} ms {details}".rstrip())
+
+        if dream_id:
+            record_span(dream_id, entry)
+
+
+def record_span(dream_id: str, entry: dict):
+    try:
+        key = trace_key(dream_id)
+        pipe = redis_conn.pipeline()
+        pipe.rpush(key, json.dumps(entry))
+        pipe.expire(key, TRACE_TTL)
+        pipe.execute()
+    except Exception as e:
+        # Tracing must never break the pipeline it observes
+        logging.warning(f"[{dream_id}] Failed to record span {entry.get('stage')}: {e}")
+
+
+def get_trace(dream_id: str) -> list:
+    """Returns the recorded spans of a comic, ordered by start time."""
+    entries = [json.loads(raw) for raw in redis_conn.lrange(trace_key(dream_id), 0, -1)]
+    return sorted(entries, key=lambda entry: entry["started_at"])
+
+
+def record_token_usage(prompt_name: str, usage, dream_id: str = None):
+    """
+    Records the token usage of a Responses API call.
+
+    `cached_input` counts the input tokens served from the provider's prompt
+    cache, so its ratio to `input` is the prompt-cache hit rate.
+    """
+    if not usage:
+        return
+
+    input_details = getattr(usage, "input_tokens_details", None)
+    cached_tokens = getattr(input_details, "cached_tokens", 0) or 0
+
+    LLM_TOKENS.labels(prompt=prompt_name, kind="input").inc(usage.input_tokens)
+    LLM_TOKENS.labels(prompt=prompt_name, kind="cached_input").inc(cached_tokens)
+    LLM_TOKENS.labels(prompt=prompt_name, kind="output").inc(usage.output_tokens)
+
+    logging.info(
+        f"[{dream_id or '-'}] {prompt_name} tokens: input={usage.input_tokens} "
+        f"cached_input={cached_tokens} output={usage.output_tokens}"
+    )
+
+
+def render_metrics():
+    """
+    Returns the metrics payload and its content type.
+
+    The workers run in their own processes, so when PROMETHEUS_MULTIPROC_DIR
+    is set the metrics of every process writing to it are aggregated.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def fold_process_metrics(pid: int, into_pid: int):
+    """
+    Adds the counters and histograms written by a process that has exited
+    (an RQ work horse) to the rollup files of into_pid, and deletes its files.
+    A worker then leaves one set of files however many jobs it runs, so
+    scrapes do not slow down as jobs pile up.
+    """
+    from prometheus_client.mmap_dict import MmapedDict
+
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not directory:
+        return
+
+    try:
+        for kind in ("counter", "histogram"):
+            path = os.path.join(directory, f"{kind}_{pid}.db")
+            if not os.path.exists(path):
+                continue
+            # Named <kind>_... so the collector still reads it as that kind
+            rollup = MmapedDict(os.path.join(directory, f"{kind}_rollup{into_pid}.db"))
+            try:
+                for key, value, timestamp, _ in MmapedDict.read_all_values_from_file(path):
+                    total, _ = rollup.read_value(key)
+                    rollup.write_value(key, total + value, timestamp)
+            finally:
+                rollup.close()
+            os.remove(path)
+        multiprocess.mark_process_dead(pid, directory)
+    except Exception as e:
+        # Metrics must never stop the worker from taking the next job
+        logging.warning(f"Failed to fold the metrics of process {pid}: {e}")
@@ -0,0 +1,57 @@
+# panel_validation.py
+import os
+
+# Panels smaller than this on either side are rejected
+PANEL_MIN_SIDE = int(os.getenv("PANEL_MIN_SIDE", 256))  # pixels
+# How far a panel's aspect ratio may stray from the one requested
+PANEL_ASPECT_TOLERANCE = float(os.getenv("PANEL_ASPECT_TOLERANCE", 0.1))
+# Below this grayscale standard deviation a panel is a flat or blank image
+PANEL_MIN_STDDEV = float(os.getenv("PANEL_MIN_STDDEV", 6.0))
+# A panel whose pixels are this close to one grey level nearly everywhere is mostly empty canvas
+PANEL_MAX_UNIFORM_FRACTION = float(os.getenv("PANEL_MAX_UNIFORM_FRACTION", 0.95))
+UNIFORM_LEVEL_DISTANCE = 8
+# The statistics are taken on a thumbnail, which is plenty for spotting a blank image
+THUMBNAIL_SIDE = 128
+
+
+def requested_aspect(image_size: str) -> float:
+    """The width / height of an image size like "1024x1536"."""
+    width, height = (int(side) for side in image_size.lower().split("x"))
+    return width / height
+
+
+def panel_defect(image_bytes: bytes, image_size: str = "1024x1024"):
+    """
+    Checks that a rendered panel is a usable picture: it decodes, is large
+    enough, has the requested aspect ratio and is not blank or nearly
+    uniform. Returns a short reason if it is not, otherwise None.
+    """
+    # Imported on first use, like the compositor
+    import cv2
+    import numpy as np
+
+    if not image_bytes:
+        return "empty image"
+
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return "image could not be decoded"
+
+    height, width = image.shape
+    if min(height, width) < PANEL_MIN_SIDE:
+        return f"image is too small ({width}x{height})"
+
+    expected = requested_aspect(image_size)
+    if abs(width / height - expected) > expected * PANEL_ASPECT_TOLERANCE:
+        return f"unexpected aspect ratio ({width}x{height}, requested {image_size})"
+
+    thumbnail = cv2.resize(image, (THUMBNAIL_SIDE, THUMBNAIL_SIDE), interpolation=cv2.INTER_AREA)
+    stddev = float(thumbnail.std())
+    if stddev < PANEL_MIN_STDDEV:
+        return f"image is blank (stddev {stddev:.1f})"
+
+    uniform = float(np.mean(np.abs(thumbnail.astype(np.int16) - int(np.median(thumbnail))) <= UNIFORM_LEVEL_DISTANCE))
+    if uniform > PANEL_MAX_UNIFORM_FRACTION:
+        return f"image is mostly empty ({uniform:.0%} one colour)"
+
+    return None
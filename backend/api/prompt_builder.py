@@ -1,22 +1,14 @@
 #prompt builder
 import json
+import textwrap
 
 UNIVERSAL_NEGATIVE_PROMPT = "blurry, low quality, jpeg artifacts, deformed, disfigured, bad anatomy, extra limbs, extra fingers, watermark, text, signature, logo"
 
 
-def build_initial_prompt(num_panels, style_name):
-    """
-    Builds the ultra-strong master prompt for the AI Script Generator.
-
-    Args:
-        num_panels (int): The maximum number of panels allowed for the comic.
-        style_name (str): A one to two-sentence description of the desired art style,
-                          which will serve as the primary visual anchor.
-
-    Returns:
-        str: The complete system prompt for the LLM.
-    """
-    system_prompt = f"""
+# The storyboard prompt is split so the large, static instructions form an
+# identical prefix on every request (cacheable by the provider) and only the
+# short per-comic parameters and the story vary at the end.
+STORYBOARD_SYSTEM_PROMPT = textwrap.dedent("""
     You are a world-class AI Systems Architect and Comic Script Engineer. Your mission is to convert a user's story into a flawless, machine-readable JSON script for a comic generation pipeline. Precision, consistency, and adherence to technical specifications are your highest priorities. Your output MUST be a single, valid JSON object and nothing else.
 
     ### SECTION 1: DEEP RESEARCH PROTOCOL (MANDATORY INTERNAL MONOLOGUE)
@@ -25,7 +17,7 @@ def build_initial_prompt(num_panels, style_name):
 
     1.  **Theme & Core Concept Analysis:** Identify the central theme and emotional core of the user's story (e.g., "unexpected friendship," "overcoming fear," "dramatic betrayal").
     2.  **Narrative Beat Identification:** Deconstruct the story into its essential, distinct narrative beats. A beat is a single, significant event or a change in emotion, action, or setting. Each beat will become a panel.
-    3.  **Optimal Panel Count Determination:** Based on the narrative beats, determine the most CONCISE number of panels needed to tell the story effectively. The maximum is {num_panels} panels. Aim for fewer if the story allows. Every panel must advance the story.
+    3.  **Optimal Panel Count Determination:** Based on the narrative beats, determine the most CONCISE number of panels needed to tell the story effectively. The maximum is given as MAX_PANELS in the COMIC PARAMETERS at the end of this prompt. Aim for fewer if the story allows. Every panel must advance the story.
     4.  **Character & Prop Inventory:** Create a definitive list of all characters, their key visual traits if described, and any important objects that must remain consistent.
 
     ### SECTION 2: THE GOLDEN RULE OF CHARACTER CONSISTENCY
@@ -41,35 +33,35 @@ def build_initial_prompt(num_panels, style_name):
     Your final output MUST be a single JSON object conforming to the following schema. Do not add any commentary before or after the JSON block.
 
     ```json
-    {{
+    {
       "title": "A concise, 1-3 word title for the comic.",
       "key_characters": [
-        {{
+        {
           "description": "A generic description of the main character.",
-          "character_notes": ["{style_name}", "main character"]
-        }}
+          "character_notes": ["<STYLE>", "main character"]
+        }
       ],
       "panels": [
-        {{
+        {
           "composition": "e.g., 'A wide shot showing the full scale of the characters and their environment.'",
           "action_and_emotion": "e.g., 'The main character, now wearing shining plate armor, braces for impact as the serpent unleashes a torrent of water.'",
           "setting_and_lighting": "e.g., 'The same misty lake, now with the sun higher in the sky, creating harsh highlights on the water and armor.'",
           "character_notes": [
-            "{style_name}",
+            "<STYLE>",
             "main character",
             "wearing shining plate armor",
             "green sea serpent"
           ]
-        }}
+        }
       ]
-    }}
+    }
 
     ```
 
     Field Instructions:
-    - key_characters.character_notes: Add key, permanent identifiers for each character (e.g., "main character", "green sea serpent", "man with red beard"). The first item MUST ALWAYS be "{style_name}".
+    - key_characters.character_notes: Add key, permanent identifiers for each character (e.g., "main character", "green sea serpent", "man with red beard"). The first item MUST ALWAYS be the STYLE from the COMIC PARAMETERS, copied exactly.
     - panels.character_notes: This is the tactical tool for consistency. For every panel, this list MUST contain identifiers for EVERY character present in that panel.
-  CRITICAL INSTRUCTION: The first item in the 'character_notes' array for EVERY panel MUST be the overall style description: "{style_name}".
+  CRITICAL INSTRUCTION: The first item in the 'character_notes' array for EVERY panel MUST be the overall style description: the STYLE from the COMIC PARAMETERS, copied exactly.
 
     SECTION 4: CREATIVE REFRAMING FOR POLICY COMPLIANCE
     CRITICAL RULE: You are the first line of defense for safety. If the story involves potentially sensitive themes, DO NOT reject it. Instead, apply the following Creative Reframing Principles when writing the action_and_emotion descriptions to ensure the script is dramatic and compelling without being graphically violent or referencing prohibited persons.  
@@ -85,8 +77,35 @@ def build_initial_prompt(num_panels, style_name):
 
     SECTION 5: FINAL EXECUTION
     Based on your Deep Research Protocol and adhering strictly to all Rules and the JSON Schema, generate the complete JSON object for the user's story. Ensure every field is populated with rich, descriptive detail. The action_and_emotion fields must be pre-framed for policy compliance. When populating the `composition` field, you must think like a cinematographer. Use specific and varied cinematic language to create a dynamic and visually interesting sequence of panels. Employ terms such as "low-angle shot," "dutch angle," "extreme close-up," "wide shot," "over-the-shoulder shot," and "point-of-view shot." Your output is the foundational blueprint for the entire comic; its quality is paramount.
-    """ 
-    return system_prompt
+    """).strip()
+
+STORYBOARD_REQUEST_TEMPLATE = """### COMIC PARAMETERS
+MAX_PANELS: {num_panels}
+STYLE: "{style_name}"
+
+Here is the story:
+{story}"""
+
+
+def build_storyboard_prompt(story, num_panels, style_name):
+    """
+    Builds the prompt for the AI Script Generator.
+
+    Args:
+        story (str): The user's story.
+        num_panels (int): The maximum number of panels allowed for the comic.
+        style_name (str): A one to two-sentence description of the desired art style,
+                          which will serve as the primary visual anchor.
+
+    Returns:
+        list: The static system prompt and the per-comic request.
+    """
+    user_content = STORYBOARD_REQUEST_TEMPLATE.format(
+        num_panels=num_panels,
+        style_name=style_name,
+        story=story
+    )
+    return [STORYBOARD_SYSTEM_PROMPT, user_content]
 
 
 def build_image_prompt(panel_data):
@@ -124,21 +143,7 @@ def build_image_prompt(panel_data):
     return ", ".join(final_parts)
 
 
-def build_final_image_prompt(panel_data, style_description):
-    """
-    Uses gpt-5-mini to synthesize panel and style data into a final,
-    DALL-E 3-optimized prompt using the modern Responses API.
-
-    Args:
-        panel_data (dict): The JSON object for a single panel from the script generator.
-        style_description (str): The sanitized, detailed description of the art style.
-
-    Returns:
-        str: The final, policy-aware prompt string for DALL-E 3.
-    """
-
-    # The system prompt from the section above
-    assembly_system_prompt = """
+IMAGE_PROMPT_SYSTEM_PROMPT = textwrap.dedent("""
     You are an expert AI Art Director and Master Prompter for the DALL-E 3 image generation engine. Your sole mission is to synthesize structured scene data into a single, fluid, and descriptive narrative paragraph. You are a master of DALL-E 3's internal rules and will produce a prompt that is perfectly formed and policy-compliant. Your output must be a single paragraph and nothing else.
 
     ### DIRECTIVE 1: SYNTHESIZE, DO NOT LIST
@@ -172,7 +177,22 @@ def build_final_image_prompt(panel_data, style_description):
 
     ### DIRECTIVE 4: FINAL COMMAND
     Execute these instructions with precision. Your output must be ONLY the final prompt string. No preamble, no explanation.
+    """).strip()
+
+
+def build_final_image_prompt(panel_data, style_description):
+    """
+    Uses gpt-5-mini to synthesize panel and style data into a final,
+    DALL-E 3-optimized prompt using the modern Responses API.
+
+    Args:
+        panel_data (dict): The JSON object for a single panel from the script generator.
+        style_description (str): The sanitized, detailed description of the art style.
+
+    Returns:
+        str: The final, policy-aware prompt string for DALL-E 3.
     """
+
     user_content = f"""
     ### Panel Data
     ```json
@@ -180,10 +200,35 @@ def build_final_image_prompt(panel_data, style_description):
     Style Description
     "{style_description}"
     """
-    return [assembly_system_prompt, user_content]
+    return [IMAGE_PROMPT_SYSTEM_PROMPT, user_content]
 
-  
 
+# Appended to the single-panel instructions so the static prefix is shared
+BATCH_IMAGE_PROMPT_SYSTEM_PROMPT = IMAGE_PROMPT_SYSTEM_PROMPT + textwrap.dedent("""
 
-    
+    ### DIRECTIVE 5: BATCH MODE
+    You will receive a JSON array with every panel of one comic. Apply Directives 1-3 to each panel independently. This replaces the output format of Directive 4: return ONLY a JSON object of the form {"prompts": ["...", "..."]} containing exactly one prompt per panel, in the same order as the input array.
+    """).rstrip()
+
+
+def build_batch_image_prompts(panels, style_description):
+    """
+    Builds a single request that asks gpt-5-mini for the final image prompt
+    of every panel in a storyboard at once.
+
+    Args:
+        panels (list): The 'panels' array from the script generator.
+        style_description (str): The sanitized, detailed description of the art style.
 
+    Returns:
+        list: The static system prompt and the per-comic request.
+    """
+    user_content = f"""
+    ### Panels
+    ```json
+    {json.dumps(panels, indent=2)}
+    ```
+    Style Description
+    "{style_description}"
+    """
+    return [BATCH_IMAGE_PROMPT_SYSTEM_PROMPT, user_content]
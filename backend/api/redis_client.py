@@ -0,0 +1,4 @@
+import os
+from redis import Redis
+
+redis_conn: Redis = Redis.from_url(os.getenv("REDIS_URL"))
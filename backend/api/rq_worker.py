@@ -0,0 +1,28 @@
+# rq_worker.py
+#
+# The RQ worker class the deployment runs:
+#
+#   rq worker -w backend.api.rq_worker.MetricsWorker comics_queue
+#
+# RQ forks a work horse for every job, and with PROMETHEUS_MULTIPROC_DIR set
+# each horse leaves its own metrics files behind. This worker folds them into
+# its own once the horse exits.
+
+import os
+from rq import Worker
+from .metrics import fold_process_metrics
+
+
+class MetricsWorker(Worker):
+    def fork_work_horse(self, job, queue):
+        super().fork_work_horse(job, queue)
+        # Only the parent returns here; monitor_work_horse resets _horse_pid when the horse exits
+        self.last_horse_pid = self._horse_pid
+
+    def execute_job(self, job, queue):
+        self.last_horse_pid = 0
+        try:
+            super().execute_job(job, queue)
+        finally:
+            if self.last_horse_pid:
+                fold_process_metrics(self.last_horse_pid, os.getpid())
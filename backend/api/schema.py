@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Optional
 
 class DeleteAvatarRequest(BaseModel):
     avatar_path: str
@@ -7,3 +8,11 @@ class AvatarRequest(BaseModel):
     user_photo_b64: str
     prompt: str
     name: str
+
+class AvatarEditRequest(BaseModel):
+    image_url: Optional[str] = None
+    prompt: str = "a vibrant, whimsical, and heartwarming portrait in the Studio Ghibli art style..."
+
+class RegeneratePanelRequest(BaseModel):
+    dream_id: str
+    panel_index: int
@@ -0,0 +1,129 @@
+# status_cache.py
+import hashlib
+import json
+import logging
+import os
+from redis.exceptions import WatchError
+from .redis_client import redis_conn
+
+STATUS_TTL = int(os.getenv("STATUS_TTL", 60 * 60 * 24))  # 1 day
+
+# The fields a status poll returns; the ETag is computed over these only
+COMIC_STATUS_FIELDS = ("status", "image_urls", "strip_path", "error_type", "error_message")
+AVATAR_STATUS_FIELDS = ("status", "error_type", "error_message")
+
+
+def comic_status_key(dream_id: str) -> str:
+    return f"comic:status:{dream_id}"
+
+
+def avatar_status_key(job_id: str) -> str:
+    return f"avatar:status:{job_id}"
+
+
+def _write(key: str, fields: dict):
+    try:
+        pipe = redis_conn.pipeline()
+        pipe.hset(key, mapping={name: json.dumps(value) for name, value in fields.items()})
+        pipe.expire(key, STATUS_TTL)
+        pipe.execute()
+    except Exception as e:
+        # The database stays the source of truth, so a failed write only costs a cache miss
+        logging.warning(f"Status cache write for {key} failed: {e}")
+
+
+def _read(key: str):
+    try:
+        raw = redis_conn.hgetall(key)
+    except Exception as e:
+        logging.warning(f"Status cache read for {key} failed: {e}")
+        return None
+    if not raw:
+        return None
+    return {name.decode("utf-8"): json.loads(value) for name, value in raw.items()}
+
+
+def _backfill(key: str, fields: dict):
+    """
+    Caches a status read from the database, unless a worker wrote a newer one
+    since. WATCH makes the check and the write atomic.
+    """
+    try:
+        with redis_conn.pipeline() as pipe:
+            pipe.watch(key)
+            if pipe.exists(key):
+                return
+            pipe.multi()
+            pipe.hset(key, mapping={name: json.dumps(value) for name, value in fields.items()})
+            pipe.expire(key, STATUS_TTL)
+            pipe.execute()
+    except WatchError:
+        pass
+    except Exception as e:
+        logging.warning(f"Status cache backfill for {key} failed: {e}")
+
+
+def set_comic_status(dream_id: str, status: str, image_urls: list = None, error_type: str = None,
+                     error_message: str = None, user_id: str = None, strip_path: str = None):
+    """Records a status transition of a comic. Every status field is overwritten."""
+    fields = {
+        "status": status,
+        "image_urls": image_urls or [],
+        "strip_path": strip_path,
+        "error_type": error_type,
+        "error_message": error_message,
+    }
+    if user_id:
+        fields["user_id"] = user_id
+    _write(comic_status_key(dream_id), fields)
+
+
+def get_comic_status(dream_id: str):
+    """Returns the cached status fields of a comic, or None on a miss."""
+    return _read(comic_status_key(dream_id))
+
+
+def backfill_comic_status(dream_id: str, row: dict):
+    _backfill(comic_status_key(dream_id), {
+        "status": row.get("status"),
+        "image_urls": row.get("image_urls") or [],
+        "strip_path": row.get("strip_path"),
+        "error_type": row.get("error_type"),
+        "error_message": row.get("error_message"),
+    })
+
+
+def set_avatar_status(job_id: str, status: str, user_id: str = None, error_type: str = None, error_message: str = None):
+    """Records a status transition of an avatar generation job."""
+    fields = {"status": status, "error_type": error_type, "error_message": error_message}
+    if user_id:
+        fields["user_id"] = user_id
+    _write(avatar_status_key(job_id), fields)
+
+
+def get_avatar_status(job_id: str):
+    """Returns the cached status fields of an avatar job, or None on a miss."""
+    return _read(avatar_status_key(job_id))
+
+
+def backfill_avatar_status(job_id: str, user_id: str, row: dict):
+    _backfill(avatar_status_key(job_id), {
+        "status": row.get("status"),
+        "error_type": row.get("error_type"),
+        "error_message": row.get("error_message"),
+        "user_id": user_id,
+    })
+
+
+def clear_comic_status(dream_id: str):
+    try:
+        redis_conn.delete(comic_status_key(dream_id))
+    except Exception as e:
+        logging.warning(f"Status cache delete for {dream_id} failed: {e}")
+
+
+def status_etag(data: dict, fields: tuple) -> str:
+    """A strong ETag over the status fields, so unchanged polls can be answered with 304."""
+    # Empty and missing values hash alike, so a database row and its cached copy match
+    content = json.dumps([data.get(name) or None for name in fields])
+    return f'"{hashlib.sha1(content.encode("utf-8")).hexdigest()}"'
@@ -0,0 +1,95 @@
+# storyboard_stream.py
+import json
+
+
+class StoryboardStreamParser:
+    """
+    Incrementally parses the storyboard JSON produced by the script generator.
+
+    Text deltas are fed in as they arrive from the LLM. Every time an object
+    inside the top level "panels" array is closed, it is decoded and returned
+    with its index in the array, so the caller can start rendering that panel
+    while the rest of the storyboard is still being written.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.in_panels = False
+        self.panels_done = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.object_start = None
+        self.panels_closed = 0
+        # Indexes of the panels returned by feed(); a malformed one is skipped, not shifted
+        self.emitted_indexes = set()
+
+    def feed(self, chunk: str) -> list:
+        """Adds a text delta and returns (index, panel) for any panels completed by it."""
+        self.buffer += chunk
+        completed = []
+
+        if not self.in_panels and not self.panels_done:
+            self._find_panels_array()
+
+        while self.in_panels and self.pos < len(self.buffer):
+            char = self.buffer[self.pos]
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                if self.depth == 0:
+                    self.object_start = self.pos
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0 and self.object_start is not None:
+                    raw_panel = self.buffer[self.object_start:self.pos + 1]
+                    self.object_start = None
+                    index = self.panels_closed
+                    self.panels_closed += 1
+                    try:
+                        completed.append((index, json.loads(raw_panel)))
+                        self.emitted_indexes.add(index)
+                    except json.JSONDecodeError:
+                        # Leave malformed panels for the full parse at the end
+                        pass
+            elif char == "]" and self.depth == 0:
+                self.in_panels = False
+                self.panels_done = True
+
+            self.pos += 1
+
+        return completed
+
+    def finish(self) -> dict:
+        """Parses the complete storyboard once the stream has ended."""
+        text = self.buffer.strip()
+
+        # The model occasionally wraps the object in a markdown fence
+        if text.startswith("```"):
+            text = text.strip("`")
+            if text.startswith("json"):
+                text = text[len("json"):]
+
+        return json.loads(text)
+
+    def _find_panels_array(self):
+        key_index = self.buffer.find('"panels"')
+        if key_index == -1:
+            return
+
+        bracket_index = self.buffer.find("[", key_index)
+        if bracket_index == -1:
+            return
+
+        self.in_panels = True
+        self.pos = bracket_index + 1
@@ -0,0 +1,179 @@
+# supervisor.py
+#
+# Runs a pool of job workers and sizes it to the backlog. Every few seconds
+# it looks at the queue in Redis (jobs waiting, jobs running, how long the
+# oldest job has waited) and starts or retires workers between
+# WORKER_POOL_MIN and WORKER_POOL_MAX.
+#
+#   python -m backend.api.supervisor
+#
+# Workers are `rq worker` processes, or async runners with WORKER_MODE=async.
+# A retired worker gets SIGTERM, which both treat as a warm shutdown: no new
+# jobs are taken and the running ones finish before it exits.
+
+import logging
+import math
+import os
+import signal
+import subprocess
+import sys
+import time
+from rq import Queue
+from rq.job import Job
+from rq.utils import now
+from .redis_client import redis_conn
+
+QUEUE_NAME = os.getenv("RQ_NAME", "comics_queue")
+WORKER_MODE = os.getenv("WORKER_MODE", "rq")
+POOL_MIN = int(os.getenv("WORKER_POOL_MIN", 1))
+POOL_MAX = int(os.getenv("WORKER_POOL_MAX", 4))
+# Jobs one worker is expected to take on: one for an RQ worker, its
+# concurrency for an async runner
+JOBS_PER_WORKER = int(os.getenv(
+    "WORKER_POOL_JOBS_PER_WORKER",
+    os.getenv("ASYNC_WORKER_CONCURRENCY", 16) if WORKER_MODE == "async" else 1
+))
+# A job waiting longer than this adds a worker even if the backlog alone would not
+MAX_JOB_WAIT = int(os.getenv("WORKER_POOL_MAX_JOB_WAIT", 30))  # seconds
+SCALE_INTERVAL = int(os.getenv("WORKER_POOL_SCALE_INTERVAL", 5))  # seconds
+# The pool shrinks only after demand has stayed low this long, one worker at a time
+SCALE_DOWN_DELAY = int(os.getenv("WORKER_POOL_SCALE_DOWN_DELAY", 60))  # seconds
+# A retired worker still running after this is killed; longer than the comic job_timeout
+DRAIN_TIMEOUT = int(os.getenv("WORKER_POOL_DRAIN_TIMEOUT", 600))  # seconds
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def worker_command() -> list:
+    if WORKER_MODE == "async":
+        return [sys.executable, "-m", "backend.api.async_runner"]
+    # Every worker offers to run the scheduler; a lock in Redis lets only one do it
+    command = ["rq", "worker", "-w", "backend.api.rq_worker.MetricsWorker", "--with-scheduler", QUEUE_NAME]
+    if os.getenv("REDIS_URL"):
+        command += ["--url", os.getenv("REDIS_URL")]
+    return command
+
+
+def queue_load(queue: Queue) -> tuple:
+    """Returns (jobs waiting, jobs running, seconds the oldest waiting job has waited)."""
+    waiting = queue.count
+    running = queue.started_job_registry.count
+
+    oldest_wait = 0
+    oldest_ids = queue.get_job_ids(0, 1)
+    if oldest_ids:
+        job = Job.fetch(oldest_ids[0], connection=queue.connection)
+        if job.enqueued_at:
+            oldest_wait = (now() - job.enqueued_at).total_seconds()
+
+    return waiting, running, oldest_wait
+
+
+def desired_pool_size(current: int, waiting: int, running: int, oldest_wait: float) -> int:
+    """The number of workers the pool should have for the current load."""
+    desired = math.ceil((waiting + running) / JOBS_PER_WORKER)
+    if waiting and oldest_wait > MAX_JOB_WAIT:
+        # Jobs are queueing faster than the pool drains them
+        desired = max(desired, current + 1)
+    return min(max(desired, POOL_MIN), POOL_MAX)
+
+
+class WorkerPool:
+    def __init__(self, queue: Queue):
+        self.queue = queue
+        self.workers = []  # running workers, oldest first
+        self.draining = {}  # retired worker -> time it was asked to stop
+        self.low_since = None
+        self.stopping = False
+
+    def request_stop(self, signum=None, frame=None):
+        if not self.stopping:
+            logging.info(f"Supervisor: shutdown requested, draining {len(self.workers)} workers")
+        self.stopping = True
+
+    def start_worker(self):
+        # Its own session, so a signal to the supervisor's process group does not
+        # reach the workers twice (a second SIGTERM makes `rq worker` kill its job)
+        process = subprocess.Popen(worker_command(), start_new_session=True)
+        self.workers.append(process)
+        logging.info(f"Supervisor: started worker {process.pid} ({len(self.workers)} running)")
+
+    def retire_worker(self):
+        process = self.workers.pop()
+        process.send_signal(signal.SIGTERM)
+        self.draining[process] = time.monotonic()
+        logging.info(f"Supervisor: draining worker {process.pid} ({len(self.workers)} running)")
+
+    def reap(self):
+        """Forgets workers that exited, and kills retired ones that outlived DRAIN_TIMEOUT."""
+        for process in [p for p in self.workers if p.poll() is not None]:
+            logging.warning(f"Supervisor: worker {process.pid} exited with code {process.returncode}")
+            self.workers.remove(process)
+
+        for process, retired_at in list(self.draining.items()):
+            if process.poll() is not None:
+                logging.info(f"Supervisor: worker {process.pid} drained")
+                del self.draining[process]
+            elif time.monotonic() - retired_at > DRAIN_TIMEOUT:
+                logging.error(f"Supervisor: worker {process.pid} did not drain in {DRAIN_TIMEOUT}s, killing it")
+                os.killpg(process.pid, signal.SIGKILL)
+
+    def scale(self):
+        try:
+            waiting, running, oldest_wait = queue_load(self.queue)
+        except Exception as e:
+            # Without a reading, keep the pool as it is (but never below the minimum)
+            logging.error(f"Supervisor: failed to read queue '{self.queue.name}': {e}")
+            waiting, running, oldest_wait = 0, 0, 0
+            desired = max(len(self.workers), POOL_MIN)
+        else:
+            desired = desired_pool_size(len(self.workers), waiting, running, oldest_wait)
+
+        if desired > len(self.workers):
+            logging.info(
+                f"Supervisor: {waiting} waiting (oldest {oldest_wait:.0f}s), {running} running, "
+                f"scaling {len(self.workers)} -> {desired}"
+            )
+            while len(self.workers) < desired:
+                self.start_worker()
+            self.low_since = None
+        elif desired < len(self.workers):
+            if self.low_since is None:
+                self.low_since = time.monotonic()
+            elif time.monotonic() - self.low_since >= SCALE_DOWN_DELAY:
+                self.retire_worker()
+                self.low_since = time.monotonic()
+        else:
+            self.low_since = None
+
+    def run(self):
+        logging.info(
+            f"Supervisor: '{self.queue.name}' with {WORKER_MODE} workers, pool {POOL_MIN}-{POOL_MAX}, "
+            f"{JOBS_PER_WORKER} jobs per worker"
+        )
+
+        while not self.stopping:
+            self.reap()
+            self.scale()
+
+            wake_at = time.monotonic() + SCALE_INTERVAL
+            while not self.stopping and time.monotonic() < wake_at:
+                time.sleep(0.5)
+
+        while self.workers:
+            self.retire_worker()
+        while self.draining:
+            self.reap()
+            time.sleep(0.5)
+        logging.info("Supervisor: stopped")
+
+
+def main():
+    pool = WorkerPool(Queue(QUEUE_NAME, connection=redis_conn))
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, pool.request_stop)
+    pool.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,13 +7,42 @@ import os
 import random
 import asyncio
 import logging
+from rq import Queue
 from .db_client import supabase
-from .api_clients import get_panel_descriptions, generate_image, generate_avatar_from_image, generate_image_flux_ultra, generate_image_google, complete_prompt
+from .redis_client import redis_conn
+from .api_clients import get_panel_descriptions, stream_panel_descriptions, generate_image, generate_avatar_from_image, generate_image_flux_ultra, generate_image_google, complete_prompt, complete_prompts_batch, AvatarHandle, IMAGE_MODEL, IMAGE_SIZE, IMAGE_QUALITY, DRAFT_IMAGE_QUALITY
 from .prompt_builder import build_image_prompt
-from .helper import current_model
+from .helper import current_model, style_name_to_description
+from .cache import get_cached_storyboard, cache_storyboard, invalidate_avatar_path, panel_image_cache_key, get_cached_panel_image, cache_panel_image, forget_panel_image
+from .metrics import span, current_dream_id
+from .status_cache import set_comic_status, set_avatar_status
+from .comic_state import ComicRecord, ConcurrentTransitionError
+from .checkpoint import load_storyboard_checkpoint, save_storyboard_checkpoint, load_panel_checkpoint, save_panel_checkpoint, clear_panel_checkpoint, clear_checkpoint
+from .cancellation import is_cancelled, run_until_cancelled, record_comic_job, JobCancelledError
+from .job_context import will_retry
+from .compositor import compose_strip
+from .panel_validation import panel_defect
+from .deadline import start_deadline, within_deadline, DeadlineExceededError, COMIC_JOB_TIMEOUT, PANEL_JOB_TIMEOUT, PANEL_RESERVE, UPLOAD_RESERVE
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Start rendering panels while the storyboard is still being written
+STREAM_STORYBOARD = os.getenv("STREAM_STORYBOARD", "false").lower() == "true"
+# Rewrite every panel prompt with the LLM before rendering (non-streaming path only)
+REFINE_PROMPTS = os.getenv("REFINE_PROMPTS", "false").lower() == "true"
+# Publish quick draft panels first, then replace them at full quality from a follow-up job
+PROGRESSIVE_RENDERING = os.getenv("PROGRESSIVE_RENDERING", "false").lower() == "true"
+# The full-quality pass is skipped while more jobs than this are waiting
+UPGRADE_MAX_BACKLOG = int(os.getenv("UPGRADE_MAX_BACKLOG", 10))
+QUEUE_NAME = os.getenv("RQ_NAME", "comics_queue")
+# Draft panels live in this folder of the comic, so they never collide with the final ones
+DRAFT_FOLDER = "draft"
+# Composite the finished panels into one strip image that clients can show with a single download
+COMPOSE_STRIP = os.getenv("COMPOSE_STRIP", "false").lower() == "true"
+# Check each rendered panel before upload, and render a bad one again up to PANEL_VALIDATION_RETRIES times
+VALIDATE_PANELS = os.getenv("VALIDATE_PANELS", "false").lower() == "true"
+PANEL_VALIDATION_RETRIES = int(os.getenv("PANEL_VALIDATION_RETRIES", 1))
+
 # Enhanced error handling for worker
 class WorkerError(Exception):
     def __init__(self, error_type: str, message: str, details: str = None):
@@ -53,44 +82,95 @@ def categorize_worker_error(e: Exception, context: str = "") -> str:
     return "unknown_error"
 
 # --- This is a helper function to generate a single panel ---
-async def generate_single_panel(panel_info: tuple):
-    """Generates a single panel and returns its public URL."""
+async def generate_single_panel(panel_info: tuple, use_cache: bool = True, draft: bool = False):
+    """
+    Generates a single panel and returns its storage path.
+
+    A panel rendered before from the same prompt and avatar is copied within
+    storage instead of being rendered again, unless use_cache is False. A
+    draft is rendered at DRAFT_IMAGE_QUALITY into the comic's draft folder.
+    """
     i, panel, user_id, dream_id, avatar, seed, style_description = panel_info
     logging.info(f"[{dream_id}] ===== PANEL {i+1} ASYNC THREAD STARTED =====")
 
+    # A previous run of this job may already have uploaded this panel
+    completed_path = load_panel_checkpoint(dream_id, i)
+    if completed_path:
+        logging.info(f"[{dream_id}] Panel {i+1} already uploaded to {completed_path}, skipping")
+        return completed_path
+
     try:
-        final_prompt = build_image_prompt(panel)
+        # Prefer the prompt written by the batched refinement stage, if it ran
+        final_prompt = panel.get("image_prompt") or build_image_prompt(panel)
+        panel_path = f"{user_id}/{dream_id}/{DRAFT_FOLDER}/{i+1}.png" if draft else f"{user_id}/{dream_id}/{i+1}.png"
+        quality = DRAFT_IMAGE_QUALITY if draft else IMAGE_QUALITY
+
+        cache_key = panel_image_cache_key(final_prompt, avatar.digest, current_model(), IMAGE_MODEL, IMAGE_SIZE, quality)
+        if use_cache:
+            copied_path = await copy_cached_panel(cache_key, panel_path, dream_id, i)
+            if copied_path:
+                return copied_path
      
-        image_bytes, error_details = await generate_image(final_prompt, avatar)
+        attempts = 1 + (PANEL_VALIDATION_RETRIES if VALIDATE_PANELS else 0)
+        for attempt in range(1, attempts + 1):
+            # Whatever is left of the job's budget, less the time the upload needs
+            with span("panel_generation", dream_id, panel=i+1, attempt=attempt):
+                image_bytes, error_details = await within_deadline(
+                    f"Panel {i+1}", generate_image(final_prompt, avatar, quality=quality), reserve=UPLOAD_RESERVE
+                )
 
-        
-        print(f"[{dream_id}] Image generation returned: {type(image_bytes)}")
+            print(f"[{dream_id}] Image generation returned: {type(image_bytes)}")
 
-        if not image_bytes:
-            logging.warning(
-                f"[{dream_id}] API call for Panel {i+1} succeeded but returned an empty image. Raising WorkerError."
-            )
+            if not image_bytes:
+                logging.warning(
+                    f"[{dream_id}] API call for Panel {i+1} succeeded but returned an empty image. Raising WorkerError."
+                )
+
+                raise WorkerError(
+                    "image_generation_error",
+                    f"Failed to generate image for Panel {i+1}",
+                    details=error_details
+                )
+
+            if not VALIDATE_PANELS:
+                break
+            with span("panel_validation", dream_id, panel=i+1, attempt=attempt):
+                defect = await asyncio.to_thread(panel_defect, image_bytes, IMAGE_SIZE)
+            if not defect:
+                break
+
+            # Only this panel is rendered again; the rest of the comic is unaffected
+            logging.warning(f"[{dream_id}] Panel {i+1} failed validation on attempt {attempt}/{attempts}: {defect}")
+            if attempt == attempts:
+                raise WorkerError(
+                    "image_generation_error",
+                    f"Panel {i+1} failed validation.",
+                    details=defect
+                )
 
-            raise WorkerError(
-                "image_generation_error",
-                f"Failed to generate image for Panel {i+1}",
-                details=error_details
-            )
         logging.info(f"[{dream_id}] Image generated successfully for Panel {i+1}, size: {len(image_bytes)} bytes")
         
         # Upload to Supabase Storage
-        panel_path = f"{user_id}/{dream_id}/{i+1}.png"
         print(f"[{dream_id}] Uploading Panel {i+1} to path: {panel_path}")
         
         try:
-            supabase.storage.from_("comics").upload(panel_path, image_bytes, {"content-type": "image/png"})
+            # upsert so a resumed job can overwrite a panel uploaded before its checkpoint was saved
+            with span("panel_upload", dream_id, panel=i+1):
+                await within_deadline(f"Panel {i+1} upload", asyncio.to_thread(
+                    supabase.storage.from_("comics").upload, panel_path, image_bytes, {"content-type": "image/png", "upsert": "true"}
+                ))
             print(f"[{dream_id}] Panel {i+1} uploaded successfully")
+        except DeadlineExceededError:
+            raise
         except Exception as upload_error:
             raise WorkerError(
                 "storage_error",
                 f"Failed to upload Panel {i+1}: {upload_error}"
             )
-        
+
+        save_panel_checkpoint(dream_id, i, panel_path)
+        cache_panel_image(cache_key, panel_path)
+
         logging.info(f"[{dream_id}] ===== PANEL {i+1} ASYNC THREAD COMPLETED =====")
         return panel_path
         
@@ -98,6 +178,14 @@ async def generate_single_panel(panel_info: tuple):
         # Re-raise WorkerError as-is
         print("perhaps here is the issue")
         raise
+    except DeadlineExceededError as e:
+        # The comic is finished with the panels that made it in time
+        logging.warning(f"[{dream_id}] {e}")
+        raise WorkerError(
+            "timeout_error",
+            f"Panel {i+1} did not finish in time.",
+            details=str(e)
+        )
     except Exception as e:
         logging.error(
             f"[{dream_id}] Root cause for Panel {i+1} failure:", 
@@ -111,20 +199,139 @@ async def generate_single_panel(panel_info: tuple):
         )
 
 
+async def copy_cached_panel(cache_key: str, panel_path: str, dream_id: str, i: int):
+    """Copies an identical, already rendered panel to panel_path. Returns the path, or None on a miss."""
+    cached_path = get_cached_panel_image(cache_key)
+    if not cached_path:
+        return None
+    if cached_path == panel_path:
+        # Rendered by an earlier attempt of this same job
+        save_panel_checkpoint(dream_id, i, panel_path)
+        return panel_path
+
+    try:
+        with span("panel_cache_copy", dream_id, panel=i+1):
+            await asyncio.to_thread(supabase.storage.from_("comics").copy, cached_path, panel_path)
+    except Exception as e:
+        # The source comic may have been deleted since; render the panel instead
+        logging.warning(f"[{dream_id}] Could not reuse cached Panel {i+1} from {cached_path}: {e}")
+        forget_panel_image(cache_key)
+        return None
+
+    logging.info(f"[{dream_id}] Panel {i+1} reused from {cached_path}")
+    save_panel_checkpoint(dream_id, i, panel_path)
+    return panel_path
+
+
+async def compose_comic_strip(dream_id: str, user_id: str, image_paths: list):
+    """
+    Composites a comic's panels into one image stored next to them. Returns
+    its path, or None if it could not be made, in which case clients show
+    the panels.
+    """
+    strip_path = f"{user_id}/{dream_id}/strip.jpg"
+    bucket = supabase.storage.from_("comics")
+
+    async def compose():
+        images = await asyncio.gather(*(asyncio.to_thread(bucket.download, path) for path in image_paths))
+        strip = await asyncio.to_thread(compose_strip, images)
+        await asyncio.to_thread(bucket.upload, strip_path, strip, {"content-type": "image/jpeg", "upsert": "true"})
+
+    try:
+        with span("strip_composite", dream_id, panels=len(image_paths)):
+            await within_deadline("Strip", compose())
+    except Exception as e:
+        logging.warning(f"[{dream_id}] Failed to compose the comic strip: {e}")
+        return None
+    return strip_path
+
+
 # --- This is the main worker function ---
-def run_comic_generation_worker(dream_id: str, user_id: str, story: str, num_panels: int, style_description: str, avatar_b64):
-    
+def run_comic_generation_worker(dream_id: str, user_id: str, story: str, num_panels: int, style_description: str, avatar_b64, reroll: bool = False):
+    """RQ entry point. Runs the comic pipeline on a fresh event loop."""
+    asyncio.run(run_comic_generation(dream_id, user_id, story, num_panels, style_description, avatar_b64, reroll))
+
+
+async def run_comic_generation(dream_id: str, user_id: str, story: str, num_panels: int, style_description: str, avatar_b64, reroll: bool = False):
+    """
+    The comic pipeline. Blocking calls run in threads so that many comics can
+    share one event loop in the async runner.
+    """
+    # Every span recorded by this task (and its panel tasks) is filed under this comic
+    current_dream_id.set(dream_id)
+    # Every stage times out from what is left of this, so the job ends before RQ kills it
+    start_deadline(COMIC_JOB_TIMEOUT)
+
+    if is_cancelled(dream_id):
+        print(f"[{dream_id}] Job was cancelled before it started")
+        return
+
+    # Prepared once and shared by every panel of this comic
+    avatar = AvatarHandle(avatar_b64)
+    try:
+        with span("comic_job"):
+            await avatar.prepare()
+            await run_until_cancelled(
+                dream_id,
+                _run_comic_generation(dream_id, user_id, story, num_panels, style_description, avatar, reroll)
+            )
+    except JobCancelledError:
+        # Whoever cancelled the job already recorded the comic's final status
+        clear_checkpoint(dream_id)
+        print(f"[{dream_id}] ===== WORKER FUNCTION CANCELLED =====")
+    finally:
+        await avatar.release()
+
+
+async def _run_comic_generation(dream_id: str, user_id: str, story: str, num_panels: int, style_description: str, avatar: AvatarHandle, reroll: bool = False):
+    # The API inserted the row; everything this job learns is written with its terminal update
+    comic = ComicRecord(dream_id, user_id)
+
     try:
         print("--- EXECUTING ASYNCIO VERSION ---")
 
-        try:
-            panel_data = get_panel_descriptions(story, num_panels, style_description)
-            print(f"[{dream_id}] get_panel_descriptions returned: {panel_data}")
-        except Exception as e:
-            raise WorkerError(
-                "llm_error",
-                f"Failed to generate story panels: {e}"
-            )
+        image_paths_or_errors = None
+
+        # Resume from the storyboard of an earlier, interrupted run of this job
+        panel_data = load_storyboard_checkpoint(dream_id)
+        if panel_data:
+            print(f"[{dream_id}] Resuming from checkpointed storyboard")
+        else:
+            # Panels checkpointed without a storyboard belong to a storyboard we no longer have
+            clear_checkpoint(dream_id)
+            # A re-roll explicitly asks for a fresh storyboard
+            panel_data = None if reroll else get_cached_storyboard(story, num_panels, style_description)
+
+        if panel_data:
+            print(f"[{dream_id}] Using existing storyboard, skipping the LLM")
+        elif STREAM_STORYBOARD:
+            # Panels start rendering while the storyboard is still streaming in
+            with span("storyboard_llm", streaming=True):
+                panel_data, image_paths_or_errors = await run_streaming_panel_generation(
+                    story, num_panels, style_description, user_id, dream_id, avatar
+                )
+            cache_storyboard(story, num_panels, style_description, panel_data)
+        else:
+            try:
+                # The panels need the rest of the budget
+                with span("storyboard_llm"):
+                    panel_data = await within_deadline(
+                        "Storyboard",
+                        asyncio.to_thread(get_panel_descriptions, story, num_panels, style_description),
+                        reserve=PANEL_RESERVE
+                    )
+                print(f"[{dream_id}] get_panel_descriptions returned: {panel_data}")
+            except DeadlineExceededError as e:
+                raise WorkerError(
+                    "timeout_error",
+                    f"The story took too long to write: {e}"
+                )
+            except Exception as e:
+                raise WorkerError(
+                    "llm_error",
+                    f"Failed to generate story panels: {e}"
+                )
+            cache_storyboard(story, num_panels, style_description, panel_data)
 
         panels = panel_data.get("panels")
         if not panels:
@@ -133,6 +340,8 @@ def run_comic_generation_worker(dream_id: str, user_id: str, story: str, num_pan
                 "The AI couldn't generate any story panels. Please try again with a different story."
             )
 
+        save_storyboard_checkpoint(dream_id, panel_data)
+
         print(f"[{dream_id}] Successfully got {len(panels)} panels")
         print(f"[{dream_id}] Panel data structure:")
         for i, panel in enumerate(panels):
@@ -141,15 +350,11 @@ def run_comic_generation_worker(dream_id: str, user_id: str, story: str, num_pan
         title = panel_data.get("title", "Untitled Dream")
         if not title:
             title = "Untitled Dream"
-        
-        #--------update supabase with new title------------#
-        try:
-            supabase.from_("comics").update({"title": title}).eq("id", dream_id).execute()
-        except Exception as e:
-            print(f"[{dream_id}] Warning: Failed to update title: {e}")
+        comic.stage(title=title)
 
         #--------set up and start parallel flow-------#
-        image_paths_or_errors = asyncio.run(run_async_panel_generation(panels, user_id, dream_id, avatar_b64, style_description))
+        if image_paths_or_errors is None:
+            image_paths_or_errors = await run_async_panel_generation(panels, user_id, dream_id, avatar, style_description)
 
         successful_paths = [path for path in image_paths_or_errors if not isinstance(path, WorkerError)]
         failed_panels = [err for err in image_paths_or_errors if isinstance(err, WorkerError)]
@@ -161,20 +366,24 @@ def run_comic_generation_worker(dream_id: str, user_id: str, story: str, num_pan
         if not successful_paths:
             raise failed_panels[0] if failed_panels else WorkerError("image_generation_error", "Failed to generate any panels.")
 
+        strip_path = await compose_comic_strip(dream_id, user_id, successful_paths) if COMPOSE_STRIP else None
+
         #-----update supabase with comics and complete status---------#
         logging.info(f"[{dream_id}] Updating database with {len(successful_paths)} successful panels...")
         try:
-            supabase.from_("comics").update({
-                "status": "complete",
-                "image_urls": successful_paths,
-                "panel_count": len(successful_paths)
-            }).eq("id", dream_id).execute()
+            with span("db_write", operation="complete"):
+                await asyncio.to_thread(comic.complete, successful_paths, storyboard=panel_data, strip_path=strip_path)
         except Exception as e:
             raise WorkerError(
                 "database_error",
                 f"Failed to update comic status: {e}"
             )
-        
+
+        clear_checkpoint(dream_id)
+
+        if PROGRESSIVE_RENDERING:
+            enqueue_panel_upgrade(dream_id, user_id, avatar.b64)
+
         print(f"[{dream_id}] ===== WORKER FUNCTION COMPLETED SUCCESSFULLY =====")
 
     except (WorkerError, Exception) as e:
@@ -182,37 +391,342 @@ def run_comic_generation_worker(dream_id: str, user_id: str, story: str, num_pan
         error_message = e.message if isinstance(e, WorkerError) else str(e)
         
         logging.error(f"[{dream_id}] WORKER FAILED WITH ERROR: {error_type} - {error_message}")
+
+        if will_retry():
+            # The retry resumes from the checkpoints, so pollers keep seeing the comic processing
+            logging.info(f"[{dream_id}] Job will be retried, leaving the comic processing")
+            raise e
         
         # Update database with error status and error details
         try:
-            supabase.from_("comics").update({
-                "status": "error",
-                "error_type": error_type,
-                "error_message": error_message
-            }).eq("id", dream_id).execute()
+            with span("db_write", operation="error"):
+                await asyncio.to_thread(comic.fail, error_type, error_message)
+        except ConcurrentTransitionError as conflict:
+            # A cancel already recorded the comic's final status
+            logging.warning(f"[{dream_id}] {conflict}")
         except Exception as db_error:
             logging.error(f"[{dream_id}] CRITICAL: Failed to update error status in database: {db_error}")
+            # Pollers still see the failure
+            set_comic_status(dream_id, "error", error_type=error_type, error_message=error_message, user_id=user_id)
         
         # Re-raise the error so the job is marked as failed in the RQ dashboard
         raise e
 
-async def run_async_panel_generation(panels, user_id, dream_id, avatar_b64, style_description):
+async def run_async_panel_generation(panels, user_id, dream_id, avatar, style_description):
     #openai doesnt support seed anymore but keeping it becuase other models do
     comic_seed = random.randint(0, 2**32 - 1)
-    
+
+    if REFINE_PROMPTS:
+        # One LLM call for the whole storyboard instead of one per panel
+        try:
+            with span("prompt_refinement", dream_id):
+                refined_prompts = await within_deadline(
+                    "Prompt refinement", complete_prompts_batch(panels, style_description, dream_id), reserve=PANEL_RESERVE
+                )
+            for panel, prompt in zip(panels, refined_prompts):
+                panel["image_prompt"] = prompt
+        except DeadlineExceededError as e:
+            # Unrefined prompts still make a comic
+            logging.warning(f"[{dream_id}] {e}, rendering from the unrefined prompts")
+
     tasks = [
-        generate_single_panel((i, p, user_id, dream_id, avatar_b64, comic_seed, style_description))
+        generate_single_panel((i, p, user_id, dream_id, avatar, comic_seed, style_description), draft=PROGRESSIVE_RENDERING)
         for i, p in enumerate(panels)
     ]
     
     logging.info(f"[{dream_id}] Starting {len(tasks)} async panel generation tasks...")
-    
-    results = await asyncio.gather(*tasks)
-    
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
     logging.info(f"[{dream_id}] All async panel tasks finished.")
     return results
 
 
+async def run_streaming_panel_generation(story, num_panels, style_description, user_id, dream_id, avatar):
+    """
+    Streams the storyboard from the LLM and starts a panel task for every
+    panel as soon as it is complete. Returns the full storyboard and the
+    panel results in storyboard order.
+    """
+    comic_seed = random.randint(0, 2**32 - 1)
+    tasks = {}  # panel index -> task
+    panel_data = None
+
+    logging.info(f"[{dream_id}] Streaming storyboard and dispatching panels as they arrive...")
+
+    async def dispatch_panels():
+        nonlocal panel_data
+        async for kind, payload in stream_panel_descriptions(story, num_panels, style_description):
+            if kind == "panel":
+                i, panel = payload
+                logging.info(f"[{dream_id}] Panel {i+1} received from stream, dispatching")
+                tasks[i] = asyncio.create_task(
+                    generate_single_panel((i, panel, user_id, dream_id, avatar, comic_seed, style_description), draft=PROGRESSIVE_RENDERING)
+                )
+            elif kind == "storyboard":
+                panel_data = payload
+                # Saved before the panels finish, so a retry of a job killed mid-panels keeps the ones uploaded
+                if panel_data.get("panels"):
+                    save_storyboard_checkpoint(dream_id, panel_data)
+
+    try:
+        # The panels still rendering need the rest of the budget
+        await within_deadline("Storyboard", dispatch_panels(), reserve=PANEL_RESERVE)
+    except asyncio.CancelledError:
+        # The job was cancelled while the storyboard was streaming
+        for task in tasks.values():
+            task.cancel()
+        raise
+    except Exception as e:
+        # No point finishing panels for a storyboard we cannot use
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        if isinstance(e, DeadlineExceededError):
+            raise WorkerError("timeout_error", f"The story took too long to write: {e}")
+        raise WorkerError(
+            "llm_error",
+            f"Failed to generate story panels: {e}"
+        )
+
+    print(f"[{dream_id}] stream_panel_descriptions returned: {panel_data}")
+
+    results = await asyncio.gather(*(tasks[i] for i in sorted(tasks)), return_exceptions=True)
+
+    logging.info(f"[{dream_id}] All streamed panel tasks finished.")
+    return panel_data, results
+
+
+def panel_number(path: str) -> int:
+    return int(os.path.splitext(os.path.basename(path))[0])
+
+
+def is_draft_path(path: str) -> bool:
+    return f"/{DRAFT_FOLDER}/" in path
+
+
+def splice_panel_path(image_paths: list, panel_path: str) -> list:
+    """Adds a panel path to a comic's stored paths, replacing that panel's old path (or draft) and keeping them in panel order."""
+    paths = [path for path in image_paths if panel_number(path) != panel_number(panel_path)] + [panel_path]
+    return sorted(paths, key=panel_number)
+
+
+def enqueue_panel_upgrade(dream_id: str, user_id: str, avatar_b64: str):
+    """Queues the full-quality pass over a comic's draft panels."""
+    try:
+        job = Queue(QUEUE_NAME, connection=redis_conn).enqueue(
+            'backend.api.worker.run_panel_upgrade_worker',
+            dream_id,
+            user_id,
+            avatar_b64,
+            job_timeout=COMIC_JOB_TIMEOUT
+        )
+        # Deleting the comic cancels the upgrade like any other job of it
+        record_comic_job(dream_id, job.id)
+    except Exception as e:
+        # The comic is complete either way, just with its drafts
+        logging.warning(f"[{dream_id}] Failed to enqueue the panel upgrade: {e}")
+
+
+def run_panel_upgrade_worker(dream_id: str, user_id: str, avatar_b64: str):
+    """RQ entry point. Runs the panel upgrade on a fresh event loop."""
+    asyncio.run(run_panel_upgrade(dream_id, user_id, avatar_b64))
+
+
+async def run_panel_upgrade(dream_id: str, user_id: str, avatar_b64: str):
+    """
+    The second pass of progressive rendering: renders the draft panels of a
+    complete comic again at full quality and swaps them in. Skipped while
+    the queue is backed up; the comic then keeps its drafts.
+    """
+    current_dream_id.set(dream_id)
+    start_deadline(COMIC_JOB_TIMEOUT)
+
+    backlog = await asyncio.to_thread(lambda: Queue(QUEUE_NAME, connection=redis_conn).count)
+    if backlog > UPGRADE_MAX_BACKLOG:
+        print(f"[{dream_id}] {backlog} jobs waiting, keeping the draft panels")
+        return
+    if is_cancelled(dream_id):
+        return
+
+    comic_response = await asyncio.to_thread(
+        supabase.from_("comics")
+        .select("style, status, storyboard, image_urls")
+        .eq("id", dream_id)
+        .single()
+        .execute
+    )
+    comic = comic_response.data
+    panels = (comic.get("storyboard") or {}).get("panels") or []
+    draft_indexes = [
+        panel_number(path) - 1 for path in comic.get("image_urls") or []
+        if is_draft_path(path) and panel_number(path) <= len(panels)
+    ]
+    if comic.get("status") != "complete" or not draft_indexes:
+        return
+
+    print(f"[{dream_id}] --- Upgrading {len(draft_indexes)} draft panels ---")
+    avatar = AvatarHandle(avatar_b64)
+    style_description = style_name_to_description(comic.get("style"))
+    comic_seed = random.randint(0, 2**32 - 1)
+    try:
+        with span("panel_upgrade"):
+            await avatar.prepare()
+            results = await run_until_cancelled(dream_id, asyncio.gather(*(
+                generate_single_panel((i, panels[i], user_id, dream_id, avatar, comic_seed, style_description))
+                for i in draft_indexes
+            ), return_exceptions=True))
+    except JobCancelledError:
+        clear_checkpoint(dream_id)
+        print(f"[{dream_id}] ===== PANEL UPGRADE CANCELLED =====")
+        return
+    finally:
+        await avatar.release()
+
+    upgraded = {panel_number(path): path for path in results if isinstance(path, str)}
+    for error in results:
+        if not isinstance(error, str):
+            logging.warning(f"[{dream_id}] A panel kept its draft: {error}")
+
+    # Panels may have been regenerated meanwhile; only drafts still in the comic are replaced
+    latest = (await asyncio.to_thread(
+        supabase.from_("comics").select("status, image_urls, strip_path").eq("id", dream_id).single().execute
+    )).data
+    if latest.get("status") != "complete":
+        print(f"[{dream_id}] Comic changed during the upgrade, keeping the draft panels")
+        return
+
+    image_paths = []
+    replaced_drafts = []
+    for path in latest.get("image_urls") or []:
+        if is_draft_path(path) and panel_number(path) in upgraded:
+            image_paths.append(upgraded[panel_number(path)])
+            replaced_drafts.append(path)
+        else:
+            image_paths.append(path)
+
+    # The drafts stay in storage: clients may still be showing them from signed URLs.
+    # They are removed with the rest of the comic's folder when it is deleted.
+    if replaced_drafts:
+        strip_path = latest.get("strip_path")
+        if COMPOSE_STRIP or strip_path:
+            # Without a new strip the draft one is still a fair picture of the comic
+            strip_path = await compose_comic_strip(dream_id, user_id, image_paths) or strip_path
+        record = ComicRecord(dream_id, user_id, status="complete")
+        try:
+            # Only written while the comic is still complete, so a regeneration started meanwhile is kept
+            await asyncio.to_thread(record.transition, "complete", image_urls=image_paths, strip_path=strip_path)
+        except ConcurrentTransitionError:
+            print(f"[{dream_id}] Comic changed during the upgrade, keeping the draft panels")
+            return
+
+    clear_checkpoint(dream_id)
+    print(f"[{dream_id}] ===== {len(replaced_drafts)} PANELS UPGRADED =====")
+
+
+def run_panel_regeneration_worker(dream_id: str, user_id: str, panel_index: int, avatar_path: str):
+    """RQ entry point. Runs the panel regeneration on a fresh event loop."""
+    asyncio.run(run_panel_regeneration(dream_id, user_id, panel_index, avatar_path))
+
+
+async def run_panel_regeneration(dream_id: str, user_id: str, panel_index: int, avatar_path: str):
+    """
+    Regenerates a single panel of an existing comic from its stored storyboard
+    and splices the new image into the comic's image_urls.
+    """
+    current_dream_id.set(dream_id)
+    start_deadline(PANEL_JOB_TIMEOUT)
+    record = ComicRecord(dream_id, user_id)
+    image_paths = []
+
+    try:
+        print(f"[{dream_id}] --- Regenerating Panel {panel_index+1} ---")
+
+        comic_response = await asyncio.to_thread(
+            supabase.from_("comics")
+            .select("style, storyboard, image_urls, strip_path")
+            .eq("id", dream_id)
+            .single()
+            .execute
+        )
+        comic = comic_response.data
+        image_paths = comic.get("image_urls") or []
+
+        panels = (comic.get("storyboard") or {}).get("panels") or []
+        if panel_index < 0 or panel_index >= len(panels):
+            raise WorkerError(
+                "content_error",
+                f"Panel {panel_index+1} does not exist in the stored storyboard."
+            )
+
+        try:
+            avatar_bytes = await asyncio.to_thread(supabase.storage.from_("avatars").download, avatar_path)
+            avatar = AvatarHandle(base64.b64encode(avatar_bytes).decode('utf-8'))
+        except Exception as e:
+            raise WorkerError(
+                "storage_error",
+                f"Failed to download avatar from storage: {e}"
+            )
+
+        # The regenerated panel must not be served from an older checkpoint
+        clear_panel_checkpoint(dream_id, panel_index)
+
+        style_description = style_name_to_description(comic.get("style"))
+        # A regeneration asks for a different image, so the panel cache is skipped
+        panel_path = await run_until_cancelled(dream_id, generate_single_panel(
+            (panel_index, panels[panel_index], user_id, dream_id, avatar, random.randint(0, 2**32 - 1), style_description),
+            use_cache=False
+        ))
+
+        image_paths = splice_panel_path(image_paths, panel_path)
+
+        # The old strip shows the old panel, so it is dropped if a new one cannot be made
+        strip_path = None
+        if COMPOSE_STRIP or comic.get("strip_path"):
+            strip_path = await compose_comic_strip(dream_id, user_id, image_paths)
+
+        try:
+            await asyncio.to_thread(record.complete, image_paths, strip_path=strip_path)
+        except Exception as e:
+            raise WorkerError(
+                "database_error",
+                f"Failed to update comic after regenerating Panel {panel_index+1}: {e}"
+            )
+
+        print(f"[{dream_id}] ===== PANEL {panel_index+1} REGENERATED SUCCESSFULLY =====")
+
+    except JobCancelledError:
+        # Whoever cancelled the job already put the comic back to its old panels
+        print(f"[{dream_id}] ===== PANEL {panel_index+1} REGENERATION CANCELLED =====")
+
+    except (WorkerError, Exception) as e:
+        error_type = e.error_type if isinstance(e, WorkerError) else categorize_worker_error(e)
+        error_message = e.message if isinstance(e, WorkerError) else str(e)
+
+        logging.error(f"[{dream_id}] PANEL REGENERATION FAILED WITH ERROR: {error_type} - {error_message}")
+
+        # The panels the comic already had are still valid, so only report the error
+        try:
+            if image_paths:
+                await asyncio.to_thread(
+                    record.transition, "complete", image_urls=image_paths, strip_path=comic.get("strip_path"),
+                    error_type=error_type, error_message=error_message
+                )
+            else:
+                await asyncio.to_thread(record.fail, error_type, error_message)
+        except ConcurrentTransitionError as conflict:
+            # A cancel already put the comic back to its old panels
+            logging.warning(f"[{dream_id}] {conflict}")
+        except Exception as db_error:
+            logging.error(f"[{dream_id}] CRITICAL: Failed to update error status in database: {db_error}")
+
+        raise e
+
+    finally:
+        # The checkpoint the new render wrote must not be taken for a panel of the original job
+        clear_panel_checkpoint(dream_id, panel_index)
+
+
 def run_avatar_generation_worker(user_id: str, prompt: str, image_b64: str, name: str):
     """
     A background worker that handles the entire avatar generation process.
@@ -227,7 +741,8 @@ def run_avatar_generation_worker(user_id: str, prompt: str, image_b64: str, name
 
         # 1. Generate the image using OpenAI
         try:
-            generated_image_bytes = generate_avatar_from_image(image_bytes, prompt)
+            with span("avatar_generation"):
+                generated_image_bytes = generate_avatar_from_image(image_bytes, prompt)
             if not generated_image_bytes:
                 raise WorkerError(
                     "image_generation_error",
@@ -243,11 +758,12 @@ def run_avatar_generation_worker(user_id: str, prompt: str, image_b64: str, name
         file_path = f"{user_id}/avatar_{int(time.time())}.png"
         print(f"--- Worker uploading avatar to: {file_path} ---")
         try:
-            supabase.storage.from_("avatars").upload(
-                path=file_path,
-                file=generated_image_bytes,
-                file_options={"content-type": "image/png"}
-            )
+            with span("avatar_upload"):
+                supabase.storage.from_("avatars").upload(
+                    path=file_path,
+                    file=generated_image_bytes,
+                    file_options={"content-type": "image/png"}
+                )
         except Exception as e:
             raise WorkerError(
                 "storage_error",
@@ -272,8 +788,11 @@ def run_avatar_generation_worker(user_id: str, prompt: str, image_b64: str, name
                 "database_error",
                 f"Failed to finalize avatar in database: {e}"
             )
+        # The new avatar is now the latest of its style
+        invalidate_avatar_path(user_id, name)
             
         supabase.from_("avatar_generations").update({"status": "complete"}).eq("job_id", job_id).execute()
+        set_avatar_status(job_id, "complete", user_id=user_id)
         print(f"--- ✅ Background avatar generation complete for user {user_id} ---")
 
     except WorkerError as e:
@@ -290,6 +809,7 @@ def run_avatar_generation_worker(user_id: str, prompt: str, image_b64: str, name
             }).eq("job_id", job_id).execute()
         except Exception as db_error:
             print(f"--- Failed to update error status in database: {db_error}")
+        set_avatar_status(job_id, "error", user_id=user_id, error_type=e.error_type, error_message=e.message)
         
         # Re-raise the error
         raise e
@@ -310,9 +830,59 @@ def run_avatar_generation_worker(user_id: str, prompt: str, image_b64: str, name
             }).eq("job_id", job_id).execute()
         except Exception as db_error:
             print(f"--- Failed to update error status in database: {db_error}")
+        set_avatar_status(job_id, "error", user_id=user_id, error_type=error_type, error_message=str(e))
         
         raise worker_error
 
+# Storage lists at most this many entries per call
+STORAGE_LIST_PAGE_SIZE = 100
+# Objects removed per storage delete request
+STORAGE_DELETE_BATCH_SIZE = 100
+
+
+def list_storage_objects(bucket: str, prefix: str) -> list:
+    """Lists the paths of every object under a folder prefix, including its subfolders."""
+    paths = []
+    offset = 0
+    while True:
+        entries = supabase.storage.from_(bucket).list(prefix, {
+            "limit": STORAGE_LIST_PAGE_SIZE,
+            "offset": offset,
+            "sortBy": {"column": "name", "order": "asc"}
+        })
+        for entry in entries:
+            path = f"{prefix}/{entry['name']}"
+            # Folders are listed without an id
+            if entry.get("id") is None:
+                paths += list_storage_objects(bucket, path)
+            else:
+                paths.append(path)
+
+        if len(entries) < STORAGE_LIST_PAGE_SIZE:
+            return paths
+        offset += STORAGE_LIST_PAGE_SIZE
+
+
+def run_storage_deletion_worker(bucket: str, prefixes: list = None, paths: list = None):
+    """
+    Removes storage objects in the background: the exact `paths`, plus every
+    object under each folder in `prefixes`. Storage does not delete folders by
+    prefix, so their contents are listed first (before anything is removed,
+    since removing shifts the list offsets) and then deleted in batches.
+    Safe to retry.
+    """
+    targets = list(paths or [])
+    for prefix in prefixes or []:
+        targets += list_storage_objects(bucket, prefix.rstrip("/"))
+
+    for start in range(0, len(targets), STORAGE_DELETE_BATCH_SIZE):
+        batch = targets[start:start + STORAGE_DELETE_BATCH_SIZE]
+        supabase.storage.from_(bucket).remove(batch)
+
+    logging.info(f"--- Removed {len(targets)} objects from '{bucket}' ---")
+    return len(targets)
+
+
 def run_debug_worker():
     """A simple test function to see if the worker is running at all."""
     logging.info("--- ✅ DEBUG WORKER (RELIABILITY TEST) HAS STARTED ---")
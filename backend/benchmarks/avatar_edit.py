@@ -0,0 +1,180 @@
+# avatar_edit.py
+#
+# Concurrency benchmark of POST /generate_avatar, which downloads a user's
+# photo from a URL and styles it with an image edit. N requests are sent at
+# once to the FastAPI app, with the photo host and OpenAI replaced by
+# fake_services.py, and throughput, latency percentiles and how much of the
+# oversized photos was read are reported.
+#
+#   python backend/benchmarks/avatar_edit.py --requests 50 --image-latency 2
+#   python backend/benchmarks/avatar_edit.py --requests 50 --legacy-threads 4
+#
+# --legacy-threads runs the old blocking Flask handler (requests.get and a
+# synchronous images.edit) on that many threads instead, for comparison.
+
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import json
+import logging
+import os
+import resource
+import time
+import uuid
+from collections import Counter
+from urllib.parse import urlparse
+import httpx
+from harness import start_fake_services, stop_fake_services, configure_environment, fake_stats, reset_fake_stats, percentile
+
+JWT_SECRET = "benchmark-jwt-secret"
+PROMPT = "a vibrant, whimsical, and heartwarming portrait in the Studio Ghibli art style"
+
+
+def mint_token(user_id: str) -> str:
+    import jwt
+    return jwt.encode({"sub": user_id, "aud": "authenticated", "exp": int(time.time()) + 3600}, JWT_SECRET, algorithm="HS256")
+
+
+def photo_urls(args, base_url: str) -> list:
+    """Every --oversized-every'th request points at a photo over the download limit."""
+    return [
+        f"{base_url}/photos/{args.oversized_kb if args.oversized_every and (i + 1) % args.oversized_every == 0 else args.photo_kb}"
+        for i in range(args.requests)
+    ]
+
+
+async def timed_request(client: httpx.AsyncClient, url: str) -> dict:
+    started = time.perf_counter()
+    response = await client.post(
+        "/generate_avatar",
+        json={"image_url": url, "prompt": PROMPT},
+        headers={"Authorization": f"Bearer {mint_token(str(uuid.uuid4()))}"},
+    )
+    return {"status": response.status_code, "latency": time.perf_counter() - started}
+
+
+async def run_async(urls: list) -> list:
+    from backend.api.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300) as client:
+        # Loads the SDKs and opens the pools, which a running server has long done
+        await timed_request(client, urls[0])
+        started = time.perf_counter()
+        results = await asyncio.gather(*(timed_request(client, url) for url in urls))
+        return results, time.perf_counter() - started
+
+
+def run_legacy(urls: list, threads: int) -> list:
+    """The removed Flask handler's blocking calls, on a fixed number of threads like its server."""
+    from openai import OpenAI
+    import jwt
+    import requests
+
+    client = OpenAI()
+    # Requests arrive together, so time spent waiting for a free thread counts too
+    submitted = time.perf_counter()
+
+    def handle(url: str) -> dict:
+        try:
+            jwt.decode(mint_token(str(uuid.uuid4())), JWT_SECRET, algorithms=["HS256"], audience="authenticated")
+            response = requests.get(url)
+            response.raise_for_status()
+            client.images.edit(
+                model="gpt-image-1", image=[("user_image.jpg", response.content)], prompt=PROMPT, n=1, size="1024x1024"
+            )
+            status = 200
+        except Exception:
+            status = 500
+        return {"status": status, "latency": time.perf_counter() - submitted}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(handle, urls))
+    return results, time.perf_counter() - submitted
+
+
+def summarize(results: list, wall_time: float, calls: dict, args) -> dict:
+    statuses = Counter(str(result["status"]) for result in results)
+    latencies = [result["latency"] for result in results if result["status"] == 200]
+    return {
+        "mode": f"legacy ({args.legacy_threads} threads)" if args.legacy_threads else "async",
+        "requests": len(results),
+        "statuses": dict(statuses),
+        "wall_time_s": round(wall_time, 2),
+        "throughput_per_s": round(statuses["200"] / wall_time, 2),
+        "latency_s": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "max": round(max(latencies, default=0), 2),
+        },
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "calls": dict(sorted(calls.items())),
+    }
+
+
+def print_report(report: dict):
+    print(f"mode              {report['mode']}")
+    print(f"requests          {report['requests']}  {report['statuses']}")
+    print(f"wall time         {report['wall_time_s']} s")
+    print(f"throughput        {report['throughput_per_s']} avatars/s")
+    latency = report["latency_s"]
+    print(f"latency           p50 {latency['p50']} s  p95 {latency['p95']} s  max {latency['max']} s")
+    print(f"peak rss          {report['peak_rss_mb']} MB")
+    print("backend calls")
+    for name, count in report["calls"].items():
+        print(f"  {name:<40} {count:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrency benchmark of the avatar-from-URL endpoint.")
+    parser.add_argument("--requests", type=int, default=50, help="requests sent at once")
+    parser.add_argument("--photo-kb", type=int, default=800, help="size of each user photo")
+    parser.add_argument("--oversized-every", type=int, default=10, help="every n-th photo is over the limit; 0 for none")
+    parser.add_argument("--oversized-kb", type=int, default=50 * 1024)
+    parser.add_argument("--max-download-kb", type=int, default=10 * 1024, help="IMAGE_DOWNLOAD_MAX_BYTES, in kilobytes")
+    parser.add_argument("--legacy-threads", type=int, default=0, help="run the old blocking handler on this many threads")
+    parser.add_argument("--verbose", action="store_true", help="show the backend's own logs and prints")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    # Passed through to fake_services.py
+    parser.add_argument("--image-latency", type=float, default=2.0)
+    parser.add_argument("--image-failure-rate", type=float, default=0.0)
+    parser.add_argument("--storage-latency", type=float, default=0.05, help="time before a photo starts streaming")
+    args = parser.parse_args()
+
+    fake_args = []
+    for name in ("image_latency", "image_failure_rate", "storage_latency"):
+        fake_args += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+
+    process, base_url = start_fake_services(fake_args)
+    try:
+        configure_environment(base_url)
+        os.environ["SUPABASE_JWT_SECRET"] = JWT_SECRET
+        os.environ["IMAGE_DOWNLOAD_MAX_BYTES"] = str(args.max_download_kb * 1024)
+        # The fake photo host is on localhost, which the download otherwise refuses
+        os.environ["IMAGE_DOWNLOAD_ALLOWED_HOSTS"] = urlparse(base_url).hostname
+        urls = photo_urls(args, base_url)
+        reset_fake_stats(base_url)
+
+        if not args.verbose:
+            # Configured first, so the backend's own basicConfig calls are no-ops
+            logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+        with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO()):
+            if args.legacy_threads:
+                results, wall_time = run_legacy(urls, args.legacy_threads)
+            else:
+                results, wall_time = asyncio.run(run_async(urls))
+        report = summarize(results, wall_time, fake_stats(base_url), args)
+    finally:
+        stop_fake_services(process)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# comic_pipeline.py
+#
+# Offline end-to-end benchmark of comic generation. Drives N concurrent
+# comics through the real /generate-comic/ endpoint and the async job runner,
+# with OpenAI and Supabase replaced by fake_services.py and Redis by fakeredis
+# (or a real server with --redis-url), then reports throughput, latency
+# percentiles, peak memory and how many backend calls each comic cost.
+#
+# Pipeline flags such as STREAM_STORYBOARD and REFINE_PROMPTS are read from the
+# environment as usual, so a change can be compared against its baseline:
+#
+#   python backend/benchmarks/comic_pipeline.py --comics 20 --concurrency 8
+#   STREAM_STORYBOARD=true python backend/benchmarks/comic_pipeline.py --comics 20 --image-latency 4
+#
+# Requires fakeredis (backend/benchmarks/requirements.txt).
+
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import json
+import logging
+import resource
+import threading
+import time
+import uuid
+from collections import defaultdict
+import httpx
+from harness import (
+    start_fake_services, stop_fake_services, configure_environment, seed_users,
+    auth_header, fake_stats, reset_fake_stats, percentile,
+)
+
+STYLE_NAME = "Ghibli"
+STORY = "I dreamt I was flying over a misty lake at dawn, chasing a paper crane that kept changing colour."
+TERMINAL_STATUSES = ("complete", "error")
+
+
+class RunnerThread(threading.Thread):
+    """
+    Runs the async job runner on its own event loop, like the separate worker
+    process it is in production, so the API's blocking calls do not stall it.
+    """
+
+    def __init__(self, concurrency: int):
+        super().__init__(daemon=True)
+        self.concurrency = concurrency
+        self.ready = threading.Event()
+
+    def run(self):
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        from rq import Queue
+        from backend.api.async_runner import AsyncJobRunner, QUEUE_NAME
+        from backend.api.redis_client import redis_conn
+
+        self.loop = asyncio.get_running_loop()
+        self.loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency * 4 + 4))
+        self.runner = AsyncJobRunner(Queue(QUEUE_NAME, connection=redis_conn), self.concurrency)
+        self.ready.set()
+        await self.runner.run()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.runner.request_stop)
+        self.join()
+
+
+async def run_comic(client: httpx.AsyncClient, user_id: str, story: str, num_panels: int, poll_interval: float, timeout: float) -> dict:
+    """Submits one comic and polls it to completion, as the app does."""
+    started = time.perf_counter()
+    response = await client.post(
+        "/generate-comic/",
+        data={"style_name": STYLE_NAME, "num_panels": str(num_panels), "story": story},
+        # Each submission is distinct, like a client that sends its own key per comic
+        headers={**auth_header(user_id), "Idempotency-Key": str(uuid.uuid4())},
+    )
+    if response.status_code != 200:
+        return {"status": "rejected", "latency": time.perf_counter() - started, "panels": 0, "detail": response.text}
+
+    dream_id = response.json()["dream_id"]
+    submitted = time.perf_counter() - started
+
+    status = {}
+    while time.perf_counter() - started < timeout:
+        await asyncio.sleep(poll_interval)
+        status = (await client.get(f"/comic-status/{dream_id}")).json()
+        if status.get("status") in TERMINAL_STATUSES:
+            break
+    else:
+        status = {"status": "timeout"}
+    latency = time.perf_counter() - started
+
+    # With progressive rendering the comic completes with drafts; wait for the full-quality pass too
+    while status.get("status") == "complete" and any("/draft/" in url for url in status.get("panel_urls") or []):
+        if time.perf_counter() - started > timeout:
+            break
+        await asyncio.sleep(poll_interval)
+        status = (await client.get(f"/comic-status/{dream_id}")).json()
+    final_latency = time.perf_counter() - started
+
+    trace = await client.get(f"/comic-trace/{dream_id}", headers=auth_header(user_id))
+    return {
+        "dream_id": dream_id,
+        "status": status.get("status"),
+        "latency": latency,
+        "final_latency": final_latency,
+        "submit_latency": submitted,
+        "panels": len(status.get("panel_urls") or []),
+        "spans": trace.json()["spans"] if trace.status_code == 200 else [],
+    }
+
+
+async def run_benchmark(args, base_url: str) -> dict:
+    from backend.api.main import app
+
+    user_ids = seed_users(args.users, STYLE_NAME, args.avatar_kb)
+    reset_fake_stats(base_url)
+
+    runner = RunnerThread(args.concurrency)
+    runner.start()
+    runner.ready.wait()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            run_comic(
+                client,
+                user_ids[i % len(user_ids)],
+                # Distinct stories unless the storyboard cache is what is being measured
+                STORY if args.repeat_story else f"{STORY} (dream {i+1})",
+                args.panels,
+                args.poll_interval,
+                args.timeout,
+            )
+            for i in range(args.comics)
+        ))
+        wall_time = time.perf_counter() - started
+
+    runner.stop()
+    return summarize(results, wall_time, fake_stats(base_url), args)
+
+
+def summarize(results: list, wall_time: float, calls: dict, args) -> dict:
+    statuses = defaultdict(int)
+    for result in results:
+        statuses[result["status"]] += 1
+
+    latencies = [result["latency"] for result in results if result["status"] == "complete"]
+    final_latencies = [result["final_latency"] for result in results if result["status"] == "complete"]
+    stage_ms = defaultdict(list)
+    for result in results:
+        for entry in result.get("spans", []):
+            stage_ms[entry["stage"]].append(entry["duration_ms"])
+
+    return {
+        "comics": len(results),
+        "statuses": dict(statuses),
+        "wall_time_s": round(wall_time, 2),
+        "throughput_per_min": round(statuses["complete"] / wall_time * 60, 2),
+        "latency_s": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(max(latencies, default=0), 2),
+        },
+        # Until full-quality panels; the same as latency_s without progressive rendering
+        "final_latency_s": {
+            "p50": round(percentile(final_latencies, 50), 2),
+            "p95": round(percentile(final_latencies, 95), 2),
+        },
+        "submit_latency_p95_ms": round(percentile([r["submit_latency"] for r in results if "submit_latency" in r], 95) * 1000, 1),
+        "panels_delivered": sum(result["panels"] for result in results),
+        "panels_requested": len(results) * args.panels,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stage_mean_ms": {stage: round(sum(values) / len(values), 1) for stage, values in sorted(stage_ms.items())},
+        "calls_per_comic": {name: round(count / len(results), 2) for name, count in sorted(calls.items())},
+    }
+
+
+def print_report(report: dict):
+    print(f"comics            {report['comics']}  {report['statuses']}")
+    print(f"wall time         {report['wall_time_s']} s")
+    print(f"throughput        {report['throughput_per_min']} comics/min")
+    latency = report["latency_s"]
+    print(f"latency           p50 {latency['p50']} s  p95 {latency['p95']} s  p99 {latency['p99']} s  max {latency['max']} s")
+    final = report["final_latency_s"]
+    print(f"final quality     p50 {final['p50']} s  p95 {final['p95']} s")
+    print(f"submit p95        {report['submit_latency_p95_ms']} ms")
+    print(f"panels            {report['panels_delivered']}/{report['panels_requested']}")
+    print(f"peak rss          {report['peak_rss_mb']} MB")
+    print("stage mean (ms)")
+    for stage, mean_ms in report["stage_mean_ms"].items():
+        print(f"  {stage:<20} {mean_ms:>10}")
+    print("backend calls per comic")
+    for name, count in report["calls_per_comic"].items():
+        print(f"  {name:<40} {count:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the comic pipeline.")
+    parser.add_argument("--comics", type=int, default=10, help="comics submitted at once")
+    parser.add_argument("--users", type=int, default=5, help="distinct users submitting them")
+    parser.add_argument("--panels", type=int, default=4)
+    parser.add_argument("--avatar-kb", type=int, default=0, help="size of each user's avatar")
+    parser.add_argument("--concurrency", type=int, default=8, help="jobs the async runner runs at once")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=300, help="seconds before a comic counts as timed out")
+    parser.add_argument("--repeat-story", action="store_true", help="submit the same story every time")
+    parser.add_argument("--redis-url", help="use a real Redis instead of fakeredis")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own logs and prints")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    # Passed through to fake_services.py
+    parser.add_argument("--storyboard-latency", type=float, default=3.0)
+    parser.add_argument("--prompt-latency", type=float, default=1.0)
+    parser.add_argument("--image-latency", type=float, default=2.0)
+    parser.add_argument("--image-failure-rate", type=float, default=0.0)
+    parser.add_argument("--blank-image-rate", type=float, default=0.0, help="share of images returned blank")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--storage-latency", type=float, default=0.02)
+    parser.add_argument("--db-latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    fake_args = []
+    for name in ("storyboard_latency", "prompt_latency", "image_latency", "image_failure_rate",
+                 "blank_image_rate", "llm_failure_rate", "storage_latency", "db_latency"):
+        fake_args += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+
+    process, base_url = start_fake_services(fake_args)
+    try:
+        configure_environment(base_url, args.redis_url)
+        if args.verbose:
+            report = asyncio.run(run_benchmark(args, base_url))
+        else:
+            # Configured first, so the backend's own basicConfig calls are no-ops
+            logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+            with contextlib.redirect_stdout(io.StringIO()):
+                report = asyncio.run(run_benchmark(args, base_url))
+    finally:
+        stop_fake_services(process)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
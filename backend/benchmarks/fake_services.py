@@ -0,0 +1,584 @@
+# fake_services.py
+#
+# Local stand-ins for the OpenAI and Supabase HTTP APIs used by the backend, so
+# the real pipeline can run offline. One server answers both:
+#
+#   /v1/...            OpenAI Responses (storyboard, prompt and image calls),
+#                      image edits, files, moderations and transcriptions
+#   /auth/v1/user      Supabase auth; the bearer token is used as the user id
+#   /rest/v1/{table}   a small in-memory PostgREST (eq filters, order, limit)
+#   /storage/v1/...    in-memory storage buckets
+#   /functions/v1/...  the finalize-avatar edge function
+#   /photos/{kb}       a user photo of that size, streamed like a remote download
+#
+# Latencies and failure rates are configurable, and /__stats reports how many
+# calls each route received.
+#
+#   python backend/benchmarks/fake_services.py --port 8765 --image-latency 2 --image-failure-rate 0.05
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import re
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+import cv2
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FakeConfig:
+    storyboard_latency = 3.0
+    prompt_latency = 1.0
+    image_latency = 2.0
+    image_failure_rate = 0.0
+    blank_image_rate = 0.0
+    llm_failure_rate = 0.0
+    storage_latency = 0.02
+    db_latency = 0.01
+    image_size = 512
+
+
+config = FakeConfig()
+app = FastAPI()
+
+tables = defaultdict(list)
+# Column defaults of the real schema that the backend relies on
+TABLE_DEFAULTS = {"comics": {"status": "processing"}}
+buckets = defaultdict(dict)
+calls = Counter()
+
+
+# Render time relative to --image-latency, which is the time of a medium-quality image
+QUALITY_LATENCY = {"low": 0.3, "medium": 1.0, "high": 2.5}
+
+
+def jittered(seconds: float) -> float:
+    return seconds * random.uniform(0.7, 1.3)
+
+
+def render_fake_panel() -> bytes:
+    """A noisy gradient image, so panels are not trivially compressible or uniform."""
+    size = config.image_size
+    gradient = np.linspace(0, 255, size, dtype=np.float32)
+    image = np.stack([
+        np.tile(gradient, (size, 1)),
+        np.tile(gradient[:, None], (1, size)),
+        np.full((size, size), random.randint(0, 255), dtype=np.float32),
+    ], axis=-1)
+    image += np.random.normal(0, 25, image.shape)
+    ok, encoded = cv2.imencode(".png", np.clip(image, 0, 255).astype(np.uint8))
+    return encoded.tobytes()
+
+
+def render_blank_panel() -> bytes:
+    """A flat grey image, the kind of junk panel an image model sometimes returns."""
+    size = config.image_size
+    ok, encoded = cv2.imencode(".png", np.full((size, size, 3), 230, dtype=np.uint8))
+    return encoded.tobytes()
+
+
+FAKE_PANEL_B64 = None
+BLANK_PANEL_B64 = None
+
+
+def fake_panel_b64() -> str:
+    global FAKE_PANEL_B64
+    if FAKE_PANEL_B64 is None:
+        FAKE_PANEL_B64 = base64.b64encode(render_fake_panel()).decode("utf-8")
+    return FAKE_PANEL_B64
+
+
+def blank_panel_b64() -> str:
+    global BLANK_PANEL_B64
+    if BLANK_PANEL_B64 is None:
+        BLANK_PANEL_B64 = base64.b64encode(render_blank_panel()).decode("utf-8")
+    return BLANK_PANEL_B64
+
+
+#---------------- OpenAI ----------------#
+
+def usage(input_text: str, output_text: str) -> dict:
+    input_tokens = len(input_text) // 4
+    output_tokens = len(output_text) // 4
+    return {
+        "input_tokens": input_tokens,
+        "input_tokens_details": {"cached_tokens": 0},
+        "output_tokens": output_tokens,
+        "output_tokens_details": {"reasoning_tokens": 0},
+        "total_tokens": input_tokens + output_tokens,
+    }
+
+
+def response_object(output: list, input_text: str = "", output_text: str = "") -> dict:
+    return {
+        "id": f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": "gpt-5-mini",
+        "status": "completed",
+        "output": output,
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": usage(input_text, output_text),
+    }
+
+
+def message_output(text: str) -> dict:
+    return {
+        "type": "message",
+        "id": f"msg_{uuid.uuid4().hex}",
+        "role": "assistant",
+        "status": "completed",
+        "content": [{"type": "output_text", "text": text, "annotations": []}],
+    }
+
+
+def fake_storyboard(request_text: str) -> dict:
+    match = re.search(r"MAX_PANELS:\s*(\d+)", request_text)
+    num_panels = int(match.group(1)) if match else 4
+    style_match = re.search(r'STYLE:\s*"(.*)"', request_text)
+    style = style_match.group(1) if style_match else "A distinct art style."
+
+    return {
+        "title": "Benchmark Dream",
+        "key_characters": [
+            {"description": "The main character of the story.", "character_notes": [style, "main character"]}
+        ],
+        "panels": [
+            {
+                "composition": f"Wide shot number {i+1} of the dream.",
+                "action_and_emotion": "The main character looks around in wonder.",
+                "setting_and_lighting": "A misty lake at dawn with soft light.",
+                "character_notes": [style, "main character"],
+            }
+            for i in range(num_panels)
+        ],
+    }
+
+
+async def stream_text(text: str, input_text: str, total_latency: float):
+    """Streams a Responses API text answer as server-sent events."""
+    chunks = [text[i:i + 40] for i in range(0, len(text), 40)]
+    delay = total_latency / max(len(chunks), 1)
+    sequence = 0
+
+    def event(payload: dict) -> str:
+        nonlocal sequence
+        sequence += 1
+        payload["sequence_number"] = sequence
+        return f"event: {payload['type']}\ndata: {json.dumps(payload)}\n\n"
+
+    yield event({"type": "response.created", "response": response_object([])})
+    for chunk in chunks:
+        await asyncio.sleep(delay)
+        yield event({
+            "type": "response.output_text.delta",
+            "item_id": "msg_fake",
+            "output_index": 0,
+            "content_index": 0,
+            "delta": chunk,
+        })
+    yield event({
+        "type": "response.completed",
+        "response": response_object([message_output(text)], input_text, text),
+    })
+
+
+@app.post("/v1/responses")
+async def responses(request: Request):
+    raw = await request.body()
+    body = json.loads(raw)
+    instructions = body.get("instructions") or ""
+    input_value = body.get("input")
+    input_text = input_value if isinstance(input_value, str) else json.dumps(input_value)[:2000]
+
+    tools = body.get("tools") or []
+    image_tool = next((tool for tool in tools if tool.get("type") == "image_generation"), None)
+    if image_tool:
+        quality = image_tool.get("quality", "medium")
+        calls["openai.image"] += 1
+        calls[f"openai.image.{quality}"] += 1
+        # Request size shows whether the avatar is sent inline with every panel
+        calls["openai.image_request_kb"] += len(raw) // 1024
+        await asyncio.sleep(jittered(config.image_latency * QUALITY_LATENCY.get(quality, 1.0)))
+        if random.random() < config.image_failure_rate:
+            calls["openai.failed"] += 1
+            return JSONResponse({"error": {"message": "Fake image generation failure", "type": "server_error"}}, status_code=500)
+        blank = random.random() < config.blank_image_rate
+        if blank:
+            calls["openai.image.blank"] += 1
+        output = [{
+            "type": "image_generation_call",
+            "id": f"ig_{uuid.uuid4().hex}",
+            "status": "completed",
+            "result": blank_panel_b64() if blank else fake_panel_b64(),
+        }]
+        return JSONResponse(response_object(output, input_text))
+
+    if "Comic Script Engineer" in instructions:
+        calls["openai.storyboard"] += 1
+        text = json.dumps(fake_storyboard(input_text))
+        latency = jittered(config.storyboard_latency)
+    elif "BATCH MODE" in instructions:
+        calls["openai.prompt_batch"] += 1
+        num_panels = input_text.count('"composition"')
+        text = json.dumps({"prompts": [f"Digital illustration, refined panel {i+1}." for i in range(num_panels)]})
+        latency = jittered(config.prompt_latency)
+    else:
+        calls["openai.prompt"] += 1
+        text = "Digital illustration, a refined panel."
+        latency = jittered(config.prompt_latency)
+
+    if random.random() < config.llm_failure_rate:
+        calls["openai.failed"] += 1
+        return JSONResponse({"error": {"message": "Fake LLM failure", "type": "server_error"}}, status_code=500)
+
+    if body.get("stream"):
+        return StreamingResponse(stream_text(text, input_text, latency), media_type="text/event-stream")
+
+    await asyncio.sleep(latency)
+    return JSONResponse(response_object([message_output(text)], input_text, text))
+
+
+@app.post("/v1/files")
+async def upload_file(request: Request):
+    calls["openai.file_upload"] += 1
+    form = await request.form()
+    upload = form["file"]
+    data = await upload.read()
+    return {
+        "id": f"file-{uuid.uuid4().hex}",
+        "object": "file",
+        "bytes": len(data),
+        "created_at": int(time.time()),
+        "filename": upload.filename,
+        "purpose": form.get("purpose", "vision"),
+        "status": "processed",
+    }
+
+
+@app.delete("/v1/files/{file_id}")
+async def delete_file(file_id: str):
+    calls["openai.file_delete"] += 1
+    return {"id": file_id, "object": "file", "deleted": True}
+
+
+@app.post("/v1/moderations")
+async def moderations(request: Request):
+    calls["openai.moderation"] += 1
+    await asyncio.sleep(jittered(0.2))
+    scores = {category: 0.0 for category in ["hate", "harassment", "self-harm", "sexual", "violence"]}
+    return {
+        "id": f"modr_{uuid.uuid4().hex}",
+        "model": "omni-moderation-latest",
+        "results": [{
+            "flagged": False,
+            "categories": {category: False for category in scores},
+            "category_scores": scores,
+        }],
+    }
+
+
+@app.post("/v1/images/edits")
+async def image_edits(request: Request):
+    raw = await request.body()
+    calls["openai.image_edit"] += 1
+    calls["openai.image_edit_request_kb"] += len(raw) // 1024
+    await asyncio.sleep(jittered(config.image_latency))
+    if random.random() < config.image_failure_rate:
+        calls["openai.failed"] += 1
+        return JSONResponse({"error": {"message": "Fake image edit failure", "type": "server_error"}}, status_code=500)
+    return {"created": int(time.time()), "data": [{"b64_json": fake_panel_b64()}]}
+
+
+@app.post("/v1/audio/transcriptions")
+async def transcriptions(request: Request):
+    calls["openai.transcription"] += 1
+    await asyncio.sleep(jittered(1.0))
+    return Response("I dreamt I was flying over a misty lake.", media_type="text/plain")
+
+
+#---------------- Supabase auth ----------------#
+
+@app.get("/auth/v1/user")
+async def auth_user(request: Request):
+    calls["supabase.auth"] += 1
+    token = request.headers.get("authorization", "").split(" ")[-1]
+    return {
+        "id": token,
+        "aud": "authenticated",
+        "role": "authenticated",
+        "email": f"{token}@example.com",
+        "app_metadata": {},
+        "user_metadata": {},
+        "created_at": "2025-01-01T00:00:00Z",
+    }
+
+
+#---------------- PostgREST ----------------#
+
+def matching_rows(table: str, params) -> list:
+    rows = tables[table]
+    for column, condition in params.multi_items():
+        if column in ("select", "order", "limit", "offset", "columns", "on_conflict"):
+            continue
+        if condition.startswith("eq."):
+            value = condition[3:]
+            rows = [row for row in rows if str(row.get(column)) == value]
+        elif condition.startswith("in.("):
+            values = condition[4:-1].split(",")
+            rows = [row for row in rows if str(row.get(column)) in values]
+    return rows
+
+
+def shaped(rows: list, request: Request):
+    params = request.query_params
+    order = params.get("order")
+    if order:
+        column, _, direction = order.partition(".")
+        rows = sorted(rows, key=lambda row: str(row.get(column) or ""), reverse=direction.startswith("desc"))
+    if params.get("limit"):
+        rows = rows[:int(params["limit"])]
+
+    select = params.get("select")
+    if select and select != "*":
+        columns = [column.strip() for column in select.split(",")]
+        rows = [{column: row.get(column) for column in columns} for row in rows]
+
+    if "vnd.pgrst.object" in request.headers.get("accept", ""):
+        if len(rows) != 1:
+            return JSONResponse(
+                {"code": "PGRST116", "message": "JSON object requested, multiple (or no) rows returned", "details": None, "hint": None},
+                status_code=406,
+            )
+        return JSONResponse(rows[0])
+    return JSONResponse(rows)
+
+
+@app.get("/rest/v1/{table}")
+async def rest_select(table: str, request: Request):
+    calls[f"supabase.rest.select.{table}"] += 1
+    await asyncio.sleep(config.db_latency)
+    return shaped(matching_rows(table, request.query_params), request)
+
+
+@app.post("/rest/v1/{table}")
+async def rest_insert(table: str, request: Request):
+    calls[f"supabase.rest.insert.{table}"] += 1
+    await asyncio.sleep(config.db_latency)
+    payload = await request.json()
+    inserted = []
+    for row in payload if isinstance(payload, list) else [payload]:
+        row = {
+            "id": str(uuid.uuid4()),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            **TABLE_DEFAULTS.get(table, {}),
+            **row,
+        }
+        tables[table].append(row)
+        inserted.append(row)
+    return shaped(inserted, request)
+
+
+@app.patch("/rest/v1/{table}")
+async def rest_update(table: str, request: Request):
+    calls[f"supabase.rest.update.{table}"] += 1
+    await asyncio.sleep(config.db_latency)
+    changes = await request.json()
+    rows = matching_rows(table, request.query_params)
+    for row in rows:
+        row.update(changes)
+    return shaped(rows, request)
+
+
+@app.delete("/rest/v1/{table}")
+async def rest_delete(table: str, request: Request):
+    calls[f"supabase.rest.delete.{table}"] += 1
+    await asyncio.sleep(config.db_latency)
+    rows = matching_rows(table, request.query_params)
+    tables[table] = [row for row in tables[table] if row not in rows]
+    return shaped(rows, request)
+
+
+#---------------- Storage ----------------#
+
+def storage_error(message: str, status_code: int):
+    return JSONResponse({"statusCode": str(status_code), "error": "Error", "message": message}, status_code=status_code)
+
+
+@app.post("/storage/v1/object/sign/{bucket}")
+async def storage_sign_many(bucket: str, request: Request):
+    calls["supabase.storage.sign_many"] += 1
+    await asyncio.sleep(config.storage_latency)
+    body = await request.json()
+    return [
+        {"error": None, "path": path, "signedURL": f"/object/sign/{bucket}/{path}?token={uuid.uuid4().hex}"}
+        if path in buckets[bucket] else
+        {"error": "Either the object does not exist or you do not have access to it", "path": path, "signedURL": None}
+        for path in body.get("paths") or []
+    ]
+
+
+@app.post("/storage/v1/object/sign/{bucket}/{path:path}")
+async def storage_sign(bucket: str, path: str):
+    calls["supabase.storage.sign"] += 1
+    await asyncio.sleep(config.storage_latency)
+    if path not in buckets[bucket]:
+        return storage_error("Object not found", 404)
+    return {"signedURL": f"/object/sign/{bucket}/{path}?token={uuid.uuid4().hex}"}
+
+
+@app.post("/storage/v1/object/list/{bucket}")
+async def storage_list(bucket: str, request: Request):
+    calls["supabase.storage.list"] += 1
+    await asyncio.sleep(config.storage_latency)
+    body = await request.json()
+    prefix = body.get("prefix", "").rstrip("/")
+    limit = int(body.get("limit", 100))
+    offset = int(body.get("offset", 0))
+    names = sorted(
+        path[len(prefix) + 1:] for path in buckets[bucket]
+        if path.startswith(prefix + "/") and "/" not in path[len(prefix) + 1:]
+    )
+    return [{"name": name, "id": name, "metadata": {}} for name in names[offset:offset + limit]]
+
+
+@app.post("/storage/v1/object/copy")
+async def storage_copy(request: Request):
+    calls["supabase.storage.copy"] += 1
+    await asyncio.sleep(config.storage_latency)
+    body = await request.json()
+    bucket = buckets[body["bucketId"]]
+    if body["sourceKey"] not in bucket:
+        return storage_error("Object not found", 404)
+    bucket[body["destinationKey"]] = bucket[body["sourceKey"]]
+    return {"Key": f"{body['bucketId']}/{body['destinationKey']}"}
+
+
+@app.post("/storage/v1/object/{bucket}/{path:path}")
+async def storage_upload(bucket: str, path: str, request: Request):
+    calls["supabase.storage.upload"] += 1
+    await asyncio.sleep(config.storage_latency)
+    form = await request.form()
+    data = await form["file"].read()
+    if path in buckets[bucket] and request.headers.get("x-upsert") != "true":
+        return storage_error("The resource already exists", 409)
+    buckets[bucket][path] = data
+    return {"Key": f"{bucket}/{path}"}
+
+
+@app.get("/storage/v1/object/{bucket}/{path:path}")
+async def storage_download(bucket: str, path: str):
+    calls["supabase.storage.download"] += 1
+    await asyncio.sleep(config.storage_latency)
+    if path not in buckets[bucket]:
+        return storage_error("Object not found", 404)
+    return Response(buckets[bucket][path], media_type="application/octet-stream")
+
+
+@app.delete("/storage/v1/object/{bucket}")
+async def storage_remove(bucket: str, request: Request):
+    calls["supabase.storage.remove"] += 1
+    await asyncio.sleep(config.storage_latency)
+    body = await request.json()
+    removed = [path for path in body.get("prefixes", []) if buckets[bucket].pop(path, None) is not None]
+    return [{"name": path} for path in removed]
+
+
+#---------------- Edge functions ----------------#
+
+@app.post("/functions/v1/finalize-avatar")
+async def finalize_avatar(request: Request):
+    calls["supabase.functions.finalize-avatar"] += 1
+    body = await request.json()
+    tables["avatars"].append({
+        "id": str(uuid.uuid4()),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "user_id": body["userId"],
+        "style": body["styleName"],
+        "avatar_path": body["avatarPath"],
+    })
+    return {"success": True}
+
+
+#---------------- Remote photos ----------------#
+
+@app.get("/photos/{kb}")
+async def photo(kb: int):
+    """Streams kb kilobytes without a Content-Length, so only a streaming size cap can stop it early."""
+    calls["photos.download"] += 1
+
+    async def body():
+        await asyncio.sleep(config.storage_latency)
+        for offset in range(0, kb, 64):
+            size = min(64, kb - offset)
+            yield b"\0" * (size * 1024)
+            calls["photos.kb_sent"] += size
+
+    return StreamingResponse(body(), media_type="image/jpeg")
+
+
+#---------------- Harness helpers ----------------#
+
+@app.get("/__health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.post("/__seed")
+async def seed(request: Request):
+    """Bulk-loads rows and storage objects without going through the latency of the fake APIs."""
+    body = await request.json()
+    for table, rows in body.get("tables", {}).items():
+        for row in rows:
+            tables[table].append({
+                "id": str(uuid.uuid4()),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                **TABLE_DEFAULTS.get(table, {}),
+                **row,
+            })
+    placeholder = base64.b64decode(body.get("object_b64", ""))
+    for bucket, paths in body.get("objects", {}).items():
+        for path in paths:
+            buckets[bucket][path] = placeholder
+    return {"status": "ok"}
+
+
+@app.get("/__stats")
+async def stats():
+    return dict(calls)
+
+
+@app.post("/__reset_stats")
+async def reset_stats():
+    calls.clear()
+    return {"status": "ok"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI and Supabase services for offline benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    for name in ("storyboard_latency", "prompt_latency", "image_latency", "image_failure_rate",
+                 "blank_image_rate", "llm_failure_rate", "storage_latency", "db_latency"):
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float, default=getattr(FakeConfig, name))
+    parser.add_argument("--image-size", type=int, default=FakeConfig.image_size)
+    args = parser.parse_args()
+
+    for name, value in vars(args).items():
+        if hasattr(FakeConfig, name):
+            setattr(config, name, value)
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
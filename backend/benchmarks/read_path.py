@@ -0,0 +1,211 @@
+# read_path.py
+#
+# Load test of the endpoints the app polls: /comic-status/{dream_id},
+# /avatar-status/{job_id} and /comics/. A fleet of simulated users polls the
+# FastAPI app every few seconds (with jitter), with Supabase and Redis replaced
+# by the same stand-ins as comic_pipeline.py. Each endpoint is measured on its
+# own, then all of them mixed, reporting achieved RPS, latency percentiles and
+# backend calls per request.
+#
+#   python backend/benchmarks/read_path.py
+#   python backend/benchmarks/read_path.py --users 500 --interval 2 --duration 30 --scenario comic-status
+#
+# The app runs in this process behind httpx's ASGI transport, i.e. one API
+# worker, the same as the single gunicorn worker in run.sh.
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import random
+import time
+import uuid
+from collections import Counter
+import httpx
+from harness import (
+    start_fake_services, stop_fake_services, configure_environment, seed_fake_data,
+    auth_header, fake_stats, reset_fake_stats, percentile,
+)
+
+STYLE_NAME = "Ghibli"
+
+# Relative weight of each endpoint in the mixed scenario, roughly what the app
+# sends: status polls while something generates, the timeline now and then
+MIXED_WEIGHTS = {"comic-status": 6, "avatar-status": 2, "comics": 2}
+
+
+class Fleet:
+    """The seeded users and the ids each of them polls."""
+
+    def __init__(self, num_users: int, comics_per_user: int, panels: int):
+        self.users = []
+        comics = []
+        generations = []
+        objects = []
+
+        for _ in range(num_users):
+            user_id = str(uuid.uuid4())
+            for c in range(comics_per_user):
+                dream_id = str(uuid.uuid4())
+                paths = [f"{user_id}/{dream_id}/{p+1}.png" for p in range(panels)]
+                objects += paths
+                comics.append({
+                    "id": dream_id,
+                    "user_id": user_id,
+                    "style": STYLE_NAME,
+                    "title": f"Dream {c+1}",
+                    "status": "complete",
+                    "image_urls": paths,
+                    "panel_count": panels,
+                })
+
+            # The comic and avatar this user is currently waiting on
+            pending_dream_id = str(uuid.uuid4())
+            comics.append({"id": pending_dream_id, "user_id": user_id, "style": STYLE_NAME, "status": "processing"})
+            job_id = str(uuid.uuid4())
+            generations.append({"job_id": job_id, "user_id": user_id, "status": "processing"})
+
+            self.users.append({"user_id": user_id, "dream_id": pending_dream_id, "job_id": job_id})
+
+        self.tables = {"comics": comics, "avatar_generations": generations}
+        self.objects = {"comics": objects}
+
+    def request(self, endpoint: str, user: dict) -> tuple:
+        """Returns (url, headers) of one poll of endpoint by user."""
+        if endpoint == "comic-status":
+            return f"/comic-status/{user['dream_id']}", {}
+        if endpoint == "avatar-status":
+            return f"/avatar-status/{user['job_id']}", auth_header(user["user_id"])
+        return "/comics/", auth_header(user["user_id"])
+
+
+async def poll(client: httpx.AsyncClient, fleet: Fleet, user: dict, endpoints: list, weights: list,
+               interval: float, stop_at: float, samples: list):
+    """
+    One user polling until stop_at, waiting `interval` (±20%) after each
+    response like the app does, and revalidating with the last ETag it got.
+    """
+    await asyncio.sleep(random.uniform(0, interval))
+    etags = {}
+
+    while time.perf_counter() < stop_at:
+        endpoint = random.choices(endpoints, weights)[0]
+        url, headers = fleet.request(endpoint, user)
+        if url in etags:
+            headers = {**headers, "If-None-Match": etags[url]}
+
+        started = time.perf_counter()
+        try:
+            response = await client.get(url, headers=headers)
+            status_code = response.status_code
+            if "etag" in response.headers:
+                etags[url] = response.headers["etag"]
+        except Exception:
+            status_code = "exception"
+        samples.append((endpoint, time.perf_counter() - started, status_code))
+
+        await asyncio.sleep(interval * random.uniform(0.8, 1.2))
+
+
+async def run_scenario(app, fleet: Fleet, base_url: str, name: str, args) -> dict:
+    weights = MIXED_WEIGHTS if name == "mixed" else {name: 1}
+    endpoints, endpoint_weights = list(weights), list(weights.values())
+    samples = []
+
+    # Every scenario starts with a cold /comics/ cache
+    from backend.api.main import comics_cache
+    comics_cache.clear()
+
+    reset_fake_stats(base_url)
+    transport = httpx.ASGITransport(app=app)
+    limits = httpx.Limits(max_connections=None)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60, limits=limits) as client:
+        started = time.perf_counter()
+        stop_at = started + args.duration
+        await asyncio.gather(*(
+            poll(client, fleet, user, endpoints, endpoint_weights, args.interval, stop_at, samples)
+            for user in fleet.users
+        ))
+        elapsed = time.perf_counter() - started
+
+    calls = fake_stats(base_url)
+    latencies = [latency for _, latency, _ in samples]
+    return {
+        "scenario": name,
+        "requests": len(samples),
+        "offered_rps": round(len(fleet.users) / args.interval, 1),
+        "achieved_rps": round(len(samples) / elapsed, 1),
+        "status_codes": dict(Counter(str(code) for _, _, code in samples)),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(max(latencies, default=0) * 1000, 1),
+        },
+        "backend_calls_per_request": round(sum(calls.values()) / max(len(samples), 1), 2),
+        "calls_per_request": {name: round(count / max(len(samples), 1), 2) for name, count in sorted(calls.items())},
+    }
+
+
+async def run_benchmark(args, base_url: str) -> list:
+    from backend.api.main import app
+
+    fleet = Fleet(args.users, args.comics_per_user, args.panels)
+    seed_fake_data(base_url, fleet.tables, fleet.objects)
+
+    scenarios = ["comic-status", "avatar-status", "comics", "mixed"] if args.scenario == "all" else [args.scenario]
+    return [await run_scenario(app, fleet, base_url, name, args) for name in scenarios]
+
+
+def print_report(reports: list):
+    for report in reports:
+        latency = report["latency_ms"]
+        print(f"== {report['scenario']} ==")
+        print(f"requests          {report['requests']}  {report['status_codes']}")
+        print(f"rps               achieved {report['achieved_rps']}  offered {report['offered_rps']}")
+        print(f"latency           p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms  max {latency['max']} ms")
+        print(f"backend calls     {report['backend_calls_per_request']} per request")
+        for name, count in report["calls_per_request"].items():
+            print(f"  {name:<40} {count:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the polled read endpoints.")
+    parser.add_argument("--users", type=int, default=200, help="simulated users, each polling on its own")
+    parser.add_argument("--interval", type=float, default=3.0, help="seconds between a user's polls")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per scenario")
+    parser.add_argument("--comics-per-user", type=int, default=5, help="finished comics on each user's timeline")
+    parser.add_argument("--panels", type=int, default=4)
+    parser.add_argument("--scenario", default="all", choices=["all", "mixed", *MIXED_WEIGHTS])
+    parser.add_argument("--redis-url", help="use a real Redis instead of fakeredis")
+    parser.add_argument("--storage-latency", type=float, default=0.02)
+    parser.add_argument("--db-latency", type=float, default=0.01)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="show the API's own logs and prints")
+    args = parser.parse_args()
+
+    process, base_url = start_fake_services([
+        "--storage-latency", str(args.storage_latency),
+        "--db-latency", str(args.db_latency),
+    ])
+    try:
+        configure_environment(base_url, args.redis_url)
+        if args.verbose:
+            reports = asyncio.run(run_benchmark(args, base_url))
+        else:
+            logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+            with contextlib.redirect_stdout(io.StringIO()):
+                reports = asyncio.run(run_benchmark(args, base_url))
+    finally:
+        stop_fake_services(process)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        print_report(reports)
+
+
+if __name__ == "__main__":
+    main()
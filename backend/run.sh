@@ -1,7 +1,23 @@
 #!/bin/bash
 
-# Start the RQ worker in the background
-rq worker $RQ_NAME &
+# Shared directory so /metrics can aggregate the metrics of the worker processes
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Start the job worker in the background.
+# WORKER_MODE=async runs many comics concurrently on one event loop instead of
+# forking an RQ work horse per job.
+# WORKER_POOL=true runs a pool of those workers instead, sized to the queue
+# between WORKER_POOL_MIN and WORKER_POOL_MAX.
+if [ "$WORKER_POOL" = "true" ]; then
+    python -m backend.api.supervisor &
+elif [ "$WORKER_MODE" = "async" ]; then
+    python -m backend.api.async_runner &
+else
+    # Folds each job's metrics into the worker's own, so the directory does not grow per job
+    # --with-scheduler enqueues jobs retried with an interval once they are due
+    rq worker -w backend.api.rq_worker.MetricsWorker --with-scheduler $RQ_NAME &
+fi
 
 # Start the Gunicorn server to manage Uvicorn workers in the foreground
 # -w 4: Starts 4 worker processes
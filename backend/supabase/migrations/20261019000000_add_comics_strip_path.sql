@@ -0,0 +1,2 @@
+-- Storage path of the comic's panels composited into one image
+ALTER TABLE "public"."comics" ADD COLUMN IF NOT EXISTS "strip_path" "text";
@@ -0,0 +1,150 @@
+# conftest.py
+#
+# Runs the backend against in-memory stand-ins: Redis is one fakeredis server
+# shared by every client, and the OpenAI and Supabase clients point at a port
+# nothing listens on, so a test that forgets to stub a call fails instead of
+# reaching a real service. Must run before backend.api is imported, since its
+# clients are created at import time.
+#
+#   python -m pytest -q backend/tests
+#
+# Requires pytest and fakeredis (backend/tests/requirements.txt).
+
+import os
+import sys
+import fakeredis
+import pytest
+import redis
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+os.environ.update({
+    "REDIS_URL": "redis://localhost:6379/0",
+    "OPENAI_API_KEY": "sk-test",
+    "OPENAI_BASE_URL": "http://127.0.0.1:9/v1",
+    "EXPO_PUBLIC_SUPABASE_URL": "http://127.0.0.1:9",
+    "SUPABASE_SERVICE_ROLE_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.test",
+})
+os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+FAKE_REDIS = fakeredis.FakeRedis()
+redis.Redis.from_url = classmethod(lambda cls, *args, **kwargs: FAKE_REDIS)
+
+
+@pytest.fixture(autouse=True)
+def fake_redis():
+    FAKE_REDIS.flushall()
+    yield FAKE_REDIS
+
+
+class FakeQuery:
+    """Enough of postgrest's query builder for the backend: eq filters, select, insert, update, delete."""
+
+    def __init__(self, db, table: str):
+        self.db = db
+        self.table = table
+        self.filters = {}
+        self.operation = "select"
+        self.columns = None
+        self.values = None
+        self.one = False
+
+    def select(self, columns: str = "*"):
+        self.columns = None if columns == "*" else [column.strip() for column in columns.split(",")]
+        return self
+
+    def insert(self, values: dict):
+        self.operation, self.values = "insert", values
+        return self
+
+    def update(self, values: dict):
+        self.operation, self.values = "update", values
+        return self
+
+    def delete(self):
+        self.operation = "delete"
+        return self
+
+    def eq(self, column: str, value):
+        self.filters[column] = value
+        return self
+
+    def single(self):
+        self.one = True
+        return self
+
+    def execute(self):
+        rows = self.db.tables.setdefault(self.table, [])
+        if self.operation == "insert":
+            rows.append(dict(self.values))
+            return FakeResponse([dict(self.values)])
+
+        matched = [row for row in rows if all(row.get(k) == v for k, v in self.filters.items())]
+        if self.operation == "update":
+            for row in matched:
+                row.update(self.values)
+        elif self.operation == "delete":
+            self.db.tables[self.table] = [row for row in rows if row not in matched]
+
+        data = [
+            {column: row.get(column) for column in self.columns} if self.columns else dict(row)
+            for row in matched
+        ]
+        if self.one:
+            return FakeResponse(data[0] if len(data) == 1 else None)
+        return FakeResponse(data)
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeBucket:
+    def __init__(self, objects: dict):
+        self.objects = objects
+
+    def upload(self, path: str, data: bytes, options: dict = None):
+        self.objects[path] = data
+
+    def download(self, path: str) -> bytes:
+        return self.objects[path]
+
+    def copy(self, source: str, destination: str):
+        self.objects[destination] = self.objects[source]
+
+    def remove(self, paths: list):
+        for path in paths:
+            self.objects.pop(path, None)
+
+    def create_signed_urls(self, paths: list, expires_in: int) -> list:
+        return [{"path": path, "signedURL": f"https://storage.test/{path}?expires_in={expires_in}"} for path in paths]
+
+
+class FakeStorage:
+    def __init__(self):
+        self.buckets = {}
+
+    def from_(self, bucket: str) -> FakeBucket:
+        return FakeBucket(self.buckets.setdefault(bucket, {}))
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {}
+        self.storage = FakeStorage()
+
+    def from_(self, table: str) -> FakeQuery:
+        return FakeQuery(self, table)
+
+
+@pytest.fixture
+def fake_supabase(monkeypatch):
+    from backend.api import comic_state, main, worker
+
+    db = FakeSupabase()
+    for module in (comic_state, main, worker):
+        monkeypatch.setattr(module, "supabase", db)
+    return db
@@ -0,0 +1,86 @@
+# test_api_access.py
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from backend.api import main
+from backend.api.metrics import record_span
+from backend.api.status_cache import clear_comic_status
+
+
+@pytest.fixture
+def client(monkeypatch, fake_supabase):
+    def authenticate_user(authorization):
+        # The bearer token is the user id, like the benchmark's fake auth
+        if not authorization:
+            raise HTTPException(status_code=401, detail="Authorization header is required")
+        return SimpleNamespace(id=authorization.split(" ")[1])
+
+    monkeypatch.setattr(main, "authenticateUser", authenticate_user)
+    fake_supabase.tables["comics"] = [{"id": "dream-1", "user_id": "owner", "status": "complete"}]
+    record_span("dream-1", {"stage": "comic_job", "started_at": 1.0, "duration_ms": 500.0})
+    return TestClient(main.app)
+
+
+def test_trace_is_only_shown_to_the_comics_owner(client):
+    assert client.get("/comic-trace/dream-1").status_code == 401
+    assert client.get("/comic-trace/dream-1", headers={"Authorization": "Bearer someone-else"}).status_code == 404
+
+    response = client.get("/comic-trace/dream-1", headers={"Authorization": "Bearer owner"})
+    assert response.status_code == 200
+    assert [span["stage"] for span in response.json()["spans"]] == ["comic_job"]
+
+
+def test_metrics_need_the_scrape_token(client, monkeypatch):
+    # TestClient requests come from "testclient", not a local address
+    assert client.get("/metrics").status_code == 404
+
+    monkeypatch.setattr(main, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 404
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert "comic_stage_seconds" in response.text
+
+
+def test_comic_status_with_signed_urls_is_never_cached(client, fake_supabase):
+    fake_supabase.tables["comics"].append({"id": "dream-2", "user_id": "owner", "status": "processing"})
+    polled = client.get("/comic-status/dream-2")
+    etag = polled.headers["ETag"]
+    assert client.get("/comic-status/dream-2", headers={"If-None-Match": etag}).status_code == 304
+
+    fake_supabase.tables["comics"][1].update({"status": "complete", "image_urls": ["dream-2/panel_0.png"]})
+    clear_comic_status("dream-2")
+    done = client.get("/comic-status/dream-2", headers={"If-None-Match": etag})
+    assert done.status_code == 200
+    assert done.json()["panel_urls"] == ["https://storage.test/dream-2/panel_0.png?expires_in=300"]
+    assert "ETag" not in done.headers
+    assert done.headers["Cache-Control"] == "no-store"
+
+
+def test_cancel_that_loses_to_the_job_is_a_conflict(client, fake_supabase, monkeypatch):
+    fake_supabase.tables["comics"].append({"id": "dream-3", "user_id": "owner", "status": "processing"})
+
+    def job_finishes_first(dream_id):
+        fake_supabase.tables["comics"][1].update({"status": "complete", "image_urls": ["dream-3/panel_0.png"]})
+
+    monkeypatch.setattr(main, "cancel_comic_job", job_finishes_first)
+    response = client.post("/cancel-comic/dream-3", headers={"Authorization": "Bearer owner"})
+    assert response.status_code == 409
+    assert fake_supabase.tables["comics"][1]["status"] == "complete"
+
+
+def test_comic_is_only_deleted_by_its_owner(client, fake_supabase, monkeypatch):
+    cancelled, deletions = [], []
+    monkeypatch.setattr(main, "cancel_comic_job", cancelled.append)
+    monkeypatch.setattr(main, "enqueue_storage_deletion", lambda bucket, prefixes: deletions.append(prefixes))
+
+    response = client.delete("/delete-comic", params={"dream_id": "dream-1"}, headers={"Authorization": "Bearer someone-else"})
+    assert response.status_code == 404
+    assert (cancelled, deletions) == ([], [])
+    assert [comic["id"] for comic in fake_supabase.tables["comics"]] == ["dream-1"]
+
+    response = client.delete("/delete-comic", params={"dream_id": "dream-1"}, headers={"Authorization": "Bearer owner"})
+    assert response.status_code == 200
+    assert cancelled == ["dream-1"]
+    assert deletions == [["owner/dream-1"]]
+    assert fake_supabase.tables["comics"] == []
@@ -0,0 +1,58 @@
+# test_async_runner.py
+import asyncio
+from datetime import timedelta
+from rq import Queue, Retry
+from rq.job import JobStatus
+from rq.scheduler import RQScheduler
+from rq.utils import now
+from backend.api.async_runner import AsyncJobRunner
+from backend.api.redis_client import redis_conn
+
+# A thread-run job that always fails
+FAILING_JOB = "os.path.getsize"
+MISSING_FILE = "/nonexistent/dreamtoon-test"
+
+
+def run_next_job(runner: AsyncJobRunner):
+    job, queue = Queue.dequeue_any([runner.queue], None, connection=redis_conn)
+
+    async def execute():
+        await runner.slots.acquire()
+        await runner.execute(job, queue)
+
+    asyncio.run(execute())
+    job.refresh()
+    return job
+
+
+def test_failed_job_with_retries_left_is_requeued():
+    queue = Queue("retry_test", connection=redis_conn)
+    runner = AsyncJobRunner(queue, concurrency=1)
+    job = queue.enqueue(FAILING_JOB, MISSING_FILE, retry=Retry(max=2))
+
+    job = run_next_job(runner)
+    assert job.get_status() == JobStatus.QUEUED
+    assert job.retries_left == 1
+    assert queue.job_ids == [job.id]
+    assert job.id not in queue.failed_job_registry
+
+    run_next_job(runner)
+    job = run_next_job(runner)
+    assert job.get_status() == JobStatus.FAILED
+    assert job.id in queue.failed_job_registry
+
+
+def test_retry_interval_is_scheduled_then_enqueued_when_due():
+    queue = Queue("retry_interval_test", connection=redis_conn)
+    runner = AsyncJobRunner(queue, concurrency=1)
+    job = queue.enqueue(FAILING_JOB, MISSING_FILE, retry=Retry(max=3, interval=[10, 30, 60]))
+
+    job = run_next_job(runner)
+    assert job.get_status() == JobStatus.SCHEDULED
+    assert job.id in queue.scheduled_job_registry
+    assert queue.job_ids == []
+
+    # Make the retry due instead of waiting out its interval
+    queue.scheduled_job_registry.schedule(job, now() - timedelta(seconds=1))
+    AsyncJobRunner.enqueue_due_jobs(RQScheduler([queue], connection=redis_conn))
+    assert queue.job_ids == [job.id]
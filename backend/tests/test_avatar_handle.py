@@ -0,0 +1,30 @@
+# test_avatar_handle.py
+import asyncio
+from backend.api import worker
+from backend.api.api_clients import AvatarHandle
+
+STORYBOARD = {
+    "title": "Faceless Dream",
+    "panels": [{"composition": f"Shot {i+1}", "image_prompt": f"panel prompt {i+1}"} for i in range(2)],
+}
+
+
+def test_job_without_an_avatar_draws_panels_from_the_prompt(monkeypatch, fake_supabase):
+    dream_id, user_id = "test-dream-id", "test-user-id"
+    fake_supabase.tables["comics"] = [{"id": dream_id, "user_id": user_id, "status": "processing"}]
+    monkeypatch.setattr(worker, "STREAM_STORYBOARD", False)
+    monkeypatch.setattr(worker, "get_panel_descriptions", lambda story, num_panels, style_description: STORYBOARD)
+
+    inputs = []
+
+    async def generate_image(prompt, avatar, quality=None):
+        inputs.append(avatar.input_image())
+        return b"png", None
+
+    monkeypatch.setattr(worker, "generate_image", generate_image)
+    # What /test-comic-worker/ enqueues
+    asyncio.run(worker.run_comic_generation(dream_id, user_id, "A simple test story", 2, "test style description", None))
+
+    assert inputs == [None, None]
+    assert fake_supabase.tables["comics"][0]["status"] == "complete"
+    assert AvatarHandle(None).digest != AvatarHandle("YXZhdGFy").digest
@@ -0,0 +1,129 @@
+# test_comic_resume.py
+import asyncio
+from rq import Queue, Retry
+from rq.job import JobStatus
+from backend.api import worker
+from backend.api.async_runner import AsyncJobRunner
+from backend.api.deadline import COMIC_JOB_TIMEOUT
+from backend.api.redis_client import redis_conn
+from backend.api.checkpoint import load_storyboard_checkpoint, load_panel_checkpoint
+
+STORYBOARD = {
+    "title": "Resumed Dream",
+    "panels": [{"composition": f"Shot {i+1}", "image_prompt": f"panel prompt {i+1}"} for i in range(3)],
+}
+
+
+def fake_stream(calls: list):
+    async def stream_panel_descriptions(story, num_panels, style_description):
+        calls.append(story)
+        for index, panel in enumerate(STORYBOARD["panels"]):
+            yield "panel", (index, dict(panel))
+        yield "storyboard", STORYBOARD
+    return stream_panel_descriptions
+
+
+def run_next_job(runner: AsyncJobRunner):
+    job, queue = Queue.dequeue_any([runner.queue], None, connection=redis_conn)
+
+    async def execute():
+        await runner.slots.acquire()
+        await runner.execute(job, queue)
+
+    asyncio.run(execute())
+    job.refresh()
+    return job
+
+
+def enqueue_comic(queue: Queue, dream_id: str, user_id: str, retries: int):
+    return queue.enqueue(
+        "backend.api.worker.run_comic_generation_worker",
+        dream_id, user_id, "a story", 3, "style", "avatar", False,
+        job_timeout=COMIC_JOB_TIMEOUT,
+        retry=Retry(max=retries)
+    )
+
+
+def test_retried_streaming_job_reuses_finished_panels(monkeypatch, fake_supabase):
+    dream_id, user_id = "dream-1", "user-1"
+    fake_supabase.tables["comics"] = [{"id": dream_id, "user_id": user_id, "status": "processing"}]
+    monkeypatch.setattr(worker, "STREAM_STORYBOARD", True)
+    monkeypatch.setattr(worker, "COMPOSE_STRIP", True)
+    streams, rendered, strips = [], [], []
+    monkeypatch.setattr(worker, "stream_panel_descriptions", fake_stream(streams))
+
+    async def generate_image(prompt, avatar, quality=None):
+        rendered.append(prompt)
+        return b"png", None
+
+    async def compose_comic_strip(dream_id, user_id, image_paths):
+        strips.append(image_paths)
+        if len(strips) == 1:
+            # The first attempt dies after its panels are rendered
+            raise RuntimeError("worker lost its connection")
+        return None
+
+    monkeypatch.setattr(worker, "generate_image", generate_image)
+    monkeypatch.setattr(worker, "compose_comic_strip", compose_comic_strip)
+
+    queue = Queue("comic_retry_test", connection=redis_conn)
+    runner = AsyncJobRunner(queue, concurrency=1)
+    enqueue_comic(queue, dream_id, user_id, retries=1)
+
+    job = run_next_job(runner)
+    assert job.get_status() == JobStatus.QUEUED
+    # Pollers keep waiting while the retry is pending
+    assert fake_supabase.tables["comics"][0]["status"] == "processing"
+    assert load_storyboard_checkpoint(dream_id) == STORYBOARD
+    assert sorted(rendered) == ["panel prompt 1", "panel prompt 2", "panel prompt 3"]
+
+    rendered.clear()
+    job = run_next_job(runner)
+    assert job.get_status() == JobStatus.FINISHED
+
+    # The retry resumed from the checkpointed storyboard and panels
+    assert streams == ["a story"]
+    assert rendered == []
+    comic = fake_supabase.tables["comics"][0]
+    assert comic["status"] == "complete"
+    assert comic["image_urls"] == [f"{user_id}/{dream_id}/{i}.png" for i in (1, 2, 3)]
+
+
+def test_last_attempt_marks_the_comic_failed(monkeypatch, fake_supabase):
+    dream_id, user_id = "dream-3", "user-3"
+    fake_supabase.tables["comics"] = [{"id": dream_id, "user_id": user_id, "status": "processing"}]
+    monkeypatch.setattr(worker, "STREAM_STORYBOARD", True)
+
+    async def stream_panel_descriptions(story, num_panels, style_description):
+        raise RuntimeError("storyboard service is down")
+        yield
+
+    monkeypatch.setattr(worker, "stream_panel_descriptions", stream_panel_descriptions)
+
+    queue = Queue("comic_fail_test", connection=redis_conn)
+    runner = AsyncJobRunner(queue, concurrency=1)
+    enqueue_comic(queue, dream_id, user_id, retries=1)
+
+    run_next_job(runner)
+    assert fake_supabase.tables["comics"][0]["status"] == "processing"
+    job = run_next_job(runner)
+    assert job.get_status() == JobStatus.FAILED
+    assert fake_supabase.tables["comics"][0]["status"] == "error"
+
+
+def test_panel_regeneration_leaves_no_checkpoint(monkeypatch, fake_supabase):
+    dream_id, user_id = "dream-2", "user-2"
+    fake_supabase.tables["comics"] = [{
+        "id": dream_id, "user_id": user_id, "status": "processing", "style": "Ghibli",
+        "storyboard": STORYBOARD, "image_urls": [f"{user_id}/{dream_id}/{i}.png" for i in (1, 2, 3)],
+    }]
+    fake_supabase.storage.from_("avatars").upload(f"{user_id}/Ghibli.png", b"avatar")
+
+    async def generate_image(prompt, avatar, quality=None):
+        return b"png", None
+
+    monkeypatch.setattr(worker, "generate_image", generate_image)
+    asyncio.run(worker.run_panel_regeneration(dream_id, user_id, 1, f"{user_id}/Ghibli.png"))
+
+    assert fake_supabase.tables["comics"][0]["status"] == "complete"
+    assert load_panel_checkpoint(dream_id, 1) is None
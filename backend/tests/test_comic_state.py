@@ -0,0 +1,47 @@
+# test_comic_state.py
+import asyncio
+import pytest
+from backend.api import worker
+from backend.api.comic_state import ComicRecord, ConcurrentTransitionError
+from backend.api.status_cache import get_comic_status
+
+
+def test_second_writer_from_a_stale_status_loses(fake_supabase):
+    fake_supabase.tables["comics"] = [{"id": "dream-1", "user_id": "owner", "status": "processing"}]
+    worker_record = ComicRecord("dream-1", "owner")
+    cancel_record = ComicRecord("dream-1", "owner")
+
+    worker_record.complete(["dream-1/panel_0.png"])
+    with pytest.raises(ConcurrentTransitionError):
+        cancel_record.fail("cancelled", "Comic generation was cancelled")
+
+    row = fake_supabase.tables["comics"][0]
+    assert row["status"] == "complete"
+    assert row["image_urls"] == ["dream-1/panel_0.png"]
+    assert get_comic_status("dream-1")["status"] == "complete"
+
+
+def test_panel_upgrade_keeps_a_regeneration_started_meanwhile(monkeypatch, fake_supabase):
+    dream_id, user_id = "dream-2", "owner"
+    drafts = [f"{user_id}/{dream_id}/draft/{i}.png" for i in (1, 2)]
+    fake_supabase.tables["comics"] = [{
+        "id": dream_id, "user_id": user_id, "status": "complete", "style": "Ghibli", "image_urls": drafts,
+        "storyboard": {"panels": [{"composition": f"Shot {i}", "image_prompt": f"panel prompt {i}"} for i in (1, 2)]},
+    }]
+
+    async def generate_image(prompt, avatar, quality=None):
+        return b"png", None
+
+    async def regeneration_starts(dream_id, user_id, image_paths):
+        # The user asks for a panel regeneration while the upgraded strip is composed
+        fake_supabase.tables["comics"][0]["status"] = "processing"
+        return None
+
+    monkeypatch.setattr(worker, "generate_image", generate_image)
+    monkeypatch.setattr(worker, "COMPOSE_STRIP", True)
+    monkeypatch.setattr(worker, "compose_comic_strip", regeneration_starts)
+    asyncio.run(worker.run_panel_upgrade(dream_id, user_id, None))
+
+    comic = fake_supabase.tables["comics"][0]
+    assert comic["status"] == "processing"
+    assert comic["image_urls"] == drafts
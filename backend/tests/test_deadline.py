@@ -0,0 +1,26 @@
+# test_deadline.py
+import contextvars
+import pytest
+from rq import Queue
+from backend.api.deadline import start_deadline, time_left, COMIC_JOB_TIMEOUT, FINALIZE_RESERVE
+from backend.api.job_context import running_job
+from backend.api.redis_client import redis_conn
+
+
+def budget_in_job(job) -> float:
+    def start():
+        running_job.set(job)
+        start_deadline(COMIC_JOB_TIMEOUT)
+        return time_left()
+    return contextvars.copy_context().run(start)
+
+
+@pytest.mark.parametrize("job_timeout, expected", [(60, 60), (None, Queue.DEFAULT_TIMEOUT), (-1, COMIC_JOB_TIMEOUT)])
+def test_deadline_follows_the_running_jobs_timeout(job_timeout, expected):
+    # /test-comic-worker/ enqueues the comic job with job_timeout=60
+    job = Queue("deadline_test", connection=redis_conn).enqueue("os.path.getsize", "/", job_timeout=job_timeout)
+    assert budget_in_job(job) == pytest.approx(expected - FINALIZE_RESERVE, abs=1)
+
+
+def test_deadline_outside_a_job_uses_the_default():
+    assert budget_in_job(None) == pytest.approx(COMIC_JOB_TIMEOUT - FINALIZE_RESERVE, abs=1)
@@ -0,0 +1,92 @@
+# test_image_download.py
+import asyncio
+import http.server
+import socket
+import threading
+import httpx
+import pytest
+from backend.api import image_download
+from backend.api.image_download import download_image, ImageDownloadError
+
+
+class FakeNetworkStream:
+    def __init__(self, address: str):
+        self.address = address
+
+    def get_extra_info(self, info: str):
+        return (self.address, 80) if info == "server_addr" else None
+
+
+@pytest.fixture
+def requested(monkeypatch):
+    urls = []
+
+    def handler(request):
+        urls.append(str(request.url))
+        connected_to = {"network_stream": FakeNetworkStream(request.url.host)}
+        if request.url.path == "/photo.png":
+            return httpx.Response(302, headers={"location": "http://169.254.169.254/latest/meta-data/"}, extensions=connected_to)
+        return httpx.Response(200, content=b"png", extensions=connected_to)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(image_download, "get_http_client", lambda: client)
+    return urls
+
+
+@pytest.mark.parametrize("url", ["http://127.0.0.1/photo.png", "http://10.0.0.5/photo.png", "http://[::1]/photo.png", "file:///etc/passwd"])
+def test_non_public_urls_are_refused(requested, url):
+    with pytest.raises(ImageDownloadError) as error:
+        asyncio.run(download_image(url))
+    assert error.value.status_code == 400
+    assert requested == []
+
+
+def test_redirect_to_a_private_host_is_refused(requested):
+    with pytest.raises(ImageDownloadError) as error:
+        asyncio.run(download_image("http://93.184.215.14/photo.png"))
+    assert error.value.status_code == 400
+    assert requested == ["http://93.184.215.14/photo.png"]
+
+
+def test_allowed_hosts_may_be_private(requested, monkeypatch):
+    monkeypatch.setattr(image_download, "IMAGE_DOWNLOAD_ALLOWED_HOSTS", {"127.0.0.1"})
+    assert asyncio.run(download_image("http://127.0.0.1/avatar.png")) == b"png"
+
+
+def test_host_that_rebinds_to_a_private_address_is_refused(monkeypatch):
+    class PhotoHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("content-length", "3")
+            self.end_headers()
+            self.wfile.write(b"png")
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.HTTPServer(("127.0.0.1", 0), PhotoHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    real_getaddrinfo = socket.getaddrinfo
+    lookups = []
+
+    def rebinding_getaddrinfo(host, *args, **kwargs):
+        # anyio looks up the IDNA-encoded name
+        if host not in ("rebind.test", b"rebind.test"):
+            return real_getaddrinfo(host, *args, **kwargs)
+        lookups.append(host)
+        # Public for the check, then the internal service for the connection
+        address = "93.184.215.14" if len(lookups) == 1 else "127.0.0.1"
+        return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", (address, port))]
+
+    monkeypatch.setattr(socket, "getaddrinfo", rebinding_getaddrinfo)
+    monkeypatch.setattr(image_download, "get_http_client", lambda: httpx.AsyncClient())
+    try:
+        with pytest.raises(ImageDownloadError) as error:
+            asyncio.run(download_image(f"http://rebind.test:{port}/admin"))
+    finally:
+        server.shutdown()
+
+    assert error.value.status_code == 400
+    assert len(lookups) == 2
@@ -0,0 +1,45 @@
+# test_metrics.py
+import os
+import subprocess
+import sys
+from prometheus_client import CollectorRegistry, multiprocess
+from backend.api.metrics import fold_process_metrics
+from conftest import REPO_ROOT
+
+RECORD_JOB_METRICS = """
+from backend.api.metrics import LLM_TOKENS, STAGE_SECONDS
+LLM_TOKENS.labels(prompt="storyboard", kind="output").inc(10)
+STAGE_SECONDS.labels(stage="comic_job", outcome="ok").observe(3)
+"""
+
+
+def run_job_process(directory: str) -> int:
+    """Records metrics in a separate process, like an RQ work horse, and returns its pid."""
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": directory}
+    process = subprocess.Popen([sys.executable, "-c", RECORD_JOB_METRICS], cwd=REPO_ROOT, env=env)
+    assert process.wait() == 0
+    return process.pid
+
+
+def collected(directory: str) -> dict:
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=directory)
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for metric in registry.collect() for sample in metric.samples
+    }
+
+
+def test_folded_job_metrics_keep_their_totals(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", directory)
+
+    pids = [run_job_process(directory) for _ in range(3)]
+    before = collected(directory)
+    for pid in pids:
+        fold_process_metrics(pid, 4242)
+
+    assert sorted(os.listdir(directory)) == ["counter_rollup4242.db", "histogram_rollup4242.db"]
+    assert collected(directory) == before
+    tokens = ("llm_tokens_total", (("kind", "output"), ("prompt", "storyboard")))
+    assert before[tokens] == 30
@@ -0,0 +1,58 @@
+# test_storyboard_stream.py
+import asyncio
+import json
+from types import SimpleNamespace
+from backend.api import api_clients
+from backend.api.storyboard_stream import StoryboardStreamParser
+
+
+def feed_all(parser: StoryboardStreamParser, text: str, chunk: int = 7) -> list:
+    panels = []
+    for start in range(0, len(text), chunk):
+        panels += parser.feed(text[start:start + chunk])
+    return panels
+
+
+def test_panels_carry_their_index():
+    text = json.dumps({"title": "t", "panels": [{"n": 1}, {"n": 2}, {"n": 3}]})
+    assert feed_all(StoryboardStreamParser(), text) == [(0, {"n": 1}), (1, {"n": 2}), (2, {"n": 3})]
+
+
+def test_malformed_panel_keeps_later_indexes():
+    parser = StoryboardStreamParser()
+    panels = feed_all(parser, '{"title": "t", "panels": [{"n": 1}, {"n": 2,}, {"n": 3}]}')
+    assert panels == [(0, {"n": 1}), (2, {"n": 3})]
+    assert parser.emitted_indexes == {0, 2}
+
+
+def test_stream_yields_only_the_missing_panels(monkeypatch):
+    storyboard = {"title": "t", "panels": [{"n": 1}, {"n": 2}, {"n": 3}]}
+    text = json.dumps(storyboard)
+
+    class FakeParser(StoryboardStreamParser):
+        def feed(self, chunk):
+            # Panel 2 fails to decode mid-stream
+            panels = [(index, panel) for index, panel in super().feed(chunk) if index != 1]
+            self.emitted_indexes.discard(1)
+            return panels
+
+    async def events():
+        yield SimpleNamespace(type="response.output_text.delta", delta=text)
+
+    async def create(**kwargs):
+        return events()
+
+    client = SimpleNamespace(responses=SimpleNamespace(create=create))
+    monkeypatch.setattr(api_clients, "StoryboardStreamParser", FakeParser)
+    monkeypatch.setattr(api_clients, "get_async_client", lambda: client)
+
+    async def collect():
+        return [item async for item in api_clients.stream_panel_descriptions("story", 3, "style")]
+
+    items = asyncio.run(collect())
+    assert items == [
+        ("panel", (0, {"n": 1})),
+        ("panel", (2, {"n": 3})),
+        ("panel", (1, {"n": 2})),
+        ("storyboard", storyboard),
+    ]